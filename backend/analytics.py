@@ -0,0 +1,267 @@
+"""Class analytics kept up to date as evaluations are written.
+
+Every submission with an evaluation stores a small analytics_contribution
+(marks, per-question marks and feedback category counts), so a dashboard is
+one read of an aggregate document instead of a scan of every submission.
+
+An evaluation result is written first, with its new contribution as
+analytics_pending. A separate transaction (retried, and never failing the
+evaluation) then subtracts the submission's previous contribution from the
+aggregates of its assignment and student, adds the pending one and moves it
+to analytics_contribution. Applying a pending contribution clears it, so a
+retried or repeated aggregate update counts each evaluation once; one that
+never succeeds is repaired by the next evaluation of the submission or by
+rebuild_analytics.py.
+"""
+import re
+import asyncio
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from metrics import log_event
+from repository import DELETE_FIELD
+
+ASSIGNMENT_ANALYTICS = "assignment_analytics"
+STUDENT_ANALYTICS = "student_analytics"
+HISTOGRAM_BUCKETS = 10
+
+# A transaction writes each submission, its student's aggregate and the
+# assignment's aggregate; Firestore allows 500 writes per transaction
+MAX_EVALUATIONS_PER_TRANSACTION = 249
+# Firestore allows at most 500 writes per batch
+MAX_EVALUATIONS_PER_BATCH = 500
+
+# Attempts of an aggregate update (each a transaction, itself retried on contention)
+AGGREGATE_UPDATE_ATTEMPTS = 3
+AGGREGATE_RETRY_BASE_SECONDS = 0.5
+
+
+def _number(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def contribution(evaluation_result: dict) -> dict:
+    """What one evaluated submission adds to the aggregates."""
+    questions = {}
+    categories: Dict[str, int] = {}
+    for index, item in enumerate(evaluation_result.get("question_evaluations") or []):
+        reference = str(item.get("question_reference") or "").strip() or f"#{index + 1}"
+        questions[reference] = [_number(item.get("marks_awarded")), _number(item.get("max_marks"))]
+        for feedback in item.get("feedback") or []:
+            category = str(feedback.get("category_id", ""))
+            if category:
+                categories[category] = categories.get(category, 0) + 1
+    return {
+        "marks": _number(evaluation_result.get("overall_marks")),
+        "max_marks": _number(evaluation_result.get("max_possible_marks")),
+        "questions": questions,
+        "categories": categories,
+    }
+
+
+def _score_key(item: dict) -> Optional[str]:
+    # Percentages are counted in tenths of a percent, which keeps the median exact
+    # enough while bounding the map to 1001 keys
+    if item["max_marks"] <= 0:
+        return None
+    return str(round(min(max(item["marks"] / item["max_marks"], 0), 1) * 1000))
+
+
+def _add(counts: dict, key: str, amount: float):
+    value = round(counts.get(key, 0) + amount, 6)
+    if value:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+
+def _with_defaults(aggregate: Optional[dict]) -> dict:
+    return {
+        "count": 0, "marks_sum": 0, "max_marks_sum": 0, "score_counts": {}, "questions": {}, "categories": {},
+        **(aggregate or {}),
+    }
+
+
+def _natural_key(text: str):
+    # "Q2" sorts before "Q10"
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", text)]
+
+
+def apply_contribution(aggregate: Optional[dict], old: Optional[dict], new: Optional[dict],
+                       with_questions: bool = True) -> dict:
+    """The aggregate with a submission's old contribution replaced by its new one."""
+    aggregate = _with_defaults(aggregate)
+    for item, sign in ((old, -1), (new, 1)):
+        if not item:
+            continue
+        aggregate["count"] += sign
+        aggregate["marks_sum"] = round(aggregate["marks_sum"] + sign * item["marks"], 6)
+        aggregate["max_marks_sum"] = round(aggregate["max_marks_sum"] + sign * item["max_marks"], 6)
+        score_key = _score_key(item)
+        if score_key is not None:
+            _add(aggregate["score_counts"], score_key, sign)
+        if with_questions:
+            for reference, (marks, max_marks) in item["questions"].items():
+                question = dict(aggregate["questions"].get(reference) or {})
+                _add(question, "count", sign)
+                _add(question, "marks_sum", sign * marks)
+                _add(question, "max_marks_sum", sign * max_marks)
+                if question.get("count"):
+                    aggregate["questions"][reference] = question
+                else:
+                    aggregate["questions"].pop(reference, None)
+        for category, count in item["categories"].items():
+            _add(aggregate["categories"], category, sign * count)
+    return aggregate
+
+
+def apply_evaluations(assignment_id: str, evaluations: List[Tuple[str, str, dict]],
+                      documents: List[Optional[dict]]):
+    """
+    Transaction body for the aggregate update: documents are the submissions,
+    then the assignment aggregate, then the student aggregates (in the order
+    of analytics_reads). Returns the (sets, updates) to commit.
+    """
+    submissions = documents[:len(evaluations)]
+    assignment_aggregate = documents[len(evaluations)]
+    student_ids = _student_ids(evaluations)
+    student_aggregates = dict(zip(student_ids, documents[len(evaluations) + 1:]))
+
+    updates = []
+    changed_students = set()
+    for (submission_id, student_id, _), submission in zip(evaluations, submissions):
+        # Missing, or already applied by an earlier attempt or a concurrent update
+        if submission is None or submission.get("analytics_pending") is None:
+            continue
+        old = submission.get("analytics_contribution")
+        new = submission["analytics_pending"]
+        assignment_aggregate = apply_contribution(assignment_aggregate, old, new)
+        if student_id:
+            student_aggregates[student_id] = apply_contribution(
+                student_aggregates[student_id], old, new, with_questions=False
+            )
+            changed_students.add(student_id)
+        updates.append(("submissions", submission_id, {
+            "analytics_contribution": new, "analytics_pending": DELETE_FIELD
+        }))
+
+    if not updates:
+        return [], []
+    sets = [(ASSIGNMENT_ANALYTICS, assignment_id, {**assignment_aggregate, "assignment_id": assignment_id})]
+    sets.extend(
+        (STUDENT_ANALYTICS, student_id, {**student_aggregates[student_id], "student_id": student_id})
+        for student_id in student_ids if student_id in changed_students
+    )
+    return sets, updates
+
+
+def _student_ids(evaluations: Iterable[Tuple[str, str, dict]]) -> List[str]:
+    return list(dict.fromkeys(student_id for _, student_id, _ in evaluations if student_id))
+
+
+def analytics_reads(assignment_id: str, evaluations: List[Tuple[str, str, dict]]) -> List[Tuple[str, str]]:
+    return (
+        [("submissions", submission_id) for submission_id, _, _ in evaluations]
+        + [(ASSIGNMENT_ANALYTICS, assignment_id)]
+        + [(STUDENT_ANALYTICS, student_id) for student_id in _student_ids(evaluations)]
+    )
+
+
+def with_pending_contribution(update: dict) -> dict:
+    """A submission update carrying an evaluation_result, with the contribution it is to add."""
+    return {**update, "analytics_pending": contribution(update["evaluation_result"])}
+
+
+async def record_evaluations(repository, assignment_id: str, evaluations: List[Tuple[str, str, dict]]):
+    """
+    Write (submission_id, student_id, update) submission updates that carry an
+    evaluation_result, then update the aggregates they change. Only the
+    submission write can fail the call.
+    """
+    for start in range(0, len(evaluations), MAX_EVALUATIONS_PER_BATCH):
+        await repository.update_many('submissions', [
+            (submission_id, with_pending_contribution(update))
+            for submission_id, _, update in evaluations[start:start + MAX_EVALUATIONS_PER_BATCH]
+        ])
+    for start in range(0, len(evaluations), MAX_EVALUATIONS_PER_TRANSACTION):
+        await update_aggregates(repository, assignment_id, evaluations[start:start + MAX_EVALUATIONS_PER_TRANSACTION])
+
+
+async def update_aggregates(repository, assignment_id: str, evaluations: List[Tuple[str, str, dict]]) -> bool:
+    """Apply the pending contributions of evaluated submissions; logs instead of raising."""
+    for attempt in range(1, AGGREGATE_UPDATE_ATTEMPTS + 1):
+        try:
+            await repository.transaction(
+                analytics_reads(assignment_id, evaluations),
+                lambda documents: apply_evaluations(assignment_id, evaluations, documents)
+            )
+            return True
+        except Exception as e:
+            if attempt == AGGREGATE_UPDATE_ATTEMPTS:
+                log_event("analytics_update_failed", level="error", assignment_id=assignment_id,
+                          submissions=len(evaluations), error=str(e))
+                return False
+            await asyncio.sleep(AGGREGATE_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+
+
+def _median(score_counts: dict) -> Optional[float]:
+    scores = sorted((int(key), count) for key, count in score_counts.items())
+    total = sum(count for _, count in scores)
+    if not total:
+        return None
+    middle = [(total - 1) // 2, total // 2]
+    values, seen = [], 0
+    for score, count in scores:
+        while middle and middle[0] < seen + count:
+            values.append(score)
+            middle.pop(0)
+        seen += count
+    return round(sum(values) / len(values) / 10, 1)
+
+
+def summarize(aggregate: Optional[dict], categories: List[dict]) -> dict:
+    """API view of an aggregate document: means, median, histogram and breakdowns."""
+    aggregate = _with_defaults(aggregate)
+    count = aggregate["count"]
+    score_counts = aggregate["score_counts"]
+
+    histogram = [0] * HISTOGRAM_BUCKETS
+    for key, bucket_count in score_counts.items():
+        histogram[min(int(key) * HISTOGRAM_BUCKETS // 1000, HISTOGRAM_BUCKETS - 1)] += bucket_count
+    width = 100 // HISTOGRAM_BUCKETS
+    scored = sum(score_counts.values())
+
+    names = {str(category["id"]): category["name"] for category in categories}
+    return {
+        "evaluated_submissions": count,
+        "mean_marks": round(aggregate["marks_sum"] / count, 2) if count else None,
+        "mean_max_marks": round(aggregate["max_marks_sum"] / count, 2) if count else None,
+        "mean_percentage": (
+            round(sum(int(key) * n for key, n in score_counts.items()) / scored / 10, 1) if scored else None
+        ),
+        "median_percentage": _median(score_counts),
+        "score_histogram": [
+            {"from_percentage": index * width, "to_percentage": (index + 1) * width, "count": bucket_count}
+            for index, bucket_count in enumerate(histogram)
+        ],
+        "questions": [
+            {
+                "question_reference": reference,
+                "evaluated": question["count"],
+                "mean_marks": round(question.get("marks_sum", 0) / question["count"], 2),
+                "mean_max_marks": round(question.get("max_marks_sum", 0) / question["count"], 2),
+            }
+            for reference, question in sorted(
+                aggregate["questions"].items(), key=lambda item: _natural_key(item[0])
+            )
+        ],
+        "feedback_categories": [
+            {"category_id": category, "name": names.get(category, ""), "count": category_count}
+            for category, category_count in sorted(
+                aggregate["categories"].items(), key=lambda item: _natural_key(item[0])
+            )
+        ],
+        "updated_at": aggregate.get("updated_at"),
+    }
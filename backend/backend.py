@@ -1,57 +1,310 @@
 import os
 import json
 import uuid
-import tempfile
 import re
-from typing import List, Optional
-from datetime import datetime
+import hashlib
+import zipfile
+import functools
+import threading
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
 import asyncio
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks
+import aiofiles
+from fastapi import APIRouter, FastAPI, UploadFile, File, Form, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
-from pyzerox import zerox
+from cachetools import TTLCache
 from dotenv import load_dotenv
-import google.generativeai as genai
-from google.api_core.exceptions import GoogleAPIError
+from extraction_cache import ExtractionCache, DiskCacheTier, FirestoreCacheTier, make_cache_key, sha256_file
+from jobs import JobQueue, SQLiteJobStore, FirestoreJobStore, PermanentJobError, QUEUED, RUNNING, current_job_id
+from loop_monitor import EventLoopLagMonitor
+from uploads import save_pdf_upload, save_zip_upload, extract_pdf_entry, inspect_pdf_file
+from bulk_upload import parse_manifest, list_archive, match_entries
+from repository import (
+    FirestoreRepository, SQLiteRepository, GCSBlobStore, LocalBlobStore, InvalidCursor
+)
+from context_cache import EvaluationContextCache
+from llm_gateway import LLMGateway
+from extraction import extract_native_pages, plan_extraction, ocr_pages, extraction_stats
+from evaluation_schema import (
+    EvaluationResult, QuestionEvaluation, EVALUATION_RESULT_SCHEMA, QUESTION_EVALUATION_SCHEMA,
+    QUESTION_EVALUATIONS_SCHEMA, OVERALL_FEEDBACK_SCHEMA,
+    evaluation_parse_stats, count_parse_outcome, parse_response, validate_questions, recompute_totals,
+    build_question_reask_prompt, build_overall_feedback_reask_prompt
+)
+from question_segments import split_questions, normalize_reference
+from metrics import registry, span, log_event, bind_log_context
+from events import StatusEventHub, STATUS_FIELDS, sse_message
+from content_store import ContentStore, load_content
+from response_cache import ResponseCache, CachedResponse, conditional_response
+from analytics import (
+    ASSIGNMENT_ANALYTICS, STUDENT_ANALYTICS, record_evaluations, summarize, update_aggregates, with_pending_contribution
+)
+from similarity import SimilarityIndexes, signature_for
+from idempotency import IdempotencyKeys
+
+if TYPE_CHECKING:
+    import google.generativeai as genai
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize FastAPI app
-app = FastAPI(title="Assignment Management System", 
-              description="API for managing assignments, submissions, and evaluations")
+# Routes are collected on a router; create_app() builds the FastAPI app around it
+router = APIRouter()
 
 # Define allowed origins
 origins = [
     "*",  # Frontend URL
 ]
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,  # Allow specific origins
-    allow_credentials=True,
-    allow_methods=["*"],  # Allow all HTTP methods (GET, POST, PUT, DELETE, etc.)
-    allow_headers=["*"],  # Allow all headers
+# Upload limits: PDFs are streamed to UPLOAD_TEMP_DIR and rejected above MAX_UPLOAD_BYTES
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_TEMP_DIR = os.getenv("UPLOAD_TEMP_DIR", "temp")
+# Allowance for the multipart envelope and form fields around the file
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Bulk uploads: a ZIP of PDFs (each still limited to MAX_UPLOAD_BYTES once unpacked)
+# whose files are processed BULK_UPLOAD_CONCURRENCY at a time
+MAX_BULK_UPLOAD_BYTES = int(os.getenv("MAX_BULK_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+MAX_BULK_UPLOAD_FILES = int(os.getenv("MAX_BULK_UPLOAD_FILES", "500"))
+BULK_UPLOAD_CONCURRENCY = int(os.getenv("BULK_UPLOAD_CONCURRENCY", "4"))
+
+# Direct uploads: clients PUT the PDF to a signed storage URL valid this long
+DIRECT_UPLOAD_URL_EXPIRY_SECONDS = int(os.getenv("DIRECT_UPLOAD_URL_EXPIRY_SECONDS", "900"))
+
+async def reject_oversized_uploads(request: Request, call_next):
+    """Reject uploads with 413 from Content-Length before the body is read."""
+    content_length = request.headers.get("content-length")
+    max_bytes = MAX_BULK_UPLOAD_BYTES if request.url.path.endswith("/submissions/bulk") else MAX_UPLOAD_BYTES
+    if (request.method == "POST" and content_length and content_length.isdigit()
+            and int(content_length) > max_bytes + UPLOAD_FORM_OVERHEAD_BYTES):
+        return JSONResponse(status_code=413, content={"detail": "Upload too large"})
+    return await call_next(request)
+
+# Storage backend: Firestore + Cloud Storage in production, or SQLite + a local
+# directory ("local") to run offline for development, load tests and benchmarks
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore")
+
+# Firebase and its clients are created on first use rather than at import, so
+# starting a process does not load the Google client libraries or read credentials
+_firebase_lock = threading.Lock()
+
+def get_firebase_app():
+    """The Firebase app, initialized from the service account file on first use."""
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _firebase_lock:
+        try:
+            return firebase_admin.get_app()
+        except ValueError:
+            # Initialize Firebase (assuming you have a serviceAccount.json file)
+            cred = credentials.Certificate(os.path.join(os.getcwd(), "solution-challenge-eduassign.json" ))
+            return firebase_admin.initialize_app(cred, {
+                'storageBucket': 'solution-challenge-eduassign.firebasestorage.app'
+            })
+
+@functools.lru_cache(maxsize=None)
+def get_firestore():
+    """Async Firestore client, so reads never block the event loop."""
+    from firebase_admin import firestore_async
+    return firestore_async.client(get_firebase_app())
+
+@functools.lru_cache(maxsize=None)
+def get_firestore_listener():
+    """Synchronous Firestore client; only it supports snapshot listeners."""
+    from firebase_admin import firestore
+    return firestore.client(get_firebase_app())
+
+@functools.lru_cache(maxsize=None)
+def get_storage_bucket():
+    from firebase_admin import storage
+    return storage.bucket(app=get_firebase_app())
+
+if STORAGE_BACKEND == "local":
+    repository = SQLiteRepository(os.getenv("LOCAL_DB_PATH", "local.db"))
+    blob_store = LocalBlobStore(os.getenv("LOCAL_BLOB_DIR", "blobs"), os.getenv("LOCAL_UPLOAD_SECRET"))
+else:
+    repository = FirestoreRepository(get_firestore, get_firestore_listener)
+    blob_store = GCSBlobStore(get_storage_bucket, max_workers=int(os.getenv("STORAGE_UPLOAD_THREADS", "4")))
+
+# Extracted markdown lives in the blob store (compressed, keyed by hash); documents
+# only carry extracted_content_ref. Documents written before the move still have
+# extracted_content inline until migrate_content.py has run.
+content_store = ContentStore(
+    blob_store,
+    encoding=os.getenv("CONTENT_COMPRESSION", "auto"),
+    cache_max_bytes=int(os.getenv("CONTENT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+)
+CONTENT_FIELDS = ["extracted_content", "extracted_content_ref"]
+
+# Short-lived cache of assignment title/description shared by the listing endpoints
+assignment_summary_cache = TTLCache(
+    maxsize=int(os.getenv("ASSIGNMENT_SUMMARY_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("ASSIGNMENT_SUMMARY_CACHE_TTL_SECONDS", "60"))
+)
+
+# List endpoints: page size bounds and the fields each listing transfers.
+# Heavy fields (extracted_content, evaluation_result, raw_response) are never selected.
+LIST_DEFAULT_LIMIT = int(os.getenv("LIST_DEFAULT_LIMIT", "100"))
+LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", "500"))
+
+ASSIGNMENT_LIST_FIELDS = [
+    "id", "creator_id", "title", "description", "created_at", "status",
+    "document_url", "error_message", "updated_at"
+]
+
+SUBMISSION_LIST_FIELDS = [
+    "id", "assignment_id", "student_id", "student_name", "submitted_at", "status",
+    "document_url", "ai_processing_status", "error_message", "overall_feedback",
+    "overall_marks", "max_possible_marks", "feedback_status", "feedback_approved_at",
+    "feedback_visible_to_student", "last_modified", "modified_by", "updated_at"
+]
+
+# Rendered responses of the read endpoints are kept briefly and dropped by the writes
+# that change them. Writes in other processes (separate workers) are only picked up
+# when the entry expires, so the TTL bounds how stale a response can be.
+response_cache = ResponseCache(
+    maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "10"))
+)
+
+# Near-duplicate detection: MinHash signatures are stored on submissions and each
+# process keeps LSH indexes of the assignments it has been asked about
+similarity_indexes = SimilarityIndexes(
+    repository,
+    threshold=float(os.getenv("SIMILARITY_THRESHOLD", "0.5")),
+    ttl_seconds=float(os.getenv("SIMILARITY_INDEX_TTL_SECONDS", "300")),
+    max_assignments=int(os.getenv("SIMILARITY_INDEX_MAX_ASSIGNMENTS", "64"))
+)
+
+# Create endpoints honour an Idempotency-Key header: a retry with the same key gets
+# the first response back instead of creating a second resource
+idempotency_keys = IdempotencyKeys(
+    repository,
+    ttl_seconds=float(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", str(24 * 3600)))
 )
 
-# Initialize Firebase (assuming you have a serviceAccount.json file)
-os.getcwd()
-cred = credentials.Certificate(os.path.join(os.getcwd(), "solution-challenge-eduassign.json" ))
-firebase_admin.initialize_app(cred, {
-    'storageBucket': 'solution-challenge-eduassign.firebasestorage.app'
-})
+# Uploaded submission PDFs by (assignment, student, content hash): re-uploading the
+# same file returns the existing submission instead of extracting it again
+SUBMISSION_UPLOADS = "submission_uploads"
 
-# Get Firestore and Storage clients
-db = firestore.client()
-bucket = storage.bucket()
+# Tracks how late the event loop wakes up, to spot blocking calls
+loop_lag_monitor = EventLoopLagMonitor(float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.5")))
 
 # LLM Configuration
 model = "gemini/gemini-2.0-flash"
 # Load the key from .env file
 os.environ['GEMINI_API_KEY'] = os.getenv("GEMINI_API_KEY")
 
+# Extraction cache: local disk tier, plus an optional Firestore tier shared across pods
+extraction_cache = ExtractionCache(
+    DiskCacheTier(
+        os.getenv("EXTRACTION_CACHE_DIR", "cache/extractions"),
+        int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    ),
+    FirestoreCacheTier(get_firestore)
+    if STORAGE_BACKEND != "local" and os.getenv("EXTRACTION_CACHE_FIRESTORE", "false").lower() == "true"
+    else None
+)
+
+# Job queue: persistent job table (SQLite locally, Firestore in prod) with bounded worker pools
+if os.getenv("JOB_STORE", "sqlite") == "firestore" and STORAGE_BACKEND != "local":
+    job_store = FirestoreJobStore(get_firestore)
+else:
+    job_store = SQLiteJobStore(os.getenv("JOB_DB_PATH", "jobs.db"))
+
+job_queue = JobQueue(
+    job_store,
+    concurrency={
+        "extract": int(os.getenv("JOB_CONCURRENCY_EXTRACT", "2")),
+        "evaluate": int(os.getenv("JOB_CONCURRENCY_EVALUATE", "4")),
+    },
+    max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+    retry_base_seconds=float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+)
+
+# Run the worker pools inside the API process unless a separate worker is deployed
+RUN_EMBEDDED_WORKER = os.getenv("RUN_EMBEDDED_WORKER", "true").lower() == "true"
+
+# Status events: in-process publishes reach SSE clients on this process. When the
+# writes can happen elsewhere (separate workers, several API pods) each process
+# also runs one shared database listener per watched assignment.
+STATUS_EVENTS_LISTENER = os.getenv(
+    "STATUS_EVENTS_LISTENER", "false" if RUN_EMBEDDED_WORKER else "true"
+).lower() == "true"
+STATUS_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("STATUS_EVENTS_HEARTBEAT_SECONDS", "15"))
+status_events = StatusEventHub(
+    watch=(lambda assignment_id, callback: repository.watch(
+        'submissions', {'assignment_id': assignment_id}, callback, fields=["id", *STATUS_FIELDS]
+    )) if STATUS_EVENTS_LISTENER else None,
+    queue_size=int(os.getenv("STATUS_EVENTS_QUEUE_SIZE", "100"))
+)
+
+# Job priorities (higher runs first within a pool)
+JOB_PRIORITY_ASSIGNMENT = 10
+JOB_PRIORITY_SUBMISSION = 0
+JOB_PRIORITY_EVALUATION = 0
+JOB_PRIORITY_EVALUATE_ALL = -10
+
+# Bulk evaluation: concurrent Gemini calls per run and submissions per Firestore batch write
+EVALUATE_ALL_CONCURRENCY = int(os.getenv("EVALUATE_ALL_CONCURRENCY", "8"))
+EVALUATE_ALL_BATCH_SIZE = int(os.getenv("EVALUATE_ALL_BATCH_SIZE", "20"))
+
+# Native text fast path: pages whose own text layer scores at least NATIVE_TEXT_MIN_QUALITY
+# skip vision OCR. Pages with images need more text before they are trusted.
+NATIVE_TEXT_ENABLED = os.getenv("NATIVE_TEXT_ENABLED", "true").lower() == "true"
+NATIVE_TEXT_MIN_QUALITY = float(os.getenv("NATIVE_TEXT_MIN_QUALITY", "0.6"))
+NATIVE_TEXT_MIN_CHARS = int(os.getenv("NATIVE_TEXT_MIN_CHARS", "40"))
+NATIVE_TEXT_MIN_CHARS_WITH_IMAGES = int(os.getenv("NATIVE_TEXT_MIN_CHARS_WITH_IMAGES", "500"))
+
+# Every LLM request goes through a gateway per model quota: pooled clients, RPM/TPM
+# token buckets and a concurrency window that adapts to 429/503 responses.
+# EXTRACTION_PAGE_CONCURRENCY is the most OCR pages in flight at once: the window
+# starts there and only shrinks below it while the API throttles.
+EXTRACTION_PAGE_CONCURRENCY = int(os.getenv("EXTRACTION_PAGE_CONCURRENCY", "4"))
+extraction_llm = LLMGateway(
+    "extraction",
+    requests_per_minute=int(os.getenv("LLM_EXTRACTION_RPM", "1000")),
+    tokens_per_minute=int(os.getenv("LLM_EXTRACTION_TPM", "1000000")),
+    initial_concurrency=EXTRACTION_PAGE_CONCURRENCY,
+    max_concurrency=EXTRACTION_PAGE_CONCURRENCY,
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "5"))
+)
+evaluation_llm = LLMGateway(
+    "evaluation",
+    requests_per_minute=int(os.getenv("LLM_EVALUATION_RPM", "150")),
+    tokens_per_minute=int(os.getenv("LLM_EVALUATION_TPM", "1000000")),
+    initial_concurrency=int(os.getenv("LLM_EVALUATION_CONCURRENCY", "4")),
+    max_concurrency=int(os.getenv("LLM_EVALUATION_MAX_CONCURRENCY", "16")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "5"))
+)
+# Rough size of an evaluation response, added to the prompt estimate for the token budget
+EVALUATION_OUTPUT_TOKEN_ESTIMATE = 2000
+
+# Evaluation model, and the cached assignment context reused across its evaluations
+EVALUATION_MODEL = os.getenv("EVALUATION_MODEL", "gemini-2.5-pro-exp-03-25")
+evaluation_context_cache = EvaluationContextCache(
+    EVALUATION_MODEL,
+    ttl_seconds=int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600")),
+    min_tokens=int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "4096")),
+    enabled=os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+)
+
+# Follow-up requests allowed per evaluation to fix an unparseable or invalid response
+EVALUATION_MAX_REASKS = int(os.getenv("EVALUATION_MAX_REASKS", "2"))
+
+# "whole" evaluates a submission in one request; "per_question" evaluates each question
+# as its own request when the assignment splits into at least two questions
+EVALUATION_MODE = os.getenv("EVALUATION_MODE", "whole")
+# Finished question evaluations, so a retried job only redoes the questions that failed
+question_evaluation_cache = TTLCache(
+    maxsize=int(os.getenv("QUESTION_EVALUATION_CACHE_SIZE", "2048")),
+    ttl=int(os.getenv("QUESTION_EVALUATION_CACHE_TTL_SECONDS", "3600"))
+)
+
 # Updated simplified prompts
 ASSIGNMENT_EXTRACTION_PROMPT = """
 Extract the full content of this assignment document in markdown format. 
@@ -100,59 +353,152 @@ feedback_categories = [
 ]
 
 # Helper Functions
-async def extract_markdown_from_file(file_path: str, system_prompt: str):
-    """Extract markdown content from PDF using pyzerox with custom prompt."""
-    output_dir = tempfile.mkdtemp()
-    result = await zerox(
-        file_path=file_path,
-        model=model,
-        output_dir=output_dir,
-        custom_system_prompt=system_prompt
+async def upload_file_to_storage(file_path: str, destination: str):
+    """Upload a local file to the blob store without blocking the event loop."""
+    await blob_store.upload(file_path, destination)
+
+async def stage_upload(file_path: str, destination: str, size: Optional[int] = None):
+    """
+    Move an upload the API saved locally into the blob store, where the job
+    processing it finds it: workers need not share a disk with the API.
+    """
+    try:
+        with span("storage.upload", bytes=size):
+            await upload_file_to_storage(file_path, destination)
+    finally:
+        os.unlink(file_path)
+
+async def download_upload(blob_path: str, file_path: str):
+    """Fetch a staged upload to a local file for a job to read."""
+    os.makedirs(UPLOAD_TEMP_DIR, exist_ok=True)
+    with span("storage.download"):
+        if not await blob_store.download(blob_path, file_path):
+            raise PermanentJobError(f"Uploaded file {blob_path} not found in storage")
+
+async def extract_markdown_from_file(file_path: str, system_prompt: str, file_sha256: Optional[str] = None):
+    """Extract markdown content from PDF using the native text layer and pyzerox vision OCR with custom prompt."""
+    # Identical PDF bytes with the same prompt and model always give the same markdown.
+    # Uploads already carry their digest; only hash the file when it is unknown.
+    if file_sha256 is None:
+        file_sha256 = await asyncio.to_thread(sha256_file, file_path)
+    strategy = (
+        f"native:{NATIVE_TEXT_MIN_QUALITY}:{NATIVE_TEXT_MIN_CHARS}:{NATIVE_TEXT_MIN_CHARS_WITH_IMAGES}"
+        if NATIVE_TEXT_ENABLED else "ocr"
+    )
+    cache_key = make_cache_key(file_sha256, system_prompt, model, strategy)
+    cached_content = await extraction_cache.get(cache_key)
+    if cached_content is not None:
+        return cached_content
+
+    # Take pages with a good text layer as-is; only the rest goes to vision OCR
+    page_contents = {}
+    pages_to_ocr = None
+    if NATIVE_TEXT_ENABLED:
+        with span("extract.native_text"):
+            native_pages = await asyncio.to_thread(extract_native_pages, file_path)
+        page_contents, pages_to_ocr = plan_extraction(
+            native_pages, NATIVE_TEXT_MIN_QUALITY, NATIVE_TEXT_MIN_CHARS, NATIVE_TEXT_MIN_CHARS_WITH_IMAGES
+        )
+    
+    if pages_to_ocr is None or pages_to_ocr:
+        page_contents.update(await ocr_pages(
+            file_path, pages_to_ocr, system_prompt, model, extraction_cache, extraction_llm
+        ))
+    
+    # Concatenate content from all pages in page order
+    extracted_content = "".join(
+        f"{page_contents[page_number]}\n\n" for page_number in sorted(page_contents)
     )
     
-    # Concatenate content from all pages
-    extracted_content = ""
-    if hasattr(result, 'pages') and result.pages:
-        for page in result.pages:
-            extracted_content += page.content + "\n\n"
+    # Only cache successful extractions
+    if extracted_content.strip():
+        await extraction_cache.set(cache_key, extracted_content, model)
     
     return extracted_content
 
-async def process_assignment_pdf(file_path: str):
-    """Extract markdown content from assignment PDF."""
-    return await extract_markdown_from_file(file_path, ASSIGNMENT_EXTRACTION_PROMPT)
+def assignment_summary(assignment: dict) -> dict:
+    """Title/description summary attached to submission listings."""
+    return {
+        'title': assignment.get('title', ''),
+        'description': assignment.get('description', '')
+    }
 
-async def process_submission_pdf(file_path: str):
-    """Extract markdown content from submission PDF."""
-    return await extract_markdown_from_file(file_path, SUBMISSION_EXTRACTION_PROMPT)
+def invalidate_assignment(assignment_id: str):
+    """Drop the cached summary and responses of an assignment after it is written."""
+    assignment_summary_cache.pop(assignment_id, None)
+    # Student listings embed the assignment title and description
+    response_cache.invalidate(f"assignment:{assignment_id}", "assignments", "student-submissions")
 
+def submission_updated(assignment_id: str, submission_id: str, update: dict):
+    """Push status changes to event streams and drop cached responses showing the submission."""
+    status_events.publish(assignment_id, submission_id, update)
+    response_cache.invalidate(
+        f"submission:{submission_id}", f"assignment-submissions:{assignment_id}", "student-submissions"
+    )
 
-async def run_evaluation(assignment_id: str, submission_id: str):
+async def cached_json(request: Request, tags: Tuple[str, ...],
+                      build: Callable[[], Awaitable[tuple]]) -> Response:
     """
-    Evaluate a submission using Google's Gemini LLM and update the database with feedback.
+    Serve a JSON response from the response cache, calling build() for
+    (content, last_modified) on a miss. Answers conditional requests with 304.
+    """
+    key = request.url.path + "?" + "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    cached = response_cache.get(key)
+    if cached is None:
+        versions = response_cache.versions(tags)
+        content, last_modified = await build()
+        cached = CachedResponse.render(content, last_modified)
+        response_cache.set(key, cached, tags, versions)
+    return conditional_response(request, cached)
+
+async def get_assignment_summaries(assignment_ids: Iterable[str]) -> dict:
     """
-    # Get assignment and submission data from Firestore
-    assignment_ref = db.collection('assignments').document(assignment_id)
-    submission_ref = db.collection('submissions').document(submission_id)
-    assignment = assignment_ref.get().to_dict()
-    submission = submission_ref.get().to_dict()
+    Get title/description for many assignments, served from the TTL cache where
+    possible and otherwise fetched in a single batched read.
+    """
+    summaries = {}
+    missing_ids = []
+    for assignment_id in set(assignment_ids):
+        summary = assignment_summary_cache.get(assignment_id)
+        if summary is None:
+            missing_ids.append(assignment_id)
+        else:
+            summaries[assignment_id] = summary
     
-    # Get assignment and submission content
-    assignment_content = assignment.get("extracted_content", "")
-    submission_content = submission.get("extracted_content", "")
+    if missing_ids:
+        # Only transfer the fields the summary needs
+        assignments = await repository.get_many('assignments', missing_ids, fields=["title", "description"])
+        for assignment_id, assignment in assignments.items():
+            summary = assignment_summary(assignment)
+            assignment_summary_cache[assignment_id] = summary
+            summaries[assignment_id] = summary
     
-    # Create evaluation prompt for LLM
-    prompt = f"""
-    You are an expert teacher evaluating student assignments. You have:
-    1. The assignment content:
+    return summaries
+
+async def process_assignment_pdf(file_path: str, file_sha256: Optional[str] = None):
+    """Extract markdown content from assignment PDF."""
+    return await extract_markdown_from_file(file_path, ASSIGNMENT_EXTRACTION_PROMPT, file_sha256)
+
+async def process_submission_pdf(file_path: str, file_sha256: Optional[str] = None):
+    """Extract markdown content from submission PDF."""
+    return await extract_markdown_from_file(file_path, SUBMISSION_EXTRACTION_PROMPT, file_sha256)
+
+
+class EvaluationParseError(Exception):
+    """Raised when the LLM response cannot be parsed into an evaluation result."""
+    def __init__(self, message: str, raw_response: Optional[str] = None):
+        super().__init__(message)
+        self.raw_response = raw_response
+
+
+def build_evaluation_context(assignment_content: str) -> str:
+    """Build the part of the evaluation prompt shared by every submission of an assignment."""
+    return f"""
+    You are an expert teacher evaluating student assignments. You have the assignment content:
     ```
     {assignment_content}
     ```
-    2. The student's submission:
-    ```
-    {submission_content}
-    ```
-    Please evaluate the student's work and provide:
+    You will be given a student's submission. Please evaluate the student's work and provide:
     1. Question-wise feedback and marks for each identifiable question answered
     2. Different types of feedback based on these categories:
     {json.dumps(feedback_categories, indent=2)}
@@ -179,84 +525,632 @@ async def run_evaluation(assignment_id: str, submission_id: str):
     
     Important: Return ONLY the JSON response with no markdown formatting, explanations, or other text.
     """
-    
+
+def build_submission_prompt(submission_content: str) -> str:
+    """Build the per-submission part of the evaluation prompt."""
+    return f"""
+    The student's submission:
+    ```
+    {submission_content}
+    ```
+    """
+
+def build_evaluation_prompt(assignment_content: str, submission_content: str) -> str:
+    """Build the full evaluation prompt for one submission."""
+    return build_evaluation_context(assignment_content) + build_submission_prompt(submission_content)
+
+def json_generation_config(schema: dict) -> "genai.GenerationConfig":
+    """Generation config asking for JSON that matches the given response schema."""
+    import google.generativeai as genai
+
+    return genai.GenerationConfig(response_mime_type="application/json", response_schema=schema)
+
+async def ask_json(model: "genai.GenerativeModel", contents: str, schema: dict):
+    """Send an evaluation request through the gateway, asking for JSON matching the schema."""
+    with span("evaluate.llm_call"):
+        return await evaluation_llm.call(
+            lambda: model.generate_content_async(contents, generation_config=json_generation_config(schema)),
+            estimated_tokens=EvaluationContextCache.estimate_tokens(contents) + EVALUATION_OUTPUT_TOKEN_ESTIMATE,
+            model=EVALUATION_MODEL
+        )
+
+async def generate_evaluation(assignment_id: str, assignment_content: str, submission_content: str) -> dict:
+    """Evaluate a submission per question when enabled and possible, otherwise in one request."""
+    if EVALUATION_MODE == "per_question":
+        plan = plan_question_evaluation(assignment_content, submission_content)
+        if plan is not None:
+            return await generate_question_evaluations(*plan)
+    return await generate_full_evaluation(assignment_id, assignment_content, submission_content)
+
+async def generate_full_evaluation(assignment_id: str, assignment_content: str, submission_content: str) -> dict:
+    """
+    Call Gemini with a declared response schema and return a validated evaluation result.
+
+    Near-valid JSON is repaired locally. When parts of the response are still
+    invalid, only those parts are asked for again, up to EVALUATION_MAX_REASKS
+    follow-up requests; missing totals are computed from the questions.
+    """
+    # Reuse the cached assignment context when available, otherwise send the full prompt
+    context_model = await evaluation_context_cache.get_model(
+        assignment_id, build_evaluation_context(assignment_content)
+    )
+    if context_model is not None:
+        model = context_model
+        prompt = build_submission_prompt(submission_content)
+    else:
+        model = evaluation_llm.model(EVALUATION_MODEL)
+        prompt = build_evaluation_prompt(assignment_content, submission_content)
+
+    async def ask(contents: str, schema: dict) -> str:
+        response = await ask_json(model, contents, schema)
+        if context_model is not None:
+            evaluation_context_cache.record_usage(response)
+        return response.text
+
+    response_text = await ask(prompt, EVALUATION_RESULT_SCHEMA)
+    data, _ = parse_response(response_text)
+    reasks = 0
+
+    # Nothing usable at all: ask for the whole evaluation again
+    while not (isinstance(data, dict) and isinstance(data.get("question_evaluations"), list)):
+        if reasks >= EVALUATION_MAX_REASKS:
+            count_parse_outcome("unrecoverable")
+            log_event("evaluation_unparseable", level="error", response_text=response_text[:500])
+            raise EvaluationParseError("Failed to parse LLM response as JSON", response_text)
+        reasks += 1
+        count_parse_outcome("reasks_full")
+        response_text = await ask(prompt, EVALUATION_RESULT_SCHEMA)
+        data, _ = parse_response(response_text)
+
+    try:
+        return EvaluationResult.model_validate(data).model_dump()
+    except ValueError:
+        count_parse_outcome("validation_failures")
+
+    # Ask again only for the question evaluations that failed validation
+    items = data["question_evaluations"]
+    questions, errors = validate_questions(items)
+    while errors and reasks < EVALUATION_MAX_REASKS:
+        reasks += 1
+        count_parse_outcome("reasks_questions")
+        reask_text = await ask(prompt + build_question_reask_prompt(items, errors), QUESTION_EVALUATIONS_SCHEMA)
+        corrected, _ = parse_response(reask_text)
+        fixed, _ = validate_questions(corrected)
+        for index, question in zip(list(errors), fixed):
+            if question is not None:
+                questions[index] = question
+                del errors[index]
+    if errors:
+        count_parse_outcome("unrecoverable")
+        raise EvaluationParseError(
+            f"Invalid evaluation for {len(errors)} question(s): {'; '.join(errors.values())}", response_text
+        )
+
+    overall_feedback = data.get("overall_feedback")
+    if (not isinstance(overall_feedback, str) or not overall_feedback.strip()) and reasks < EVALUATION_MAX_REASKS:
+        reasks += 1
+        count_parse_outcome("reasks_overall_feedback")
+        reask_text = await ask(prompt + build_overall_feedback_reask_prompt(questions), OVERALL_FEEDBACK_SCHEMA)
+        feedback_data, _ = parse_response(reask_text)
+        if isinstance(feedback_data, dict):
+            overall_feedback = feedback_data.get("overall_feedback")
+
+    # Totals follow from the question marks when the model left them out
+    overall_marks, max_possible_marks = data.get("overall_marks"), data.get("max_possible_marks")
+    if not all(isinstance(value, (int, float)) and value >= 0 for value in (overall_marks, max_possible_marks)):
+        count_parse_outcome("totals_recomputed")
+        overall_marks, max_possible_marks = recompute_totals(questions)
+
     try:
-        # Initialize the Gemini model
-        model = genai.GenerativeModel('gemini-2.5-pro-exp-03-25')
+        evaluation_result = EvaluationResult(
+            question_evaluations=questions,
+            overall_feedback=overall_feedback,
+            overall_marks=overall_marks,
+            max_possible_marks=max_possible_marks
+        )
+    except ValueError as e:
+        count_parse_outcome("unrecoverable")
+        raise EvaluationParseError(f"Incomplete evaluation result from LLM: {str(e)}", response_text)
+    return evaluation_result.model_dump()
+
+def build_question_prompt(preamble: str, reference: str, question_text: str, answer_text: str) -> str:
+    """Build the evaluation prompt for a single question and the student's answer to it."""
+    return f"""
+    You are an expert teacher evaluating one question of a student assignment.
+    General assignment instructions:
+    ```
+    {preamble}
+    ```
+    The question ({reference}):
+    ```
+    {question_text}
+    ```
+    The student's answer to this question:
+    ```
+    {answer_text or "(no answer found for this question)"}
+    ```
+    Award marks for this question only, estimating the maximum marks from the assignment
+    if they are not stated, and give feedback using these categories:
+    {json.dumps(feedback_categories, indent=2)}
+    Use "{reference}" as the question_reference.
+    """
+
+def build_overall_feedback_prompt(preamble: str, question_evaluations: List[dict]) -> str:
+    """Build the prompt summarising per-question evaluations into overall feedback."""
+    return f"""
+    You are an expert teacher. A student's assignment has been evaluated question by question.
+    General assignment instructions:
+    ```
+    {preamble}
+    ```
+    The question evaluations:
+    {json.dumps(question_evaluations)}
+    Write comprehensive overall feedback on the entire submission.
+    """
+
+def plan_question_evaluation(assignment_content: str, submission_content: str):
+    """Pair each assignment question with the student's answer, or None when the documents cannot be split."""
+    preamble, questions = split_questions(assignment_content)
+    if len(questions) < 2:
+        return None
+    _, answers = split_questions(submission_content)
+    if not any(reference in answers for reference in questions):
+        return None
+    return preamble, [(reference, text, answers.get(reference, "")) for reference, text in questions.items()]
+
+async def evaluate_question(preamble: str, reference: str, question_text: str, answer_text: str,
+                            use_cache: bool = True) -> dict:
+    """Evaluate one question with its own bounded re-asks and return the validated question evaluation."""
+    cache_key = make_cache_key(
+        hashlib.sha256(answer_text.encode("utf-8")).hexdigest(), preamble + question_text, EVALUATION_MODEL, reference
+    )
+    if use_cache and cache_key in question_evaluation_cache:
+        return question_evaluation_cache[cache_key]
+
+    model = evaluation_llm.model(EVALUATION_MODEL)
+    prompt = build_question_prompt(preamble, reference, question_text, answer_text)
+    for attempt in range(EVALUATION_MAX_REASKS + 1):
+        if attempt:
+            count_parse_outcome("reasks_questions")
+        response = await ask_json(model, prompt, QUESTION_EVALUATION_SCHEMA)
+        data, _ = parse_response(response.text)
+        if isinstance(data, dict):
+            # The reference comes from the segmentation, not the model
+            data["question_reference"] = reference
+            try:
+                question_evaluation = QuestionEvaluation.model_validate(data).model_dump()
+            except ValueError:
+                count_parse_outcome("validation_failures")
+                continue
+            question_evaluation_cache[cache_key] = question_evaluation
+            return question_evaluation
+
+    count_parse_outcome("unrecoverable")
+    raise EvaluationParseError(f"Invalid evaluation for question {reference}", response.text)
+
+async def generate_overall_feedback(preamble: str, question_evaluations: List[dict]) -> str:
+    """Ask for the overall feedback of a submission evaluated question by question."""
+    model = evaluation_llm.model(EVALUATION_MODEL)
+    prompt = build_overall_feedback_prompt(preamble, question_evaluations)
+    for attempt in range(EVALUATION_MAX_REASKS + 1):
+        if attempt:
+            count_parse_outcome("reasks_overall_feedback")
+        response = await ask_json(model, prompt, OVERALL_FEEDBACK_SCHEMA)
+        data, _ = parse_response(response.text)
+        if isinstance(data, dict) and isinstance(data.get("overall_feedback"), str) and data["overall_feedback"].strip():
+            return data["overall_feedback"]
+
+    count_parse_outcome("unrecoverable")
+    raise EvaluationParseError("Failed to generate overall feedback", response.text)
+
+async def generate_question_evaluations(preamble: str, pairs: List[tuple]) -> dict:
+    """
+    Evaluate every question concurrently and merge the results into one evaluation result.
+
+    Totals are summed from the question marks. Finished questions are cached,
+    so when some fail a retry of the job only redoes the failed ones.
+    """
+    results = await asyncio.gather(
+        *(evaluate_question(preamble, reference, question_text, answer_text)
+          for reference, question_text, answer_text in pairs),
+        return_exceptions=True
+    )
+    failed = [reference for (reference, _, _), result in zip(pairs, results) if isinstance(result, Exception)]
+    if failed:
+        first_error = next(result for result in results if isinstance(result, Exception))
+        raise RuntimeError(
+            f"Evaluation failed for questions {failed} ({len(pairs) - len(failed)} of {len(pairs)} done): {first_error}"
+        )
+
+    overall_marks, max_possible_marks = recompute_totals([QuestionEvaluation(**result) for result in results])
+    return {
+        "question_evaluations": results,
+        "overall_feedback": await generate_overall_feedback(preamble, results),
+        "overall_marks": overall_marks,
+        "max_possible_marks": max_possible_marks
+    }
+
+def evaluation_success_update(evaluation_result: dict) -> dict:
+    """Firestore update for a successfully evaluated submission."""
+    return {
+        "ai_processing_status": "completed",
+        "evaluation_result": evaluation_result,
+        "overall_feedback": evaluation_result["overall_feedback"],
+        "overall_marks": evaluation_result["overall_marks"],
+        "max_possible_marks": evaluation_result["max_possible_marks"]
+    }
+
+def evaluation_failure_update(error: Exception) -> dict:
+    """Firestore update for a submission whose evaluation failed."""
+    from google.api_core.exceptions import GoogleAPIError
+
+    if isinstance(error, GoogleAPIError):
+        # Handle API errors (e.g., rate limits, authentication issues)
+        return {
+            "ai_processing_status": "failed",
+            "error_message": f"Gemini API error: {str(error)}"
+        }
+    if isinstance(error, EvaluationParseError):
+        # Handle issues with parsing the response
+        return {
+            "ai_processing_status": "failed",
+            "error_message": str(error),
+            "raw_response": error.raw_response
+        }
+    # Handle any other unexpected errors
+    return {
+        "ai_processing_status": "failed",
+        "error_message": f"Error during evaluation: {str(error)}"
+    }
+
+# Evaluations running in this process by submission id: a second evaluation of the
+# same submission (e.g. a requeued job) waits for the running one
+evaluations_in_flight: Dict[str, asyncio.Future] = {}
+evaluation_stats = {"coalesced_requests": 0, "coalesced_runs": 0}
+
+async def evaluation_in_flight(submission: dict) -> Optional[str]:
+    """Id of the queued or running job evaluating a submission, if there is one."""
+    job_id = submission.get("evaluation_job_id")
+    if submission.get("ai_processing_status") != "processing" or not job_id:
+        return None
+    job = await job_queue.get(job_id)
+    return job_id if job is not None and job["status"] in (QUEUED, RUNNING) else None
+
+async def claim_evaluation(submission_id: str, submission: dict) -> Tuple[str, bool]:
+    """
+    Move a submission to ai_processing_status "processing" for a new evaluation
+    job, in a transaction. Returns (job_id, claimed): the id reserved for the
+    new job, or the job already evaluating the submission.
+    """
+    running_job_id = await evaluation_in_flight(submission)
+    if running_job_id is not None:
+        return running_job_id, False
+    
+    # A job id still on the document belongs to a finished (or lost) evaluation
+    stale_job_id = submission.get("evaluation_job_id")
+    job_id = str(uuid.uuid4())
+    claimed_by = []
+    
+    def claim(documents):
+        claimed_by.clear()
+        current = documents[0]
+        if (current is not None and current.get("ai_processing_status") == "processing"
+                and current.get("evaluation_job_id") not in (None, stale_job_id)):
+            # Another request claimed it since we read the submission
+            claimed_by.append(current["evaluation_job_id"])
+            return [], []
+        return [], [('submissions', submission_id, {"ai_processing_status": "processing", "evaluation_job_id": job_id})]
+    
+    await repository.transaction([('submissions', submission_id)], claim)
+    return (claimed_by[0], False) if claimed_by else (job_id, True)
+
+async def claim_pending_evaluations(submission_ids: List[str], job_id: Optional[str]) -> Set[str]:
+    """
+    Claim the submissions that are still pending or failed for an evaluation job,
+    in transactions of at most 500 writes. Returns the ids claimed.
+    """
+    claimed = set()
+    for start in range(0, len(submission_ids), SubmissionBatchWriter.MAX_BATCH_SIZE):
+        chunk = submission_ids[start:start + SubmissionBatchWriter.MAX_BATCH_SIZE]
         
-        # Call the Gemini API with the prompt
-        response = await model.generate_content_async(prompt)
+        def claim(documents, chunk=chunk):
+            claimed.difference_update(chunk)
+            updates = []
+            for submission_id, document in zip(chunk, documents):
+                if document is not None and document.get("ai_processing_status") in ("pending", "failed"):
+                    claimed.add(submission_id)
+                    updates.append(('submissions', submission_id, {
+                        "ai_processing_status": "processing", "evaluation_job_id": job_id
+                    }))
+            return [], updates
         
-        # Get response text
-        response_text = response.text
+        with span("db.write", documents=len(chunk)):
+            await repository.transaction([('submissions', submission_id) for submission_id in chunk], claim)
+    return claimed
+
+async def run_evaluation(assignment_id: str, submission_id: str):
+    """
+    Evaluate a submission, or wait for the evaluation of it already running in this process.
+    """
+    task = evaluations_in_flight.get(submission_id)
+    if task is None:
+        task = asyncio.ensure_future(evaluate_and_store(assignment_id, submission_id))
+        evaluations_in_flight[submission_id] = task
+        task.add_done_callback(lambda _: evaluations_in_flight.pop(submission_id, None))
+    else:
+        evaluation_stats["coalesced_runs"] += 1
+    # Shielded: a cancelled waiter must not cancel the evaluation others are waiting for
+    return await asyncio.shield(task)
+
+async def evaluate_and_store(assignment_id: str, submission_id: str):
+    """
+    Evaluate a submission using Google's Gemini LLM and update the database with feedback.
+    """
+    # Get assignment and submission data
+    with span("db.read"):
+        assignment, submission = await asyncio.gather(
+            repository.get('assignments', assignment_id, fields=CONTENT_FIELDS),
+            repository.get('submissions', submission_id, fields=CONTENT_FIELDS + ["student_id"])
+        )
+    if submission is None:
+        raise PermanentJobError(f"Submission {submission_id} not found")
+    
+    try:
+        if assignment is None:
+            raise PermanentJobError(f"Assignment {assignment_id} not found")
         
-        # Check if response is wrapped in markdown code block and extract the JSON
-        if response_text.startswith("```") and ("```" in response_text[3:]):
-            # Extract content between the markdown code blocks
-            start_idx = response_text.find("\n") + 1  # Skip the first line with ```json
-            end_idx = response_text.rfind("```")
-            response_text = response_text[start_idx:end_idx].strip()
+        # Get assignment and submission content
+        with span("content.read"):
+            assignment_content, submission_content = await asyncio.gather(
+                load_content(content_store, assignment), load_content(content_store, submission)
+            )
         
-        # Parse the extracted JSON
-        try:
-            evaluation_result = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            # Log the problematic response for debugging
-            print(f"Failed to parse JSON. Response text: {response_text[:500]}...")
-            raise
+        with span("evaluate"):
+            evaluation_result = await generate_evaluation(assignment_id, assignment_content, submission_content)
         
-        # Validate the structure of the response
-        if not all(key in evaluation_result for key in ["question_evaluations", "overall_feedback", "overall_marks", "max_possible_marks"]):
-            raise ValueError("Incomplete evaluation result from LLM")
-        
-        # Update submission with evaluation results in Firestore
-        submission_ref.update({
-            "ai_processing_status": "completed",
-            "evaluation_result": evaluation_result,
-            "overall_feedback": evaluation_result["overall_feedback"],
-            "overall_marks": evaluation_result["overall_marks"],
-            "max_possible_marks": evaluation_result["max_possible_marks"]
-        })
+        # Update submission with evaluation results (and the class analytics with it)
+        update = evaluation_success_update(evaluation_result)
+        with span("db.write"):
+            await record_evaluations(repository, assignment_id, [
+                (submission_id, (submission or {}).get("student_id"), update)
+            ])
+        submission_updated(assignment_id, submission_id, update)
         
         return evaluation_result
         
-    except GoogleAPIError as e:
-        # Handle API errors (e.g., rate limits, authentication issues)
-        error_message = f"Gemini API error: {str(e)}"
-        submission_ref.update({
-            "ai_processing_status": "failed",
-            "error_message": error_message
-        })
-        raise
-        
-    except json.JSONDecodeError:
-        # Handle issues with parsing the response
-        error_message = "Failed to parse LLM response as JSON"
-        submission_ref.update({
-            "ai_processing_status": "failed", 
-            "error_message": error_message,
-            "raw_response": response_text if 'response_text' in locals() else None
-        })
-        raise
-        
     except Exception as e:
-        # Handle any other unexpected errors
-        error_message = f"Error during evaluation: {str(e)}"
-        submission_ref.update({
-            "ai_processing_status": "failed",
-            "error_message": error_message
-        })
+        update = evaluation_failure_update(e)
+        await repository.update('submissions', submission_id, update)
+        submission_updated(assignment_id, submission_id, update)
         raise
 
+class SubmissionBatchWriter:
+    """Collects submission updates of one assignment and commits them as batched writes."""
+    
+    # Firestore allows at most 500 writes per batch
+    MAX_BATCH_SIZE = 500
+    
+    def __init__(self, assignment_id: str, batch_size: int):
+        self.assignment_id = assignment_id
+        self.batch_size = min(batch_size, self.MAX_BATCH_SIZE)
+        self.pending = []
+    
+    async def add(self, submission_id: str, update: dict, student_id: Optional[str] = None):
+        self.pending.append((submission_id, student_id, update))
+        if len(self.pending) >= self.batch_size:
+            try:
+                await self.flush()
+            except Exception:
+                # The batch was put back; the next flush retries it
+                pass
+    
+    async def _write(self, pending: List[tuple]):
+        # Evaluation results also update the analytics aggregates, after they are written
+        evaluations = [item for item in pending if "evaluation_result" in item[2]]
+        others = [
+            (submission_id, update) for submission_id, _, update in pending if "evaluation_result" not in update
+        ]
+        with span("db.write", documents=len(pending)):
+            if evaluations:
+                await record_evaluations(repository, self.assignment_id, evaluations)
+            if others:
+                await repository.update_many('submissions', others)
+        for submission_id, _, update in pending:
+            submission_updated(self.assignment_id, submission_id, update)
+    
+    async def flush(self):
+        """Write the collected updates; on an error they are put back and the error raised."""
+        while self.pending:
+            # Swap the batch out before awaiting so concurrent adds start a new one
+            pending, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+            try:
+                await self._write(pending)
+            except Exception as e:
+                self.pending = pending + self.pending
+                log_event("submission_batch_write_failed", level="warning", assignment_id=self.assignment_id,
+                          documents=len(pending), error=str(e))
+                raise
+    
+    async def close(self):
+        """Final flush. Updates a batched write cannot store are written one submission at a time."""
+        try:
+            await self.flush()
+            return
+        except Exception:
+            pending, self.pending = self.pending, []
+        for submission_id, student_id, update in pending:
+            try:
+                await self._write([(submission_id, student_id, update)])
+            except Exception as e:
+                log_event("submission_write_failed", level="error", submission_id=submission_id, error=str(e))
+                # Release the submission rather than leave it "processing" under a finished job
+                try:
+                    failure = evaluation_failure_update(e)
+                    await repository.update('submissions', submission_id, failure)
+                    submission_updated(self.assignment_id, submission_id, failure)
+                except Exception:
+                    pass
+
+async def run_evaluate_all(assignment_id: str):
+    """
+    Evaluate every pending or failed submission of an assignment with bounded concurrency.
+    """
+    # Load the assignment once for the whole run
+    assignment = await repository.get('assignments', assignment_id, fields=CONTENT_FIELDS)
+    if assignment is None:
+        raise ValueError(f"Assignment {assignment_id} not found")
+    assignment_content = await load_content(content_store, assignment)
+    
+    # Select the submissions that still need an evaluation
+    submissions = [
+        submission async for submission in await repository.query(
+            'submissions',
+            filters={'assignment_id': assignment_id, 'ai_processing_status': ["pending", "failed"]},
+            fields=CONTENT_FIELDS + ["student_id"]
+        )
+    ]
+    
+    # Claim them, skipping any that a single evaluation request claimed since the query
+    claimed = await claim_pending_evaluations([submission["id"] for submission in submissions], current_job_id.get())
+    submissions = [submission for submission in submissions if submission["id"] in claimed]
+    for submission in submissions:
+        submission_updated(assignment_id, submission["id"], {"ai_processing_status": "processing"})
+    
+    progress = {"total": len(submissions), "done": 0, "failed": 0, "remaining": len(submissions)}
+    await job_queue.report_progress(progress)
+    
+    writer = SubmissionBatchWriter(assignment_id, EVALUATE_ALL_BATCH_SIZE)
+    semaphore = asyncio.Semaphore(EVALUATE_ALL_CONCURRENCY)
+    
+    async def evaluate_one(submission):
+        async with semaphore:
+            try:
+                # Loaded lazily so at most EVALUATE_ALL_CONCURRENCY submissions are held in memory
+                submission_content = await load_content(content_store, submission)
+                with bind_log_context(submission_id=submission["id"]), span("evaluate"):
+                    evaluation_result = await generate_evaluation(assignment_id, assignment_content, submission_content)
+                update = evaluation_success_update(evaluation_result)
+                progress["done"] += 1
+            except Exception as e:
+                update = evaluation_failure_update(e)
+                progress["failed"] += 1
+            # Outside the try: only evaluation errors mark a submission failed
+            await writer.add(submission["id"], update, submission.get("student_id"))
+            progress["remaining"] = progress["total"] - progress["done"] - progress["failed"]
+            await job_queue.report_progress(progress)
+    
+    try:
+        await asyncio.gather(*(evaluate_one(submission) for submission in submissions))
+    finally:
+        await writer.close()
+    
+    return progress
+
+async def run_evaluation_job(assignment_id: str, submission_id: str):
+    """Job handler: run an evaluation and record a short summary on the job."""
+    evaluation_result = await run_evaluation(assignment_id, submission_id)
+    return {
+        "overall_marks": evaluation_result["overall_marks"],
+        "max_possible_marks": evaluation_result["max_possible_marks"]
+    }
+
+async def regrade_conflict(submission: dict) -> Optional[str]:
+    """Why a question of the submission cannot be re-evaluated now, or None when it can."""
+    running_job_id = await evaluation_in_flight(submission)
+    if running_job_id is not None:
+        return f"Submission is being evaluated (job {running_job_id})"
+    if submission.get("ai_processing_status") != "completed" or not submission.get("evaluation_result"):
+        return "Submission has no completed evaluation to re-evaluate a question of"
+    return None
+
+async def run_question_regrade(assignment_id: str, submission_id: str, question_reference: str):
+    """
+    Job handler: re-evaluate a single question of a submission and merge it
+    into the stored evaluation, leaving the other questions untouched. Only
+    completed evaluations are changed; the merge rechecks that in a transaction.
+    """
+    assignment, submission = await asyncio.gather(
+        repository.get('assignments', assignment_id, fields=CONTENT_FIELDS),
+        repository.get('submissions', submission_id, fields=CONTENT_FIELDS + [
+            "student_id", "ai_processing_status", "evaluation_job_id", "evaluation_result"
+        ])
+    )
+    if assignment is None:
+        raise PermanentJobError(f"Assignment {assignment_id} not found")
+    if submission is None:
+        raise PermanentJobError(f"Submission {submission_id} not found")
+    conflict = await regrade_conflict(submission)
+    if conflict is not None:
+        raise PermanentJobError(conflict)
+    assignment_content, submission_content = await asyncio.gather(
+        load_content(content_store, assignment), load_content(content_store, submission)
+    )
+
+    reference = normalize_reference(question_reference)
+    preamble, questions = split_questions(assignment_content)
+    if reference not in questions:
+        raise PermanentJobError(f"Question {question_reference} not found in assignment {assignment_id}")
+    _, answers = split_questions(submission_content)
+
+    question_evaluation = await evaluate_question(
+        preamble, reference, questions[reference], answers.get(reference, ""), use_cache=False
+    )
+    # Keep the assignment's question order
+    order = {reference: position for position, reference in enumerate(questions)}
+    merged = []
+
+    def merge(documents):
+        merged.clear()
+        current = documents[0]
+        # A full evaluation may have started (or replaced the result) while the question was evaluated
+        if current is None or current.get("ai_processing_status") != "completed" \
+                or not current.get("evaluation_result"):
+            return [], []
+        evaluation_result = {"overall_feedback": "", **current["evaluation_result"]}
+        question_evaluations = [
+            item for item in evaluation_result.get("question_evaluations", [])
+            if normalize_reference(str(item.get("question_reference", ""))) != reference
+        ]
+        question_evaluations.append(question_evaluation)
+        question_evaluations.sort(
+            key=lambda item: order.get(normalize_reference(str(item["question_reference"])), len(order))
+        )
+        overall_marks, max_possible_marks = recompute_totals(
+            [QuestionEvaluation(**item) for item in question_evaluations]
+        )
+        evaluation_result.update({
+            "question_evaluations": question_evaluations,
+            "overall_marks": overall_marks,
+            "max_possible_marks": max_possible_marks
+        })
+        update = with_pending_contribution(evaluation_success_update(evaluation_result))
+        merged.append(update)
+        return [], [('submissions', submission_id, update)]
+
+    await repository.transaction([('submissions', submission_id)], merge)
+    if not merged:
+        raise PermanentJobError(f"Submission {submission_id} is no longer a completed evaluation")
+    update = merged[0]
+    await update_aggregates(repository, assignment_id, [(submission_id, submission.get("student_id"), update)])
+    submission_updated(assignment_id, submission_id, update)
+
+    return {
+        "question_reference": reference,
+        "marks_awarded": question_evaluation["marks_awarded"],
+        "overall_marks": update["overall_marks"],
+        "max_possible_marks": update["max_possible_marks"]
+    }
+
 
 # API Endpoints
-@app.post("/assignments/")
+@router.post("/assignments/")
+@idempotency_keys.endpoint("create_assignment", ["creator_id", "title", "description"])
 async def create_assignment(
-    background_tasks: BackgroundTasks,
     creator_id: str = Form(...),
     title: str = Form(...),
     description: str = Form(...), 
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """
     Teacher submits a new assignment with PDF file.
@@ -265,32 +1159,49 @@ async def create_assignment(
         # Generate a new UUID for the assignment
         assignment_id = str(uuid.uuid4())
         
-        # Save PDF temporarily
-        temp_file_path = f"temp/temp_{assignment_id}.pdf"
-        with open(temp_file_path, "wb") as buffer:
-            buffer.write(await file.read())
+        # Stream PDF to a temp file, hashing it on the way, then count its pages
+        with span("upload.temp_write", assignment_id=assignment_id):
+            upload = await save_pdf_upload(
+                file, os.path.join(UPLOAD_TEMP_DIR, f"temp_{assignment_id}.pdf"), MAX_UPLOAD_BYTES
+            )
         
-        # Process PDF in background to extract content
-        background_tasks.add_task(process_and_store_assignment, 
-                                 assignment_id, 
-                                 creator_id, 
-                                 title, 
-                                 description, 
-                                 temp_file_path)
+        blob_path = f"assignments/{assignment_id}.pdf"
+        await stage_upload(upload.path, blob_path, upload.size)
         
-        return {"assignment_id": assignment_id, "status": "processing"}
+        # Queue PDF processing to extract content
+        job = await job_queue.enqueue("process_assignment", {
+            "assignment_id": assignment_id,
+            "creator_id": creator_id,
+            "title": title,
+            "description": description,
+            "blob_path": blob_path,
+            "file_sha256": upload.sha256,
+            "file_size": upload.size,
+            "page_count": upload.page_count
+        }, priority=JOB_PRIORITY_ASSIGNMENT)
+        
+        return {"assignment_id": assignment_id, "status": "processing", "job_id": job["id"]}
     
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating assignment: {str(e)}")
 
 async def process_and_store_assignment(assignment_id: str, creator_id: str, title: str, 
-                                      description: str, file_path: str):
-    """Process assignment PDF and store in Firebase."""
+                                      description: str, blob_path: str,
+                                      file_sha256: Optional[str] = None, file_size: Optional[int] = None,
+                                      page_count: Optional[int] = None):
+    """Process an assignment PDF, staged in the blob store at blob_path, and store it."""
+    # A local copy for this attempt only; a retry fetches it again
+    file_path = os.path.join(UPLOAD_TEMP_DIR, f"temp_{assignment_id}.pdf")
     try:
-        # Extract markdown content from PDF
-        extracted_content = await process_assignment_pdf(file_path)
+        await download_upload(blob_path, file_path)
+        with span("extract", pages=page_count):
+            extracted_content = await process_assignment_pdf(file_path, file_sha256)
+        with span("content.write"):
+            extracted_content_ref = await content_store.put(extracted_content)
         
-        # Create assignment record in Firestore
+        # Create assignment record
         assignment_data = {
             "id": assignment_id,
             "creator_id": creator_id,
@@ -298,35 +1209,41 @@ async def process_and_store_assignment(assignment_id: str, creator_id: str, titl
             "description": description,
             "created_at": datetime.now(),
             "status": "active",
-            "document_url": f"assignments/{assignment_id}.pdf",
-            "extracted_content": extracted_content
+            "document_url": blob_path,
+            "file_sha256": file_sha256,
+            "file_size": file_size,
+            "page_count": page_count,
+            "extracted_content_ref": extracted_content_ref
         }
         
         # Create the assignment document
-        db.collection('assignments').document(assignment_id).set(assignment_data)
-        
-        # Upload PDF to Firebase Storage
-        blob = bucket.blob(f"assignments/{assignment_id}.pdf")
-        blob.upload_from_filename(file_path)
-        
-        # Clean up temp file
-        os.unlink(file_path)
+        with span("db.write"):
+            await repository.set('assignments', assignment_id, assignment_data)
+        invalidate_assignment(assignment_id)
+        await evaluation_context_cache.invalidate(assignment_id)
         
     except Exception as e:
-        print(f"Error processing assignment: {str(e)}")
-        # Update assignment status to indicate error
-        db.collection('assignments').document(assignment_id).update({
+        log_event("assignment_processing_failed", level="error", error=str(e))
+        # Update assignment status to indicate error (the document may not exist yet)
+        await repository.set('assignments', assignment_id, {
             "status": "error",
             "error_message": str(e)
-        })
+        }, merge=True)
+        invalidate_assignment(assignment_id)
+        # Re-raise so the job queue can retry
+        raise
+    finally:
+        if os.path.exists(file_path):
+            os.unlink(file_path)
 
-@app.post("/submissions/")
+@router.post("/submissions/")
+@idempotency_keys.endpoint("create_submission", ["assignment_id", "student_id", "student_name"])
 async def create_submission(
-    background_tasks: BackgroundTasks,
     assignment_id: str = Form(...),
     student_id: str = Form(...),
     student_name: str = Form(...),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """
     Student submits an assignment attempt.
@@ -335,251 +1252,990 @@ async def create_submission(
         # Generate a new UUID for the submission
         submission_id = str(uuid.uuid4())
         
-        # Save PDF temporarily
-        temp_file_path = f"temp/temp_{submission_id}.pdf"
-        with open(temp_file_path, "wb") as buffer:
-            buffer.write(await file.read())
+        # Stream PDF to a temp file, hashing it on the way, then count its pages
+        with span("upload.temp_write", assignment_id=assignment_id, submission_id=submission_id):
+            upload = await save_pdf_upload(
+                file, os.path.join(UPLOAD_TEMP_DIR, f"temp_{submission_id}.pdf"), MAX_UPLOAD_BYTES
+            )
+        
+        # The same PDF from the same student for the same assignment is one submission
+        job_id = str(uuid.uuid4())
+        earlier = await claim_submission_upload(assignment_id, student_id, upload.sha256, submission_id, job_id)
+        if earlier is not None:
+            os.unlink(upload.path)
+            return {"submission_id": earlier["submission_id"], "status": "duplicate", "job_id": earlier["job_id"]}
+        
+        blob_path = f"submissions/{submission_id}.pdf"
+        await stage_upload(upload.path, blob_path, upload.size)
         
-        # Process submission in background
-        background_tasks.add_task(process_and_store_submission, 
-                                 submission_id, 
-                                 assignment_id, 
-                                 student_id,
-                                 student_name, 
-                                 temp_file_path)
+        # Queue submission processing
+        job = await job_queue.enqueue("process_submission", {
+            "submission_id": submission_id,
+            "assignment_id": assignment_id,
+            "student_id": student_id,
+            "student_name": student_name,
+            "file_path": None,
+            "blob_path": blob_path,
+            "file_sha256": upload.sha256,
+            "file_size": upload.size,
+            "page_count": upload.page_count
+        }, priority=JOB_PRIORITY_SUBMISSION, job_id=job_id)
         
-        return {"submission_id": submission_id, "status": "processing"}
+        return {"submission_id": submission_id, "status": "processing", "job_id": job["id"]}
     
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating submission: {str(e)}")
 
+async def claim_submission_upload(assignment_id: str, student_id: str, file_sha256: str,
+                                  submission_id: str, job_id: str) -> Optional[dict]:
+    """
+    Record a submission PDF under (assignment, student, content hash), in a
+    transaction. Returns None for the first upload of the file, or the earlier
+    upload's record ({"submission_id", "job_id"}). An earlier upload whose
+    processing failed, or that was never queued, is replaced.
+    """
+    doc_id = hashlib.sha256(f"{assignment_id}\0{student_id}\0{file_sha256}".encode("utf-8")).hexdigest()
+    replaced = None
+    earlier = await repository.get(SUBMISSION_UPLOADS, doc_id)
+    if earlier is not None:
+        # Submission documents are written once processing is done; until then the job tells
+        submission = await repository.get('submissions', earlier["submission_id"], fields=["status"])
+        if submission is not None and submission.get("status") != "error":
+            return earlier
+        if submission is None and await job_queue.get(earlier["job_id"]) is not None:
+            return earlier
+        replaced = earlier["submission_id"]
+    
+    claimed_by = []
+    
+    def claim(documents):
+        claimed_by.clear()
+        current = documents[0]
+        if current is not None and current["submission_id"] != replaced:
+            # A concurrent upload of the same file got here first
+            claimed_by.append(current)
+            return [], []
+        return [(SUBMISSION_UPLOADS, doc_id, {
+            "assignment_id": assignment_id,
+            "student_id": student_id,
+            "file_sha256": file_sha256,
+            "submission_id": submission_id,
+            "job_id": job_id
+        })], []
+    
+    await repository.transaction([(SUBMISSION_UPLOADS, doc_id)], claim)
+    return claimed_by[0] if claimed_by else None
+
+@router.post("/submissions/upload-url")
+@idempotency_keys.endpoint("create_submission_upload_url", ["assignment_id", "student_id", "student_name"])
+async def create_submission_upload_url(
+    assignment_id: str = Form(...),
+    student_id: str = Form(...),
+    student_name: str = Form(...),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """
+    Start a direct upload: returns a signed URL the client PUTs the PDF to,
+    straight into storage. Call /submissions/{submission_id}/upload-complete
+    once the PUT succeeds to have the submission processed.
+    """
+    try:
+        if await repository.get('assignments', assignment_id, fields=["id"]) is None:
+            raise HTTPException(status_code=404, detail="Assignment not found")
+        
+        submission_id = str(uuid.uuid4())
+        blob_path = f"submissions/{submission_id}.pdf"
+        upload_url, headers = blob_store.signed_upload_url(
+            blob_path, "application/pdf", MAX_UPLOAD_BYTES, DIRECT_UPLOAD_URL_EXPIRY_SECONDS
+        )
+        expires_at = datetime.now() + timedelta(seconds=DIRECT_UPLOAD_URL_EXPIRY_SECONDS)
+        await repository.set('upload_sessions', submission_id, {
+            "id": submission_id,
+            "assignment_id": assignment_id,
+            "student_id": student_id,
+            "student_name": student_name,
+            "blob_path": blob_path,
+            "status": "pending",
+            "expires_at": expires_at
+        })
+        
+        return {
+            "submission_id": submission_id,
+            "upload_url": upload_url,
+            "method": "PUT",
+            "headers": headers,
+            "expires_at": expires_at
+        }
+    
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating upload URL: {str(e)}")
+
+@router.post("/submissions/{submission_id}/upload-complete")
+async def complete_submission_upload(submission_id: str):
+    """
+    Notification that a direct upload has finished; queues the submission for
+    processing. Repeated notifications return the job queued by the first.
+    """
+    try:
+        session = await repository.get('upload_sessions', submission_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        if session["status"] == "duplicate":
+            return {"submission_id": session["duplicate_of"], "status": "duplicate", "job_id": session["duplicate_job_id"]}
+        if session["status"] != "pending":
+            return {"submission_id": submission_id, "status": "processing", "job_id": session.get("job_id")}
+        
+        file_size = await blob_store.size(session["blob_path"])
+        if file_size is None:
+            raise HTTPException(status_code=409, detail="The file has not been uploaded yet")
+        if file_size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Upload too large")
+        
+        # Claim the session with the id of the job to queue, so concurrent
+        # notifications queue one job between them and all see its id
+        job_id = str(uuid.uuid4())
+        claimed = []
+        
+        def claim(documents):
+            claimed.clear()
+            if documents[0] is None or documents[0]["status"] != "pending":
+                return [], []
+            claimed.append(True)
+            return [], [('upload_sessions', submission_id, {
+                "status": "uploaded", "file_size": file_size, "job_id": job_id
+            })]
+        
+        await repository.transaction([('upload_sessions', submission_id)], claim)
+        if not claimed:
+            session = await repository.get('upload_sessions', submission_id)
+            return {"submission_id": submission_id, "status": "processing", "job_id": session.get("job_id")}
+        
+        # The PDF is checked (type, size, pages) when the job downloads it
+        try:
+            job = await job_queue.enqueue("process_submission", {
+                "submission_id": submission_id,
+                "assignment_id": session["assignment_id"],
+                "student_id": session["student_id"],
+                "student_name": session["student_name"],
+                "file_path": None,
+                "blob_path": session["blob_path"],
+                "file_size": file_size
+            }, priority=JOB_PRIORITY_SUBMISSION, job_id=job_id)
+        except Exception:
+            # Hand the session back so the client can notify again
+            await repository.update('upload_sessions', submission_id, {"status": "pending", "job_id": None})
+            raise
+        
+        return {"submission_id": submission_id, "status": "processing", "job_id": job["id"]}
+    
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error completing upload: {str(e)}")
+
+@router.put("/local-uploads/{destination:path}")
+async def local_upload(destination: str, request: Request, expires: int, max_bytes: int, signature: str):
+    """
+    Target of the signed upload URLs handed out with STORAGE_BACKEND=local,
+    standing in for Cloud Storage: stores the request body at destination.
+    """
+    verify_upload = getattr(blob_store, "verify_upload", None)
+    if verify_upload is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not verify_upload(destination, expires, max_bytes, signature):
+        raise HTTPException(status_code=403, detail="Invalid or expired upload URL")
+    
+    temp_path = os.path.join(UPLOAD_TEMP_DIR, f"direct_{uuid.uuid4()}")
+    os.makedirs(UPLOAD_TEMP_DIR, exist_ok=True)
+    try:
+        size = 0
+        async with aiofiles.open(temp_path, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail="Upload too large")
+                await f.write(chunk)
+        await blob_store.upload(temp_path, destination)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+    return Response(status_code=200)
+
 async def process_and_store_submission(submission_id: str, assignment_id: str, 
-                                      student_id: str, student_name: str, file_path: str):
-    """Process submission PDF and store in Firebase."""
+                                      student_id: str, student_name: str, file_path: Optional[str],
+                                      file_sha256: Optional[str] = None, file_size: Optional[int] = None,
+                                      page_count: Optional[int] = None, blob_path: Optional[str] = None):
+    """
+    Process submission PDF and store it. The PDF is either blob_path, staged
+    in the blob store by the API or a direct upload, or a local file_path
+    (unpacked by a bulk upload job). A direct upload of a PDF the student
+    already submitted is marked duplicate on its upload session instead.
+    """
+    local_copy = None
     try:
-        # Extract markdown content from PDF
-        extracted_content = await process_submission_pdf(file_path)
+        document_url = f"submissions/{submission_id}.pdf"
+        if blob_path is not None:
+            # A local copy for this attempt only; a retry fetches it again
+            file_path = local_copy = os.path.join(UPLOAD_TEMP_DIR, f"temp_{submission_id}.pdf")
+            await download_upload(blob_path, file_path)
+            document_url = blob_path
+        if file_sha256 is None:
+            # Direct upload: check it like an API upload
+            try:
+                upload = await asyncio.to_thread(inspect_pdf_file, file_path, MAX_UPLOAD_BYTES)
+            except HTTPException as e:
+                # Not a PDF, too large or too many pages: retrying will not change that
+                raise PermanentJobError(e.detail)
+            file_sha256, file_size, page_count = upload.sha256, upload.size, upload.page_count
+            
+            # The hash is known only now; the same PDF from the same student is one submission
+            earlier = await claim_submission_upload(
+                assignment_id, student_id, file_sha256, submission_id, current_job_id.get()
+            )
+            if earlier is not None:
+                await repository.update('upload_sessions', submission_id, {
+                    "status": "duplicate", "duplicate_of": earlier["submission_id"], "duplicate_job_id": earlier["job_id"]
+                })
+                return {"status": "duplicate", "submission_id": earlier["submission_id"]}
+        
+        async def extract():
+            with span("extract", pages=page_count):
+                return await process_submission_pdf(file_path, file_sha256)
         
-        # Get assignment to access info
-        assignment_ref = db.collection('assignments').document(assignment_id)
-        assignment = assignment_ref.get()
+        async def store_pdf():
+            if blob_path is None:
+                with span("storage.upload", bytes=file_size):
+                    await upload_file_to_storage(file_path, document_url)
         
-        if not assignment.exists:
+        async def read_assignment():
+            with span("db.read"):
+                return await repository.get('assignments', assignment_id, fields=CONTENT_FIELDS)
+        
+        # Extract markdown content from PDF while the PDF is uploaded and the assignment read
+        extracted_content, _, assignment = await asyncio.gather(extract(), store_pdf(), read_assignment())
+        
+        if assignment is None:
             raise ValueError(f"Assignment {assignment_id} not found")
-            
-        assignment_data = assignment.to_dict()
         
-        # Create submission record in Firestore
+        with span("content.write"):
+            extracted_content_ref = await content_store.put(extracted_content)
+        
+        # Similarity signature, leaving out text quoted from the assignment
+        with span("similarity.signature"):
+            assignment_content = await load_content(content_store, assignment)
+            minhash_signature = await asyncio.to_thread(signature_for, extracted_content, assignment_content)
+        
+        # Create submission record
         submission_data = {
             "id": submission_id,
             "assignment_id": assignment_id,
             "student_id": student_id,
             "student_name": student_name,
             "submitted_at": datetime.now(),
-            "status": "submitted",
-            "document_url": f"submissions/{submission_id}.pdf",
+            # Written once, after extraction and the upload, so the document is complete when it appears
+            "status": "processed",
+            "document_url": document_url,
             "ai_processing_status": "pending",
-            "extracted_content": extracted_content
+            "file_sha256": file_sha256,
+            "file_size": file_size,
+            "page_count": page_count,
+            "extracted_content_ref": extracted_content_ref,
+            "minhash_signature": minhash_signature
         }
         
-        db.collection('submissions').document(submission_id).set(submission_data)
-        
-        # Upload PDF to Firebase Storage
-        blob = bucket.blob(f"submissions/{submission_id}.pdf")
-        blob.upload_from_filename(file_path)
+        with span("db.write"):
+            await repository.set('submissions', submission_id, submission_data)
+        submission_updated(assignment_id, submission_id, submission_data)
+        similarity_indexes.add(assignment_id, submission_id, minhash_signature, student_id)
         
         # Clean up temp file
-        os.unlink(file_path)
-        
-        # Update submission status to indicate completion
-        db.collection('submissions').document(submission_id).update({
-            "status": "processed"
-        })
+        if local_copy is None:
+            os.unlink(file_path)
         
     except Exception as e:
-        print(f"Error processing submission: {str(e)}")
-        # Update submission status to indicate error
-        db.collection('submissions').document(submission_id).update({
+        log_event("submission_processing_failed", level="error", error=str(e))
+        # Update submission status to indicate error. The document may not exist
+        # yet, so write the fields that identify it as well
+        update = {
+            "id": submission_id,
+            "assignment_id": assignment_id,
+            "student_id": student_id,
+            "student_name": student_name,
+            "submitted_at": datetime.now(),
             "status": "error",
             "error_message": str(e)
-        })
+        }
+        await repository.set('submissions', submission_id, update, merge=True)
+        submission_updated(assignment_id, submission_id, update)
+        # Re-raise so the job queue can retry
+        raise
+    finally:
+        if local_copy is not None and os.path.exists(local_copy):
+            os.unlink(local_copy)
+
+@router.post("/assignments/{assignment_id}/submissions/bulk")
+@idempotency_keys.endpoint("create_submissions_bulk", ["assignment_id", "manifest", "auto_evaluate"])
+async def create_submissions_bulk(
+    assignment_id: str,
+    file: UploadFile = File(...),
+    manifest: str = Form(...),
+    auto_evaluate: bool = Form(False),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """
+    Upload a class's submissions as one ZIP of PDFs, with a manifest (JSON or
+    CSV) giving the student_id and student_name of each file.
+    """
+    archive_path = None
+    try:
+        try:
+            entries = parse_manifest(manifest)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        with span("db.read"):
+            assignment = await repository.get('assignments', assignment_id, fields=["id"])
+        if assignment is None:
+            raise HTTPException(status_code=404, detail="Assignment not found")
+        
+        # Stream the archive to disk; it is only unpacked by the job, one file at a time
+        archive_path = os.path.join(UPLOAD_TEMP_DIR, f"bulk_{uuid.uuid4()}.zip")
+        with span("upload.temp_write", assignment_id=assignment_id):
+            await save_zip_upload(file, archive_path, MAX_BULK_UPLOAD_BYTES)
+        
+        try:
+            names = await asyncio.to_thread(list_archive, archive_path)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        matched, rejected = match_entries(names, entries)
+        if not matched:
+            raise HTTPException(status_code=400, detail="None of the manifest's files are in the archive")
+        if len(matched) > MAX_BULK_UPLOAD_FILES:
+            raise HTTPException(
+                status_code=413, detail=f"Bulk uploads are limited to {MAX_BULK_UPLOAD_FILES} files"
+            )
+        
+        # Submission ids are assigned now so clients can follow each one right away
+        files = [
+            {
+                "file": member,
+                "student_id": entry.student_id,
+                "student_name": entry.student_name,
+                "submission_id": str(uuid.uuid4())
+            }
+            for entry, member in matched
+        ]
+        archive_blob_path = f"bulk-uploads/{os.path.basename(archive_path)}"
+        await stage_upload(archive_path, archive_blob_path)
+        archive_path = None
+        try:
+            job = await job_queue.enqueue("process_submission_batch", {
+                "assignment_id": assignment_id,
+                "archive_blob_path": archive_blob_path,
+                "files": files,
+                "auto_evaluate": auto_evaluate
+            }, priority=JOB_PRIORITY_SUBMISSION, max_attempts=1)
+        except Exception:
+            await blob_store.delete(archive_blob_path)
+            raise
+        # The job owns the staged archive from here on
+        
+        return {
+            "status": "processing",
+            "job_id": job["id"],
+            "submissions": [
+                {key: item[key] for key in ("file", "student_id", "submission_id")} for item in files
+            ],
+            "rejected": rejected
+        }
+    
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating submissions: {str(e)}")
+    finally:
+        if archive_path is not None and os.path.exists(archive_path):
+            os.unlink(archive_path)
+
+async def start_evaluation(assignment_id: str, submission_id: str) -> str:
+    """
+    Claim a freshly stored submission and queue its evaluation, as the evaluate
+    endpoint does. Returns the id of the new job, or of the job already
+    evaluating the submission (e.g. when a retried bulk job reaches it again).
+    """
+    submission = await repository.get(
+        'submissions', submission_id, fields=["ai_processing_status", "evaluation_job_id"]
+    )
+    job_id, claimed = await claim_evaluation(submission_id, submission or {})
+    if not claimed:
+        evaluation_stats["coalesced_requests"] += 1
+        return job_id
+    try:
+        await job_queue.enqueue("evaluate_submission", {
+            "assignment_id": assignment_id,
+            "submission_id": submission_id
+        }, priority=JOB_PRIORITY_EVALUATION, job_id=job_id)
+    except Exception:
+        await repository.update('submissions', submission_id, {"ai_processing_status": "pending"})
+        raise
+    submission_updated(assignment_id, submission_id, {"ai_processing_status": "processing"})
+    return job_id
+
+async def run_submission_batch(assignment_id: str, archive_blob_path: str, files: List[dict],
+                               auto_evaluate: bool = False):
+    """
+    Job handler: unpack a bulk upload and run each file through
+    process_and_store_submission. One task decompresses members in order while
+    BULK_UPLOAD_CONCURRENCY tasks process them; the queue between them bounds
+    how many unpacked PDFs sit on disk. Returns a per-file report.
+    """
+    # The job runs once (max_attempts=1), so the staged archive goes whatever happens
+    archive_path = os.path.join(UPLOAD_TEMP_DIR, os.path.basename(archive_blob_path))
+    try:
+        await download_upload(archive_blob_path, archive_path)
+        return await unpack_submission_batch(assignment_id, archive_path, files, auto_evaluate)
+    finally:
+        if os.path.exists(archive_path):
+            os.unlink(archive_path)
+        await blob_store.delete(archive_blob_path)
 
-@app.post("/evaluate/{assignment_id}/{submission_id}")
+async def unpack_submission_batch(assignment_id: str, archive_path: str, files: List[dict],
+                                  auto_evaluate: bool):
+    """Process the members of a bulk upload archive fetched to archive_path."""
+    results = [dict(item, status="pending") for item in files]
+    progress = {"total": len(results), "done": 0, "failed": 0, "remaining": len(results)}
+    await job_queue.report_progress(progress)
+    queue = asyncio.Queue(maxsize=BULK_UPLOAD_CONCURRENCY)
+    
+    async def finish(result: dict, error: Optional[str] = None):
+        if error is None:
+            progress["done"] += 1
+        else:
+            result.update(status="failed", error=error)
+            progress["failed"] += 1
+        progress["remaining"] = progress["total"] - progress["done"] - progress["failed"]
+        try:
+            await job_queue.report_progress(progress)
+        except Exception as e:
+            log_event("bulk_progress_failed", level="warning", error=str(e))
+    
+    async def unpack():
+        try:
+            archive = await asyncio.to_thread(zipfile.ZipFile, archive_path)
+            try:
+                for result in results:
+                    destination = os.path.join(UPLOAD_TEMP_DIR, f"temp_{result['submission_id']}.pdf")
+                    try:
+                        with span("upload.unpack", submission_id=result["submission_id"]):
+                            upload = await asyncio.to_thread(
+                                extract_pdf_entry, archive, result["file"], destination, MAX_UPLOAD_BYTES
+                            )
+                    except Exception as e:
+                        await finish(result, e.detail if isinstance(e, HTTPException) else str(e))
+                        continue
+                    await queue.put((result, upload))
+            finally:
+                archive.close()
+        finally:
+            for _ in range(BULK_UPLOAD_CONCURRENCY):
+                await queue.put(None)
+    
+    async def process():
+        while (item := await queue.get()) is not None:
+            result, upload = item
+            with bind_log_context(submission_id=result["submission_id"]):
+                try:
+                    # The same PDF from the same student is one submission, as for single uploads
+                    earlier = await claim_submission_upload(
+                        assignment_id, result["student_id"], upload.sha256, result["submission_id"],
+                        current_job_id.get()
+                    )
+                    if earlier is not None:
+                        os.unlink(upload.path)
+                        result.update(status="duplicate", duplicate_of=earlier["submission_id"])
+                        await finish(result)
+                        continue
+                    await process_and_store_submission(
+                        result["submission_id"], assignment_id, result["student_id"], result["student_name"],
+                        upload.path, upload.sha256, upload.size, upload.page_count
+                    )
+                except Exception as e:
+                    if os.path.exists(upload.path):
+                        os.unlink(upload.path)
+                    await finish(result, str(e))
+                    continue
+            result["status"] = "processed"
+            if auto_evaluate:
+                try:
+                    result["evaluation_job_id"] = await start_evaluation(assignment_id, result["submission_id"])
+                except Exception as e:
+                    # The submission is stored; it can still be evaluated on request
+                    result["evaluation_error"] = str(e)
+            await finish(result)
+    
+    # Every task is finished before the archive is removed, even when one of them fails
+    outcomes = await asyncio.gather(
+        unpack(), *(process() for _ in range(BULK_UPLOAD_CONCURRENCY)), return_exceptions=True
+    )
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            raise outcome
+    
+    return {**progress, "submissions": results}
+
+@router.post("/evaluate/{assignment_id}/{submission_id}")
 async def evaluate_submission(
     assignment_id: str, 
-    submission_id: str,
-    background_tasks: BackgroundTasks
+    submission_id: str
 ):
     """
     Teacher requests evaluation of a student submission.
     """
     try:
         # Check if submission exists
-        submission_ref = db.collection('submissions').document(submission_id)
-        submission = submission_ref.get()
+        submission_data = await repository.get(
+            'submissions', submission_id, fields=["assignment_id", "ai_processing_status", "evaluation_job_id"]
+        )
         
-        if not submission.exists:
+        if submission_data is None:
             raise HTTPException(status_code=404, detail="Submission not found")
-            
-        submission_data = submission.to_dict()
         
         if submission_data.get('assignment_id') != assignment_id:
             raise HTTPException(status_code=400, detail="Submission does not match assignment")
         
-        # Update submission status
-        submission_ref.update({
-            "ai_processing_status": "processing"
-        })
+        # Update submission status, unless an evaluation of it is already queued or running
+        job_id, claimed = await claim_evaluation(submission_id, submission_data)
+        if not claimed:
+            evaluation_stats["coalesced_requests"] += 1
+            return {"status": "Evaluation already in progress", "submission_id": submission_id, "job_id": job_id}
+        submission_updated(assignment_id, submission_id, {"ai_processing_status": "processing"})
         
-        # Start evaluation in background
-        background_tasks.add_task(run_evaluation, assignment_id, submission_id)
+        # Queue the evaluation
+        job = await job_queue.enqueue("evaluate_submission", {
+            "assignment_id": assignment_id,
+            "submission_id": submission_id
+        }, priority=JOB_PRIORITY_EVALUATION, job_id=job_id)
         
-        return {"status": "Evaluation started", "submission_id": submission_id}
+        return {"status": "Evaluation started", "submission_id": submission_id, "job_id": job["id"]}
         
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error starting evaluation: {str(e)}")
 
-@app.get("/assignments/")
-async def list_assignments():
-    """List all assignments."""
-    try:
-        assignments = []
-        for doc in db.collection('assignments').stream():
-            assignment = doc.to_dict()
-            # Remove the large extracted_content field from the response
-            if "extracted_content" in assignment:
-                assignment["has_extracted_content"] = True
-                del assignment["extracted_content"]
-            assignments.append(assignment)
-        return assignments
+@router.post("/evaluate/{assignment_id}/{submission_id}/questions/{question_reference}")
+async def regrade_question(
+    assignment_id: str,
+    submission_id: str,
+    question_reference: str
+):
+    """
+    Teacher requests re-evaluation of a single question of a submission.
+    """
+    try:
+        reference = normalize_reference(question_reference)
+        if reference is None:
+            raise HTTPException(status_code=400, detail="Invalid question reference")
+
+        assignment, submission = await asyncio.gather(
+            repository.get('assignments', assignment_id, fields=CONTENT_FIELDS),
+            repository.get('submissions', submission_id, fields=[
+                "assignment_id", "ai_processing_status", "evaluation_job_id", "evaluation_result"
+            ])
+        )
+        if submission is None:
+            raise HTTPException(status_code=404, detail="Submission not found")
+        if submission.get('assignment_id') != assignment_id:
+            raise HTTPException(status_code=400, detail="Submission does not match assignment")
+        if assignment is None:
+            raise HTTPException(status_code=404, detail="Assignment not found")
+        conflict = await regrade_conflict(submission)
+        if conflict is not None:
+            raise HTTPException(status_code=409, detail=conflict)
+
+        _, questions = split_questions(await load_content(content_store, assignment))
+        if reference not in questions:
+            raise HTTPException(status_code=404, detail=f"Question {question_reference} not found in assignment")
+
+        job = await job_queue.enqueue("evaluate_question", {
+            "assignment_id": assignment_id,
+            "submission_id": submission_id,
+            "question_reference": reference
+        }, priority=JOB_PRIORITY_EVALUATION)
+
+        return {"status": "Question re-evaluation started", "submission_id": submission_id,
+                "question_reference": reference, "job_id": job["id"]}
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting question re-evaluation: {str(e)}")
+
+@router.post("/assignments/{assignment_id}/evaluate-all")
+async def evaluate_all_submissions(assignment_id: str):
+    """
+    Teacher requests evaluation of every pending or failed submission for an assignment.
+    """
+    try:
+        # Check if assignment exists
+        assignment = await repository.get('assignments', assignment_id, fields=["id"])
+        
+        if assignment is None:
+            raise HTTPException(status_code=404, detail="Assignment not found")
+        
+        # Queue the bulk evaluation; per-submission failures are recorded, not retried
+        job = await job_queue.enqueue("evaluate_all", {
+            "assignment_id": assignment_id
+        }, priority=JOB_PRIORITY_EVALUATE_ALL, max_attempts=1)
+        
+        return {"status": "Evaluation started", "assignment_id": assignment_id, "job_id": job["id"]}
+        
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting bulk evaluation: {str(e)}")
+
+async def list_documents(collection: str, filters: dict, order_field: str, limit: int,
+                         page_token: Optional[str], fields: List[str]) -> AsyncIterator[dict]:
+    """
+    Query a listing newest first with cursor pagination.
+    The page token is the id of the last item of the previous page.
+    """
+    try:
+        return await repository.query(
+            collection, filters=filters, order_by=order_field, limit=limit,
+            start_after=page_token, fields=fields
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid page_token")
+
+# Listings are answered with an ETag only. It is a digest of the rendered items,
+# ids and updated_at included, so it changes when an item leaves a filtered list;
+# the newest updated_at of what is left would not, so Last-Modified is not sent.
+# The digest needs the whole body before the headers go out, so a page is
+# rendered in full rather than streamed; limit caps it at LIST_MAX_LIMIT
+# projected items, a few hundred KB at most.
+def list_item(data: dict) -> dict:
+    """Shape a projected document for a listing response."""
+    # Documents only lack extracted content when processing failed before it was stored
+    data["has_extracted_content"] = data.get("status") != "error"
+    return data
+
+@router.get("/assignments/")
+async def list_assignments(
+    request: Request,
+    limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    page_token: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """List assignments, newest first."""
+    try:
+        filters = {}
+        if status:
+            filters['status'] = status
+        
+        async def build():
+            documents = await list_documents('assignments', filters, 'created_at', limit, page_token,
+                                             ASSIGNMENT_LIST_FIELDS)
+            assignments = []
+            async for assignment in documents:
+                # Warm the summary cache used by the submission listings
+                assignment_summary_cache[assignment['id']] = assignment_summary(assignment)
+                assignments.append(list_item(assignment))
+            return assignments, None
+        
+        return await cached_json(request, ("assignments",), build)
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing assignments: {str(e)}")
 
-@app.get("/assignments/{assignment_id}/submissions")
-async def list_submissions_for_assignment(assignment_id: str):
-    """List all submissions for a specific assignment."""
-    try:
-        submissions = []
-        for doc in db.collection('submissions').where('assignment_id', '==', assignment_id).stream():
-            submission = doc.to_dict()
-            # Remove the large extracted_content field from the response
-            if "extracted_content" in submission:
-                submission["has_extracted_content"] = True
-                del submission["extracted_content"]
-            submissions.append(submission)
-        return submissions
+@router.get("/assignments/{assignment_id}/submissions")
+async def list_submissions_for_assignment(
+    assignment_id: str,
+    request: Request,
+    limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    page_token: Optional[str] = None,
+    status: Optional[str] = None,
+    ai_processing_status: Optional[str] = None
+):
+    """List submissions for a specific assignment, newest first."""
+    try:
+        filters = {'assignment_id': assignment_id}
+        if status:
+            filters['status'] = status
+        if ai_processing_status:
+            filters['ai_processing_status'] = ai_processing_status
+        
+        async def build():
+            documents = await list_documents('submissions', filters, 'submitted_at', limit, page_token,
+                                             SUBMISSION_LIST_FIELDS)
+            submissions = [list_item(submission) async for submission in documents]
+            return submissions, None
+        
+        return await cached_json(request, (f"assignment-submissions:{assignment_id}",), build)
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing submissions: {str(e)}")
 
-@app.get("/students/{student_id}/submissions")
-async def list_student_submissions(student_id: str):
-    """List all submissions made by a specific student."""
+@router.get("/students/{student_id}/submissions")
+async def list_student_submissions(
+    student_id: str,
+    request: Request,
+    limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+    page_token: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """List submissions made by a specific student, newest first."""
     try:
-        submissions = []
-        for doc in db.collection('submissions').where('student_id', '==', student_id).stream():
-            submission = doc.to_dict()
-            
-            # Get assignment details for each submission
-            assignment_ref = db.collection('assignments').document(submission['assignment_id'])
-            assignment = assignment_ref.get().to_dict()
-            
-            # Add assignment details to submission
-            submission['assignment'] = {
-                'title': assignment.get('title', ''),
-                'description': assignment.get('description', '')
-            }
+        filters = {'student_id': student_id}
+        if status:
+            filters['status'] = status
+        
+        async def build():
+            documents = await list_documents('submissions', filters, 'submitted_at', limit, page_token,
+                                             SUBMISSION_LIST_FIELDS)
+            submissions = [list_item(submission) async for submission in documents]
             
-            # Remove the large extracted_content field from the response
-            if "extracted_content" in submission:
-                submission["has_extracted_content"] = True
-                del submission["extracted_content"]
-                
-            submissions.append(submission)
-        return submissions
+            # Get assignment details for all submissions in one batch
+            summaries = await get_assignment_summaries(
+                submission['assignment_id'] for submission in submissions
+            )
+            for submission in submissions:
+                submission['assignment'] = summaries.get(
+                    submission['assignment_id'], {'title': '', 'description': ''}
+                )
+            return submissions, None
+        
+        return await cached_json(request, ("student-submissions",), build)
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing student submissions: {str(e)}")
 
-@app.get("/submissions/{submission_id}/feedback")
-async def get_submission_feedback(submission_id: str):
+def stream_status_events(request: Request, assignment_id: str, initial_events: Callable[[], Awaitable[List[tuple]]],
+                         submission_id: Optional[str] = None) -> StreamingResponse:
+    """
+    SSE stream of status events for an assignment's submissions (or one of them).
+
+    The initial state is read after subscribing, so no change falls between the
+    two; idle streams get a keep-alive comment every STATUS_EVENTS_HEARTBEAT_SECONDS.
+    """
+    async def body():
+        async with status_events.subscribe(assignment_id) as queue:
+            # Reconnect quickly after a dropped connection
+            yield "retry: 3000\n\n"
+            for event_name, data in await initial_events():
+                yield sse_message(data, event_name)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=STATUS_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                if submission_id is None or event["submission_id"] == submission_id:
+                    yield sse_message(event, "status")
+
+    return StreamingResponse(body(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        # Stop reverse proxies from buffering the stream
+        "X-Accel-Buffering": "no"
+    })
+
+@router.get("/submissions/{submission_id}/events")
+async def submission_events(submission_id: str, request: Request):
+    """Server-Sent Events stream of a submission's status changes, starting with its current status."""
+    submission = await repository.get('submissions', submission_id, fields=["assignment_id"])
+    if submission is None:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    assignment_id = submission.get("assignment_id", "")
+
+    async def initial_events():
+        current = await repository.get('submissions', submission_id, fields=list(STATUS_FIELDS))
+        return [("status", {"submission_id": submission_id, "assignment_id": assignment_id, **(current or {})})]
+
+    return stream_status_events(request, assignment_id, initial_events, submission_id)
+
+@router.get("/assignments/{assignment_id}/submissions/events")
+async def assignment_submission_events(assignment_id: str, request: Request):
+    """
+    Server-Sent Events stream of status changes for all submissions of an
+    assignment, starting with a snapshot of their current statuses.
+    """
+    assignment = await repository.get('assignments', assignment_id, fields=["id"])
+    if assignment is None:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+
+    async def initial_events():
+        submissions = [
+            {"submission_id": submission.pop("id"), "assignment_id": assignment_id, **submission}
+            async for submission in await repository.query(
+                'submissions', filters={'assignment_id': assignment_id}, fields=["id", *STATUS_FIELDS]
+            )
+        ]
+        return [("snapshot", submissions)]
+
+    return stream_status_events(request, assignment_id, initial_events)
+
+@router.get("/submissions/{submission_id}/feedback")
+async def get_submission_feedback(submission_id: str, request: Request):
     """Get detailed feedback for a submission."""
     try:
-        # Get submission data
-        submission_ref = db.collection('submissions').document(submission_id)
-        submission = submission_ref.get()
-        
-        if not submission.exists:
-            raise HTTPException(status_code=404, detail="Submission not found")
+        async def build():
+            # Get submission data
+            submission_data = await repository.get('submissions', submission_id)
             
-        submission_data = submission.to_dict()
-        
-        # Extract evaluation result
-        evaluation_result = submission_data.get("evaluation_result", {})
-        
-        # Create response object
-        response = {
-            'submission_id': submission_id,
-            'assignment_id': submission_data.get('assignment_id', ''),
-            'student_id': submission_data.get('student_id', ''),
-            'question_evaluations': evaluation_result.get('question_evaluations', []),
-            'overall_feedback': evaluation_result.get('overall_feedback', ''),
-            'overall_marks': evaluation_result.get('overall_marks', 0),
-            'max_possible_marks': evaluation_result.get('max_possible_marks', 0),
-            'feedback_categories': feedback_categories
-        }
+            if submission_data is None:
+                raise HTTPException(status_code=404, detail="Submission not found")
+            
+            # Extract evaluation result
+            evaluation_result = submission_data.get("evaluation_result", {})
+            
+            # Create response object
+            response = {
+                'submission_id': submission_id,
+                'assignment_id': submission_data.get('assignment_id', ''),
+                'student_id': submission_data.get('student_id', ''),
+                'question_evaluations': evaluation_result.get('question_evaluations', []),
+                'overall_feedback': evaluation_result.get('overall_feedback', ''),
+                'overall_marks': evaluation_result.get('overall_marks', 0),
+                'max_possible_marks': evaluation_result.get('max_possible_marks', 0),
+                'feedback_categories': feedback_categories
+            }
+            
+            return response, submission_data.get("updated_at")
         
-        return response
+        return await cached_json(request, (f"submission:{submission_id}",), build)
         
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting feedback: {str(e)}")
 
-@app.get("/assignments/{assignment_id}")
-async def get_assignment_details(assignment_id: str, include_content: bool = False):
-    """Get detailed information about an assignment."""
+@router.get("/assignments/{assignment_id}/analytics")
+async def get_assignment_analytics(assignment_id: str, request: Request):
+    """Class analytics for an assignment: score distribution, per-question averages and feedback categories."""
     try:
-        # Get assignment data
-        assignment_ref = db.collection('assignments').document(assignment_id)
-        assignment = assignment_ref.get()
+        async def build():
+            aggregate = await repository.get(ASSIGNMENT_ANALYTICS, assignment_id)
+            # Only an assignment without evaluations has no aggregate yet
+            if aggregate is None and await repository.get('assignments', assignment_id, fields=["id"]) is None:
+                raise HTTPException(status_code=404, detail="Assignment not found")
+            analytics = {"assignment_id": assignment_id, **summarize(aggregate, feedback_categories)}
+            return analytics, analytics["updated_at"]
         
-        if not assignment.exists:
-            raise HTTPException(status_code=404, detail="Assignment not found")
-            
-        assignment_data = assignment.to_dict()
+        return await cached_json(request, (f"assignment-submissions:{assignment_id}",), build)
+        
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting assignment analytics: {str(e)}")
+
+@router.get("/assignments/{assignment_id}/similarity")
+async def get_assignment_similarity(
+    assignment_id: str,
+    request: Request,
+    min_score: Optional[float] = Query(None, ge=0, le=1),
+    limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT)
+):
+    """Pairs of submissions to an assignment that are near-copies of each other, most similar first."""
+    try:
+        async def build():
+            index = await similarity_indexes.get(assignment_id)
+            if not len(index) and await repository.get('assignments', assignment_id, fields=["id"]) is None:
+                raise HTTPException(status_code=404, detail="Assignment not found")
+            return {
+                "assignment_id": assignment_id,
+                "indexed_submissions": len(index),
+                "min_score": index.threshold if min_score is None else min_score,
+                "pairs": index.similar_pairs(min_score, limit)
+            }, None
+        
+        return await cached_json(request, (f"assignment-submissions:{assignment_id}",), build)
         
-        # Optionally include or exclude the extracted content
-        if not include_content and "extracted_content" in assignment_data:
-            assignment_data["has_extracted_content"] = True
-            del assignment_data["extracted_content"]
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting similar submissions: {str(e)}")
+
+@router.get("/students/{student_id}/analytics")
+async def get_student_analytics(student_id: str, request: Request):
+    """A student's results across all their evaluated submissions."""
+    try:
+        async def build():
+            aggregate = await repository.get(STUDENT_ANALYTICS, student_id)
+            analytics = {"student_id": student_id, **summarize(aggregate, feedback_categories)}
+            # Per-question averages are only meaningful within one assignment
+            analytics.pop("questions")
+            return analytics, analytics["updated_at"]
+        
+        return await cached_json(request, ("student-submissions",), build)
+        
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting student analytics: {str(e)}")
+
+@router.get("/assignments/{assignment_id}")
+async def get_assignment_details(assignment_id: str, request: Request, include_content: bool = False):
+    """Get detailed information about an assignment."""
+    try:
+        async def build():
+            # Get assignment data
+            assignment_data = await repository.get('assignments', assignment_id)
+            
+            if assignment_data is None:
+                raise HTTPException(status_code=404, detail="Assignment not found")
+            
+            # Optionally include or exclude the extracted content
+            content_ref = assignment_data.pop("extracted_content_ref", None)
+            if include_content:
+                if content_ref is not None:
+                    assignment_data["extracted_content"] = await content_store.get(content_ref)
+            elif content_ref is not None or "extracted_content" in assignment_data:
+                assignment_data["has_extracted_content"] = True
+                assignment_data.pop("extracted_content", None)
             
-        return assignment_data
+            return assignment_data, assignment_data.get("updated_at")
+        
+        return await cached_json(request, (f"assignment:{assignment_id}",), build)
         
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting assignment details: {str(e)}")
 
-@app.get("/submissions/{submission_id}")
-async def get_submission_details(submission_id: str, include_content: bool = False):
+@router.get("/submissions/{submission_id}")
+async def get_submission_details(submission_id: str, request: Request, include_content: bool = False):
     """Get detailed information about a submission."""
     try:
-        # Get submission data
-        submission_ref = db.collection('submissions').document(submission_id)
-        submission = submission_ref.get()
-        
-        if not submission.exists:
-            raise HTTPException(status_code=404, detail="Submission not found")
+        async def build():
+            # Get submission data
+            submission_data = await repository.get('submissions', submission_id)
             
-        submission_data = submission.to_dict()
-        
-        # Optionally include or exclude the extracted content
-        if not include_content and "extracted_content" in submission_data:
-            submission_data["has_extracted_content"] = True
-            del submission_data["extracted_content"]
+            if submission_data is None:
+                raise HTTPException(status_code=404, detail="Submission not found")
             
-        return submission_data
+            # Optionally include or exclude the extracted content
+            content_ref = submission_data.pop("extracted_content_ref", None)
+            submission_data.pop("minhash_signature", None)
+            if include_content:
+                if content_ref is not None:
+                    submission_data["extracted_content"] = await content_store.get(content_ref)
+            elif content_ref is not None or "extracted_content" in submission_data:
+                submission_data["has_extracted_content"] = True
+                submission_data.pop("extracted_content", None)
+            
+            return submission_data, submission_data.get("updated_at")
+        
+        return await cached_json(request, (f"submission:{submission_id}",), build)
         
     except HTTPException as e:
         raise e
@@ -588,26 +2244,30 @@ async def get_submission_details(submission_id: str, include_content: bool = Fal
 
 # Add these new endpoints after your existing endpoints, before the if __name__ == "__main__" block
 
-@app.put("/submissions/{submission_id}/feedback")
+@router.put("/submissions/{submission_id}/feedback")
 async def update_submission_feedback(submission_id: str, feedbackData: dict):
     """Update feedback for a submission."""
     try:
-        # Get submission reference
-        submission_ref = db.collection('submissions').document(submission_id)
-        submission = submission_ref.get()
+        # Check the submission exists
+        submission = await repository.get('submissions', submission_id, fields=["assignment_id", "student_id"])
         
-        if not submission.exists:
+        if submission is None:
             raise HTTPException(status_code=404, detail="Submission not found")
             
         # Update the evaluation result with new feedback
-        submission_ref.update({
+        update = {
             "evaluation_result": feedbackData,
             "overall_feedback": feedbackData.get("overall_feedback", ""),
             "overall_marks": feedbackData.get("overall_marks", 0),
             "max_possible_marks": feedbackData.get("max_possible_marks", 0),
             "last_modified": datetime.now(),
             "modified_by": "teacher"  # You might want to pass teacher_id as parameter
-        })
+        }
+        # The class analytics are updated in the same transaction
+        await record_evaluations(repository, submission.get("assignment_id"), [
+            (submission_id, submission.get("student_id"), update)
+        ])
+        submission_updated(submission.get("assignment_id"), submission_id, update)
         
         return {"status": "success", "message": "Feedback updated successfully"}
         
@@ -616,23 +2276,23 @@ async def update_submission_feedback(submission_id: str, feedbackData: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating feedback: {str(e)}")
 
-@app.post("/submissions/{submission_id}/approve-feedback")
+@router.post("/submissions/{submission_id}/approve-feedback")
 async def approve_submission_feedback(submission_id: str):
     """Approve feedback for a submission and make it visible to student."""
     try:
-        # Get submission reference
-        submission_ref = db.collection('submissions').document(submission_id)
-        submission = submission_ref.get()
+        # Check the submission exists
+        submission = await repository.get('submissions', submission_id, fields=["assignment_id"])
         
-        if not submission.exists:
+        if submission is None:
             raise HTTPException(status_code=404, detail="Submission not found")
             
         # Update submission status to indicate feedback is approved
-        submission_ref.update({
+        await repository.update('submissions', submission_id, {
             "feedback_status": "approved",
             "feedback_approved_at": datetime.now(),
             "feedback_visible_to_student": True
         })
+        submission_updated(submission.get("assignment_id", ""), submission_id, {"feedback_status": "approved"})
         
         return {"status": "success", "message": "Feedback approved and made visible to student"}
         
@@ -641,6 +2301,115 @@ async def approve_submission_feedback(submission_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error approving feedback: {str(e)}")
 
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Get the status of a queued extraction or evaluation job."""
+    try:
+        job = await job_queue.get(job_id)
+        
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+            
+        return job
+        
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting job status: {str(e)}")
+
+@router.get("/stats")
+async def get_stats():
+    """Get internal counters such as extraction cache hits and misses."""
+    return {
+        "extraction_cache": extraction_cache.stats(),
+        "extraction": extraction_stats,
+        "evaluation_context_cache": evaluation_context_cache.stats(),
+        "content_store": content_store.stats(),
+        "similarity": similarity_indexes.stats(),
+        "idempotency": idempotency_keys.stats(),
+        "evaluations": evaluation_stats,
+        "response_cache": response_cache.stats(),
+        "evaluation_parsing": evaluation_parse_stats,
+        "llm_gateways": {
+            "extraction": extraction_llm.stats(),
+            "evaluation": evaluation_llm.stats(),
+        },
+        "jobs": await job_queue.stats(),
+        "status_events": status_events.stats(),
+        "event_loop_lag": loop_lag_monitor.stats()
+    }
+
+# Gauges sampled when /metrics is scraped
+jobs_gauge = registry.gauge("eduassign_jobs", "Jobs in the job store by status", ["status"])
+jobs_in_flight_gauge = registry.gauge("eduassign_jobs_in_flight", "Jobs running in this process")
+llm_in_flight_gauge = registry.gauge("eduassign_llm_in_flight", "LLM requests in flight", ["gateway"])
+llm_concurrency_gauge = registry.gauge(
+    "eduassign_llm_concurrency_limit", "Current adaptive concurrency window", ["gateway"]
+)
+loop_lag_gauge = registry.gauge("eduassign_event_loop_lag_seconds", "Most recent event loop lag sample")
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus metrics: stage durations, LLM usage and cost, extraction and
+    parse outcomes, queue depth and in-flight work.
+    """
+    job_stats = await job_queue.stats()
+    for status in ("queued", "running", "failed"):
+        jobs_gauge.set(job_stats[status], status=status)
+    jobs_in_flight_gauge.set(job_stats["in_flight"])
+    for gateway in (extraction_llm, evaluation_llm):
+        llm_in_flight_gauge.set(gateway.limiter.in_flight, gateway=gateway.name)
+        llm_concurrency_gauge.set(gateway.limiter.limit, gateway=gateway.name)
+    loop_lag_gauge.set(loop_lag_monitor.last_lag)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+# Job handlers
+job_queue.register("process_assignment", "extract", process_and_store_assignment)
+job_queue.register("process_submission", "extract", process_and_store_submission)
+job_queue.register("process_submission_batch", "extract", run_submission_batch)
+job_queue.register("evaluate_submission", "evaluate", run_evaluation_job)
+job_queue.register("evaluate_all", "evaluate", run_evaluate_all)
+job_queue.register("evaluate_question", "evaluate", run_question_regrade)
+
+async def start_job_workers():
+    """Start the in-process worker pools when no separate worker is deployed."""
+    loop_lag_monitor.start()
+    if RUN_EMBEDDED_WORKER:
+        job_queue.start()
+
+async def stop_job_workers():
+    """Stop the in-process worker pools; running jobs are requeued when their lease expires."""
+    await job_queue.stop()
+    await loop_lag_monitor.stop()
+    blob_store.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_job_workers()
+    try:
+        yield
+    finally:
+        await stop_job_workers()
+
+def create_app() -> FastAPI:
+    """Build the API application (used by serve.py and `uvicorn backend:app`)."""
+    application = FastAPI(title="Assignment Management System", 
+                          description="API for managing assignments, submissions, and evaluations",
+                          lifespan=lifespan)
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,  # Allow specific origins
+        allow_credentials=True,
+        allow_methods=["*"],  # Allow all HTTP methods (GET, POST, PUT, DELETE, etc.)
+        allow_headers=["*"],  # Allow all headers
+    )
+    application.middleware("http")(reject_oversized_uploads)
+    application.include_router(router)
+    return application
+
+app = create_app()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,273 @@
+"""Configurable-latency stand-ins for zerox, Gemini and the datastore."""
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+from types import SimpleNamespace
+from typing import List, Optional
+
+from google.api_core.exceptions import ResourceExhausted
+
+from evaluation_schema import (
+    EVALUATION_RESULT_SCHEMA, QUESTION_EVALUATION_SCHEMA, QUESTION_EVALUATIONS_SCHEMA, OVERALL_FEEDBACK_SCHEMA
+)
+
+
+class Latency:
+    """Mean latency in milliseconds with uniform +/- jitter (0.2 means +/-20%)."""
+
+    def __init__(self, mean_ms: float, jitter: float = 0.2):
+        self.mean_ms = mean_ms
+        self.jitter = jitter
+
+    def sample(self) -> float:
+        if self.mean_ms <= 0:
+            return 0.0
+        return self.mean_ms * random.uniform(1 - self.jitter, 1 + self.jitter) / 1000
+
+    async def wait(self):
+        delay = self.sample()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def block(self):
+        # For work that runs in a thread (rendering, blocking clients)
+        delay = self.sample()
+        if delay:
+            time.sleep(delay)
+
+
+def _escape_pdf_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: List[Optional[str]], label: str = "") -> bytes:
+    """
+    Build a small PDF with one page per entry. A string becomes a page with a
+    text layer; None becomes a blank page, which extraction treats like a scan.
+    The label goes into a comment so otherwise identical files hash differently.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_ids = []
+    for text in pages:
+        lines = (text or "").splitlines()
+        stream = "BT /F1 11 Tf 14 TL 50 760 Td " + " ".join(
+            f"({_escape_pdf_text(line)}) Tj T*" for line in lines
+        ) + " ET" if lines else ""
+        content = stream.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%%PDF-1.4\n%% %s\n" % label.encode())
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(out)
+
+
+class FakeVisionModel:
+    """Stands in for the zerox litellm model: returns page markdown after a delay."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.calls = 0
+
+    async def completion(self, image_path: str, maintain_format: bool, prior_page: str):
+        self.calls += 1
+        await self.latency.wait()
+        name = os.path.basename(image_path)
+        return SimpleNamespace(
+            content=f"## Page {name}\n\nQ1. Scanned answer text for {name}.\n",
+            input_tokens=1100,
+            output_tokens=120,
+        )
+
+
+def make_fake_render(latency: Latency):
+    """Replacement for extraction.render_pages that writes one small unique file per page."""
+    def render_pages(file_path: str, page_numbers, output_dir: str):
+        from PyPDF2 import PdfReader
+
+        if page_numbers is None:
+            page_numbers = list(range(1, len(PdfReader(file_path).pages) + 1))
+        with open(file_path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        images = {}
+        for page_number in page_numbers:
+            latency.block()
+            path = os.path.join(output_dir, f"page_{page_number}.png")
+            with open(path, "wb") as f:
+                f.write(f"{digest}:{page_number}".encode())
+            images[page_number] = path
+        return images
+    return render_pages
+
+
+class FakeGenerativeModel:
+    """Stands in for genai.GenerativeModel, answering with JSON for the requested schema."""
+
+    latency = Latency(0)
+    error_rate = 0.0
+    questions = 3
+    calls = 0
+
+    def __init__(self, model_name: str = "fake", **kwargs):
+        self.model_name = model_name
+
+    @classmethod
+    def configure(cls, latency: Latency, error_rate: float, questions: int):
+        cls.latency = latency
+        cls.error_rate = error_rate
+        cls.questions = questions
+
+    @staticmethod
+    def _question(reference: str) -> dict:
+        max_marks = 10
+        return {
+            "question_reference": reference,
+            "marks_awarded": random.randint(0, max_marks),
+            "max_marks": max_marks,
+            "feedback": [{"category_id": random.randint(1, 6), "text": f"Feedback for {reference}."}],
+        }
+
+    def _answer(self, schema) -> object:
+        if schema is QUESTION_EVALUATION_SCHEMA:
+            return self._question("Q1")
+        if schema is QUESTION_EVALUATIONS_SCHEMA:
+            return [self._question("Q1")]
+        if schema is OVERALL_FEEDBACK_SCHEMA:
+            return {"overall_feedback": "Solid work overall."}
+        questions = [self._question(f"Q{number}") for number in range(1, self.questions + 1)]
+        return {
+            "question_evaluations": questions,
+            "overall_feedback": "Solid work overall.",
+            "overall_marks": sum(question["marks_awarded"] for question in questions),
+            "max_possible_marks": sum(question["max_marks"] for question in questions),
+        }
+
+    async def generate_content_async(self, contents, generation_config=None, **kwargs):
+        type(self).calls += 1
+        await self.latency.wait()
+        if random.random() < self.error_rate:
+            raise ResourceExhausted('Quota exceeded (fake). "retryDelay": "1s"')
+        schema = getattr(generation_config, "response_schema", EVALUATION_RESULT_SCHEMA)
+        text = json.dumps(self._answer(schema))
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=len(str(contents)) // 4,
+                candidates_token_count=len(text) // 4,
+                total_token_count=len(str(contents)) // 4 + len(text) // 4,
+                cached_content_token_count=0,
+            ),
+        )
+
+
+class LatencyRepository:
+    """Wraps a document repository, adding a round-trip delay to every call."""
+
+    def __init__(self, inner, latency: Latency):
+        self.inner = inner
+        self.latency = latency
+        self.calls = 0
+
+    async def _round_trip(self):
+        self.calls += 1
+        await self.latency.wait()
+
+    async def get(self, *args, **kwargs):
+        await self._round_trip()
+        return await self.inner.get(*args, **kwargs)
+
+    async def get_many(self, *args, **kwargs):
+        await self._round_trip()
+        return await self.inner.get_many(*args, **kwargs)
+
+    async def set(self, *args, **kwargs):
+        await self._round_trip()
+        return await self.inner.set(*args, **kwargs)
+
+    async def update(self, *args, **kwargs):
+        await self._round_trip()
+        return await self.inner.update(*args, **kwargs)
+
+    async def update_many(self, *args, **kwargs):
+        await self._round_trip()
+        return await self.inner.update_many(*args, **kwargs)
+
+    async def query(self, *args, **kwargs):
+        await self._round_trip()
+        return await self.inner.query(*args, **kwargs)
+
+    async def transaction(self, *args, **kwargs):
+        # Reads, then the commit
+        await self._round_trip()
+        await self._round_trip()
+        return await self.inner.transaction(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # Anything else (added by later features) passes straight through
+        return getattr(self.inner, name)
+
+
+class FakeBlobStore:
+    """Blob store kept in memory, with a delay per transfer."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.uploads = 0
+        self.downloads = 0
+        self.objects = {}
+
+    async def upload(self, file_path: str, destination: str):
+        self.uploads += 1
+        await self.latency.wait()
+        # Staged uploads are fetched again by the jobs processing them
+        with open(file_path, "rb") as f:
+            self.objects[destination] = f.read()
+
+    async def upload_bytes(self, data: bytes, destination: str, if_absent: bool = False) -> bool:
+        self.uploads += 1
+        await self.latency.wait()
+        if if_absent and destination in self.objects:
+            return False
+        self.objects[destination] = data
+        return True
+
+    async def download_bytes(self, destination: str) -> Optional[bytes]:
+        self.downloads += 1
+        await self.latency.wait()
+        return self.objects.get(destination)
+
+    async def download(self, destination: str, file_path: str) -> bool:
+        data = await self.download_bytes(destination)
+        if data is None:
+            return False
+        with open(file_path, "wb") as f:
+            f.write(data)
+        return True
+
+    async def delete(self, destination: str):
+        self.objects.pop(destination, None)
+
+    def close(self):
+        pass
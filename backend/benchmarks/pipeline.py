@@ -0,0 +1,391 @@
+"""
+Load test of the upload -> extract -> evaluate pipeline against fakes.
+
+Drives the real FastAPI app in-process (httpx ASGI transport) with zerox,
+Gemini, the datastore and blob storage replaced by configurable-latency
+fakes, and writes latency percentiles, job throughput and peak RSS to JSON.
+
+Run from the backend directory:
+
+    python -m benchmarks.pipeline --submissions 200 --concurrency 20
+    python -m benchmarks.pipeline --compare benchmarks/results/<earlier>.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=100, help="submissions to upload and evaluate")
+    parser.add_argument("--students", type=int, default=25)
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent client requests")
+    parser.add_argument("--list-requests", type=int, default=200, help="list endpoint requests")
+    parser.add_argument("--pages", type=int, default=3, help="pages per submission PDF")
+    parser.add_argument("--questions", type=int, default=3, help="questions per assignment")
+    parser.add_argument("--scanned-ratio", type=float, default=0.3,
+                        help="fraction of submissions without a text layer (sent to OCR)")
+    parser.add_argument("--ocr-latency-ms", type=float, default=800)
+    parser.add_argument("--render-latency-ms", type=float, default=50)
+    parser.add_argument("--llm-latency-ms", type=float, default=3000)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="fraction of LLM calls answered with 429")
+    parser.add_argument("--datastore-latency-ms", type=float, default=15)
+    parser.add_argument("--blob-latency-ms", type=float, default=80)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--extract-workers", type=int, default=2)
+    parser.add_argument("--evaluate-workers", type=int, default=4)
+    parser.add_argument("--evaluation-mode", default="whole", choices=["whole", "per_question"])
+    parser.add_argument("--llm-rpm", type=int, default=100000, help="gateway request quota per minute")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="result file (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    return parser.parse_args()
+
+
+def configure_environment(args, work_dir: str):
+    """Point every backend setting at the fakes and the scratch directory, before backend is imported."""
+    os.environ.update({
+        "GEMINI_API_KEY": "benchmark",
+        "STORAGE_BACKEND": "local",
+        "LOCAL_DB_PATH": os.path.join(work_dir, "local.db"),
+        "LOCAL_BLOB_DIR": os.path.join(work_dir, "blobs"),
+        "JOB_STORE": "sqlite",
+        "JOB_DB_PATH": os.path.join(work_dir, "jobs.db"),
+        "EXTRACTION_CACHE_DIR": os.path.join(work_dir, "cache"),
+        "EXTRACTION_CACHE_FIRESTORE": "false",
+        "UPLOAD_TEMP_DIR": os.path.join(work_dir, "temp"),
+        "CONTEXT_CACHE_ENABLED": "false",
+        "RUN_EMBEDDED_WORKER": "true",
+        "JOB_CONCURRENCY_EXTRACT": str(args.extract_workers),
+        "JOB_CONCURRENCY_EVALUATE": str(args.evaluate_workers),
+        "EVALUATION_MODE": args.evaluation_mode,
+        "LLM_EXTRACTION_RPM": str(args.llm_rpm),
+        "LLM_EVALUATION_RPM": str(args.llm_rpm),
+        "LLM_EXTRACTION_TPM": str(args.llm_rpm * 10000),
+        "LLM_EVALUATION_TPM": str(args.llm_rpm * 10000),
+        # Per-stage timings are summarised in the result instead of logged
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    })
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+
+def install_fakes(backend, args):
+    import google.generativeai as genai
+    import extraction
+    from benchmarks.fakes import (
+        Latency, FakeVisionModel, FakeGenerativeModel, LatencyRepository, FakeBlobStore, make_fake_render
+    )
+
+    vision_model = FakeVisionModel(Latency(args.ocr_latency_ms, args.jitter))
+    extraction._create_vision_model = lambda model, system_prompt: vision_model
+    extraction.render_pages = make_fake_render(Latency(args.render_latency_ms, args.jitter))
+
+    FakeGenerativeModel.configure(Latency(args.llm_latency_ms, args.jitter), args.llm_error_rate, args.questions)
+    genai.GenerativeModel = FakeGenerativeModel
+
+    backend.repository = LatencyRepository(backend.repository, Latency(args.datastore_latency_ms, args.jitter))
+    backend.blob_store = FakeBlobStore(Latency(args.blob_latency_ms, args.jitter))
+    backend.content_store.blob_store = backend.blob_store
+    backend.similarity_indexes.repository = backend.repository
+    backend.idempotency_keys.repository = backend.repository
+    return vision_model
+
+
+def percentile(sorted_samples: List[float], fraction: float) -> float:
+    # Nearest-rank percentile
+    if not sorted_samples:
+        return 0.0
+    index = max(0, min(len(sorted_samples) - 1, int(round(fraction * len(sorted_samples) + 0.5)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples: List[float], errors: int) -> dict:
+    ordered = sorted(samples)
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class Recorder:
+    """Collects request latencies per endpoint."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def request(self, client, name: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            failed = response.status_code >= 400
+        except Exception:
+            response = None
+            failed = True
+        self.samples.setdefault(name, []).append(time.perf_counter() - started)
+        if failed:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        return response
+
+    def summary(self) -> dict:
+        return {name: summarize(samples, self.errors.get(name, 0)) for name, samples in self.samples.items()}
+
+
+async def bounded(concurrency: int, calls):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(call):
+        async with semaphore:
+            return await call()
+    return await asyncio.gather(*(run(call) for call in calls))
+
+
+async def wait_for_jobs(job_queue, job_ids: List[str], started: float) -> dict:
+    """Wait until every job has finished and return the phase throughput."""
+    pending = set(job_ids)
+    succeeded = failed = 0
+    while pending:
+        for job_id in list(pending):
+            job = await job_queue.get(job_id)
+            if job["status"] in ("succeeded", "failed"):
+                pending.discard(job_id)
+                if job["status"] == "succeeded":
+                    succeeded += 1
+                else:
+                    failed += 1
+        if pending:
+            await asyncio.sleep(0.05)
+    seconds = time.perf_counter() - started
+    return {
+        "jobs": len(job_ids),
+        "succeeded": succeeded,
+        "failed": failed,
+        "seconds": round(seconds, 3),
+        "jobs_per_second": round(len(job_ids) / seconds, 3) if seconds else 0.0,
+    }
+
+
+def submission_pdf(index: int, args, scanned: bool) -> bytes:
+    from benchmarks.fakes import make_pdf
+
+    if scanned:
+        return make_pdf([None] * args.pages, label=f"submission {index}")
+    pages = []
+    for page in range(args.pages):
+        questions = "\n".join(
+            f"Q{number}. Answer {number} from submission {index}, page {page + 1}. "
+            f"The student explains the reasoning step by step with worked examples."
+            for number in range(1, args.questions + 1)
+        )
+        pages.append(questions)
+    return make_pdf(pages)
+
+
+async def run_benchmark(args, backend) -> dict:
+    import httpx
+    from benchmarks.fakes import make_pdf, FakeGenerativeModel
+
+    random.seed(args.seed)
+    vision_model = install_fakes(backend, args)
+    recorder = Recorder()
+    phases = {}
+
+    await backend.start_job_workers()
+    transport = httpx.ASGITransport(app=backend.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            # One assignment for the whole run
+            assignment_pdf = make_pdf(["Answer every question.\n" + "\n".join(
+                f"Q{number}. Explain topic {number} with an example. (10 marks)"
+                for number in range(1, args.questions + 1)
+            )])
+            response = await recorder.request(
+                client, "POST /assignments/", "POST", "/assignments/",
+                data={"creator_id": "teacher-1", "title": "Benchmark", "description": "Benchmark assignment"},
+                files={"file": ("assignment.pdf", assignment_pdf, "application/pdf")},
+            )
+            assignment = response.json()
+            await wait_for_jobs(backend.job_queue, [assignment["job_id"]], time.perf_counter())
+            assignment_id = assignment["assignment_id"]
+
+            # Upload and extract submissions
+            scanned = set(random.sample(range(args.submissions), int(args.submissions * args.scanned_ratio)))
+            pdfs = [submission_pdf(index, args, index in scanned) for index in range(args.submissions)]
+
+            def upload(index):
+                return lambda: recorder.request(
+                    client, "POST /submissions/", "POST", "/submissions/",
+                    data={"assignment_id": assignment_id, "student_id": f"student-{index % args.students}",
+                          "student_name": f"Student {index % args.students}"},
+                    files={"file": (f"submission_{index}.pdf", pdfs[index], "application/pdf")},
+                )
+
+            started = time.perf_counter()
+            responses = await bounded(args.concurrency, [upload(index) for index in range(args.submissions)])
+            uploaded = [response.json() for response in responses if response is not None and response.is_success]
+            phases["extract"] = await wait_for_jobs(
+                backend.job_queue, [submission["job_id"] for submission in uploaded], started
+            )
+
+            # Evaluate every submission
+            def evaluate(submission_id):
+                return lambda: recorder.request(
+                    client, "POST /evaluate/{a}/{s}", "POST", f"/evaluate/{assignment_id}/{submission_id}"
+                )
+
+            started = time.perf_counter()
+            responses = await bounded(
+                args.concurrency, [evaluate(submission["submission_id"]) for submission in uploaded]
+            )
+            evaluations = [response.json() for response in responses if response is not None and response.is_success]
+            phases["evaluate"] = await wait_for_jobs(
+                backend.job_queue, [evaluation["job_id"] for evaluation in evaluations], started
+            )
+
+            # Read traffic on the list endpoints
+            list_urls = [
+                ("GET /assignments/", "/assignments/"),
+                ("GET /assignments/{a}/submissions", f"/assignments/{assignment_id}/submissions"),
+                ("GET /students/{s}/submissions", "/students/student-{student}/submissions"),
+            ]
+
+            def list_call(index):
+                name, url = list_urls[index % len(list_urls)]
+                url = url.format(student=index % args.students)
+                return lambda: recorder.request(client, name, "GET", url)
+
+            started = time.perf_counter()
+            await bounded(args.concurrency, [list_call(index) for index in range(args.list_requests)])
+            seconds = time.perf_counter() - started
+            phases["list"] = {
+                "requests": args.list_requests,
+                "seconds": round(seconds, 3),
+                "requests_per_second": round(args.list_requests / seconds, 3) if seconds else 0.0,
+            }
+
+            stats = (await client.get("/stats")).json()
+    finally:
+        await backend.stop_job_workers()
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "config": vars(args),
+        "endpoints": recorder.summary(),
+        "phases": phases,
+        "fake_calls": {
+            "ocr_pages": vision_model.calls,
+            "llm_requests": FakeGenerativeModel.calls,
+            "datastore_round_trips": backend.repository.calls,
+            "blob_downloads": backend.blob_store.downloads,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stage_summary(),
+        "stats": stats,
+    }
+
+
+def stage_summary() -> dict:
+    """Count and mean duration of every instrumented pipeline stage."""
+    from metrics import stage_seconds
+
+    stages = {}
+    for (stage, outcome), (count, total) in sorted(stage_seconds.totals().items()):
+        stages[f"{stage}:{outcome}" if outcome != "ok" else stage] = {
+            "count": count,
+            "mean_ms": round(total / count * 1000, 2) if count else 0.0,
+        }
+    return stages
+
+
+def compare(result: dict, baseline: dict):
+    """Print the change of each headline metric against an earlier run."""
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"\nCompared with {baseline.get('git_commit')} ({baseline.get('timestamp')}):")
+    for name, summary in result["endpoints"].items():
+        old = baseline.get("endpoints", {}).get(name)
+        if old:
+            print(f"  {name:36} p95 {summary['p95_ms']:>9.1f} ms ({change(summary['p95_ms'], old['p95_ms'])})")
+    for phase in ("extract", "evaluate"):
+        new, old = result["phases"].get(phase), baseline.get("phases", {}).get(phase)
+        if new and old:
+            print(f"  {phase + ' jobs/s':36} {new['jobs_per_second']:>12.2f} "
+                  f"({change(new['jobs_per_second'], old['jobs_per_second'])})")
+    print(f"  {'peak RSS MB':36} {result['peak_rss_mb']:>12.1f} "
+          f"({change(result['peak_rss_mb'], baseline.get('peak_rss_mb', 0))})")
+
+
+def print_summary(result: dict):
+    print(f"{'endpoint':36} {'count':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, summary in result["endpoints"].items():
+        print(f"{name:36} {summary['count']:>6} {summary['errors']:>4} {summary['p50_ms']:>9.1f} "
+              f"{summary['p95_ms']:>9.1f} {summary['p99_ms']:>9.1f}")
+    for phase, values in result["phases"].items():
+        print(f"{phase}: {json.dumps(values)}")
+    print(f"peak RSS: {result['peak_rss_mb']} MB")
+
+
+def main():
+    args = parse_args()
+    output = os.path.abspath(args.output or os.path.join(
+        BACKEND_DIR, "benchmarks", "results", f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    ))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory(prefix="eduassign-bench-") as work_dir:
+        configure_environment(args, work_dir)
+        # Relative paths (e.g. the credentials file) resolve inside the scratch directory
+        os.chdir(work_dir)
+        import backend
+
+        result = asyncio.run(run_benchmark(args, backend))
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2, default=str)
+
+    print_summary(result)
+    if baseline is not None:
+        compare(result, baseline)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Scaling benchmark of the near-duplicate (MinHash/LSH) similarity index.
+
+Generates one assignment's worth of synthetic submissions, a fraction of
+them edited copies of earlier ones, and inserts them into a SimilarityIndex
+one by one. At each checkpoint it reports the insert latency, how many
+signatures each insert was compared with (against the n - 1 a pairwise scan
+needs), and the recall of the planted copies.
+
+Run from the backend directory:
+
+    python -m benchmarks.similarity --submissions 4000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from similarity import SimilarityIndex, estimated_similarity, shingles, signature_for  # noqa: E402
+from benchmarks.pipeline import git_commit, peak_rss_mb, summarize  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=4000)
+    parser.add_argument("--checkpoints", default="250,500,1000,2000,4000",
+                        help="index sizes at which to report (comma separated)")
+    parser.add_argument("--words", type=int, default=400, help="words per submission")
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--copy-ratio", type=float, default=0.05, help="fraction of submissions that copy another")
+    parser.add_argument("--edit-rate", type=float, default=0.05, help="fraction of words changed in a copy")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="result file (default benchmarks/results/similarity-<timestamp>.json)")
+    return parser.parse_args()
+
+
+def make_corpus(args, rng: random.Random):
+    """Submission texts and the planted (original, copy) pairs."""
+    vocabulary = [f"word{index}" for index in range(args.vocabulary)]
+    # Zipf-like word frequencies, like real prose
+    weights = [1 / (rank + 1) for rank in range(args.vocabulary)]
+    texts, planted = [], set()
+    for index in range(args.submissions):
+        if texts and rng.random() < args.copy_ratio:
+            original = rng.randrange(len(texts))
+            words = texts[original].split()
+            for position in rng.sample(range(len(words)), int(len(words) * args.edit_rate)):
+                words[position] = rng.choices(vocabulary, weights)[0]
+            planted.add((original, index))
+        else:
+            words = rng.choices(vocabulary, weights, k=args.words)
+        texts.append(" ".join(words))
+    return texts, planted
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    checkpoints = sorted(int(size) for size in args.checkpoints.split(",") if int(size) <= args.submissions)
+    output = os.path.abspath(args.output or os.path.join(
+        BACKEND_DIR, "benchmarks", "results", f"similarity-{datetime.now():%Y%m%d-%H%M%S}.json"
+    ))
+
+    texts, planted = make_corpus(args, rng)
+
+    started = time.perf_counter()
+    signatures = [signature_for(text) for text in texts]
+    signature_seconds = time.perf_counter() - started
+
+    index = SimilarityIndex(args.threshold)
+    insert_samples, results = [], []
+    for position, signature in enumerate(signatures):
+        started = time.perf_counter()
+        index.add(str(position), signature)
+        insert_samples.append(time.perf_counter() - started)
+
+        size = position + 1
+        if size not in checkpoints:
+            continue
+        found = {tuple(sorted(map(int, pair))) for pair in index.pairs}
+        expected = {pair for pair in planted if pair[1] < size}
+        window = insert_samples[-max(1, size // 10):]
+        results.append({
+            "submissions": size,
+            # The last 10% of inserts, i.e. inserts into an index of about this size
+            "insert": summarize(window, 0),
+            # Averages over all inserts so far; a pairwise scan compares with every earlier submission
+            "comparisons_per_insert": round(index.comparisons / size, 2),
+            "pairwise_comparisons_per_insert": round((size - 1) / 2, 1),
+            "buckets": len(index.buckets),
+            "pairs_found": len(found),
+            "planted_pairs": len(expected),
+            "planted_recall": round(len(found & expected) / len(expected), 3) if expected else None,
+        })
+
+    # Precision of the reported pairs against exact Jaccard similarity
+    sample = list(index.pairs)[:200]
+    shingle_sets = {}
+    exact_above = 0
+    for first, second in sample:
+        for key in (first, second):
+            if key not in shingle_sets:
+                shingle_sets[key] = shingles(texts[int(key)])
+        a, b = shingle_sets[first], shingle_sets[second]
+        exact_above += len(a & b) / len(a | b) >= args.threshold - 0.1
+
+    # What the pairwise scan costs at the largest size, from a sample of comparisons
+    probe = signatures[-1]
+    started = time.perf_counter()
+    for other in signatures[:1000]:
+        estimated_similarity(probe, other)
+    pairwise_seconds = (time.perf_counter() - started) / min(1000, len(signatures)) * (len(signatures) - 1)
+
+    result = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "config": vars(args),
+        "signatures": {
+            "count": len(signatures),
+            "seconds": round(signature_seconds, 3),
+            "per_submission_ms": round(signature_seconds / len(signatures) * 1000, 3),
+        },
+        "checkpoints": results,
+        "pairwise_insert_ms_at_largest": round(pairwise_seconds * 1000, 3),
+        "sampled_pair_precision": round(exact_above / len(sample), 3) if sample else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"signatures: {result['signatures']['per_submission_ms']} ms per submission")
+    print(f"{'size':>6} {'p50 ms':>8} {'p95 ms':>8} {'compared':>9} {'pairwise':>9} {'recall':>7}")
+    for row in results:
+        print(f"{row['submissions']:>6} {row['insert']['p50_ms']:>8.3f} {row['insert']['p95_ms']:>8.3f} "
+              f"{row['comparisons_per_insert']:>9} {row['pairwise_comparisons_per_insert']:>9} "
+              f"{row['planted_recall']!s:>7}")
+    print(f"pairwise scan per insert at {len(signatures)}: {result['pairwise_insert_ms_at_largest']} ms")
+    print(f"sampled pair precision: {result['sampled_pair_precision']}")
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Cold start benchmark: import time and memory of the API and worker processes.
+
+Each run starts a fresh interpreter with STORAGE_BACKEND=local, imports the
+API module (and, for the worker, loads the OCR and Gemini libraries the jobs
+need) and reports how long that took, the process RSS afterwards and which
+heavy client libraries ended up imported. --backend-dir measures another
+checkout, e.g. a `git worktree` of an earlier commit, for before/after numbers.
+
+Run from the backend directory:
+
+    python -m benchmarks.startup --runs 5
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.pipeline import git_commit  # noqa: E402
+
+HEAVY_MODULES = [
+    "firebase_admin", "google.cloud.firestore", "google.cloud.storage", "grpc",
+    "google.generativeai", "pyzerox", "litellm", "pdf2image",
+]
+
+# Runs in the fresh interpreter; prints one JSON line
+PROBE = """
+import sys, json, time, asyncio, resource
+sys.path.insert(0, {backend_dir!r})
+role = {role!r}
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+started = time.perf_counter()
+import backend
+result = {{"import_seconds": round(time.perf_counter() - started, 3), "import_rss_mb": rss_mb()}}
+
+if role == "api":
+    import httpx
+
+    async def first_request():
+        transport = httpx.ASGITransport(app=backend.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            started = time.perf_counter()
+            response = await client.get("/assignments/")
+            return response.status_code, time.perf_counter() - started
+
+    status, seconds = asyncio.run(first_request())
+    result.update(first_request_status=status, first_request_seconds=round(seconds, 3))
+else:
+    import worker
+    started = time.perf_counter()
+    load = getattr(worker, "load_job_libraries", None)
+    if load is not None:
+        load()
+    else:
+        # Trees without the split load the libraries on the first job instead
+        from pdf2image import convert_from_path
+        from pyzerox.models import litellmmodel
+        from pyzerox.processor import format_markdown
+    result["job_libraries_seconds"] = round(time.perf_counter() - started, 3)
+
+result["ready_seconds"] = round(sum(
+    result.get(key, 0) for key in ("import_seconds", "first_request_seconds", "job_libraries_seconds")
+), 3)
+result["rss_mb"] = rss_mb()
+result["heavy_modules"] = [name for name in {heavy_modules!r} if name in sys.modules]
+print(json.dumps(result))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per role")
+    parser.add_argument("--roles", default="api,worker", help="comma separated: api, worker")
+    parser.add_argument("--backend-dir", default=BACKEND_DIR, help="backend checkout to measure")
+    parser.add_argument("--output", help="result file (default benchmarks/results/startup-<timestamp>.json)")
+    return parser.parse_args()
+
+
+def run_probe(role: str, backend_dir: str, work_dir: str) -> dict:
+    env = dict(
+        os.environ,
+        GEMINI_API_KEY="benchmark",
+        STORAGE_BACKEND="local",
+        RUN_EMBEDDED_WORKER="false",
+        LOG_LEVEL="WARNING",
+        PYTHONDONTWRITEBYTECODE="1",
+    )
+    code = PROBE.format(backend_dir=os.path.abspath(backend_dir), role=role, heavy_modules=HEAVY_MODULES)
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=work_dir, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize_runs(runs: list) -> dict:
+    keys = [key for key, value in runs[0].items() if isinstance(value, (int, float)) and key != "first_request_status"]
+    return {
+        **{key: round(statistics.median(run[key] for run in runs), 3) for key in keys},
+        "heavy_modules": runs[-1]["heavy_modules"],
+    }
+
+
+def main():
+    args = parse_args()
+    output = os.path.abspath(args.output or os.path.join(
+        BACKEND_DIR, "benchmarks", "results", f"startup-{datetime.now():%Y%m%d-%H%M%S}.json"
+    ))
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="eduassign-startup-") as work_dir:
+        for role in args.roles.split(","):
+            # One discarded run first, to warm the OS file cache
+            run_probe(role, args.backend_dir, work_dir)
+            runs = [run_probe(role, args.backend_dir, work_dir) for _ in range(args.runs)]
+            results[role] = summarize_runs(runs)
+
+    result = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "backend_dir": os.path.abspath(args.backend_dir),
+        "config": vars(args),
+        "roles": results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+
+    for role, summary in results.items():
+        print(f"{role} (median of {args.runs}):")
+        for key, value in summary.items():
+            print(f"  {key}: {value}")
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Bulk submission upload: a ZIP of scanned PDFs plus a manifest naming each file's student.
+
+The manifest is JSON (a list of {"file", "student_id", "student_name"}
+objects) or CSV with those column headers. Files are matched to archive
+members by path, or by file name when that is unambiguous: one member
+with that name, which no other manifest entry names.
+"""
+import io
+import csv
+import json
+import zipfile
+import posixpath
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+
+@dataclass
+class ManifestEntry:
+    file: str
+    student_id: str
+    student_name: str = ""
+
+
+def _entry(row: dict, position: int) -> ManifestEntry:
+    file = str(row.get("file") or row.get("filename") or "").strip()
+    student_id = str(row.get("student_id") or "").strip()
+    if not file or not student_id:
+        raise ValueError(f"Manifest entry {position} needs a file and a student_id")
+    return ManifestEntry(file, student_id, str(row.get("student_name") or "").strip())
+
+
+def parse_manifest(text: str) -> List[ManifestEntry]:
+    """Manifest entries from JSON or CSV text; raises ValueError when it is malformed."""
+    text = text.strip().lstrip("﻿")
+    if text.startswith("["):
+        try:
+            rows = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Manifest is not valid JSON: {e}")
+        if not all(isinstance(row, dict) for row in rows):
+            raise ValueError("Manifest JSON must be a list of objects")
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+    entries = [_entry(row, position) for position, row in enumerate(rows, start=1)]
+    if not entries:
+        raise ValueError("Manifest has no entries")
+
+    seen = set()
+    for entry in entries:
+        if entry.file in seen:
+            raise ValueError(f"File {entry.file} is listed twice in the manifest")
+        seen.add(entry.file)
+    return entries
+
+
+def _is_document(name: str) -> bool:
+    # Skip directories and the resource forks macOS adds to archives
+    return not name.endswith("/") and not name.startswith("__MACOSX/") \
+        and not posixpath.basename(name).startswith("._")
+
+
+def list_archive(path: str) -> List[str]:
+    """Names of the files in a ZIP archive (only the central directory is read)."""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return [name for name in archive.namelist() if _is_document(name)]
+    except zipfile.BadZipFile:
+        raise ValueError("Uploaded file is not a valid ZIP archive")
+
+
+def match_entries(names: List[str],
+                  manifest: List[ManifestEntry]) -> Tuple[List[Tuple[ManifestEntry, str]], List[dict]]:
+    """
+    Pair manifest entries with archive members. Returns the matched
+    (entry, member name) pairs and report rows for manifest entries without
+    a file (or whose file name matches a member another entry uses) and PDFs
+    in the archive that the manifest does not list.
+    """
+    by_name = set(names)
+    by_basename = {}
+    for name in names:
+        by_basename.setdefault(posixpath.basename(name), []).append(name)
+
+    def fallback(entry: ManifestEntry) -> Optional[str]:
+        candidates = by_basename.get(posixpath.basename(entry.file), [])
+        return candidates[0] if len(candidates) == 1 else None
+
+    # A member is matched by file name only when no other entry names it, by path or by file name
+    exact = {entry.file for entry in manifest if entry.file in by_name}
+    fallback_uses = Counter(
+        fallback(entry) for entry in manifest if entry.file not in by_name and fallback(entry) is not None
+    )
+
+    matched, report, used = [], [], set()
+    for entry in manifest:
+        member = entry.file if entry.file in by_name else fallback(entry)
+        if member is None:
+            report.append({"file": entry.file, "student_id": entry.student_id, "status": "missing",
+                           "error": "File not found in the archive"})
+            continue
+        if member != entry.file and (member in exact or fallback_uses[member] > 1):
+            report.append({"file": entry.file, "student_id": entry.student_id, "status": "ambiguous",
+                           "error": f"File name matches {member}, which another manifest entry also names"})
+            continue
+        matched.append((entry, member))
+        used.add(member)
+
+    report.extend(
+        {"file": name, "status": "unlisted", "error": "File is not listed in the manifest"}
+        for name in names if name not in used and name.lower().endswith(".pdf")
+    )
+    return matched, report
@@ -0,0 +1,135 @@
+"""Extracted markdown kept out of the assignment and submission documents.
+
+Each extraction is compressed (zstd when the zstandard package is installed,
+gzip otherwise) and written once to the blob store under its content hash; the
+document only keeps a small reference. Reads go through an in-process LRU
+bounded by the total size of the decompressed text, so an assignment's
+content is fetched once and then shared by all evaluations of its submissions.
+"""
+import gzip
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CONTENT_PREFIX = "content"
+ENCODING_EXTENSIONS = {"zstd": "zst", "gzip": "gz"}
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Content is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class ContentStore:
+    """Content-addressed, compressed markdown in the blob store with an LRU of decoded text."""
+
+    def __init__(self, blob_store, encoding: str = "auto", cache_max_bytes: int = 64 * 1024 * 1024):
+        if encoding == "auto":
+            encoding = "zstd" if zstandard is not None else "gzip"
+        if encoding == "zstd" and zstandard is None:
+            raise RuntimeError("CONTENT_COMPRESSION=zstd needs the zstandard package")
+        self.blob_store = blob_store
+        self.encoding = encoding
+        self.cache_max_bytes = cache_max_bytes
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_bytes = 0
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.bytes_written = 0
+
+    def _remember(self, sha256: str, text: str):
+        size = len(text)
+        if size > self.cache_max_bytes:
+            return
+        if sha256 in self._cache:
+            self._cache.move_to_end(sha256)
+            return
+        self._cache[sha256] = text
+        self._cache_bytes += size
+        while self._cache_bytes > self.cache_max_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted)
+
+    async def put(self, text: str) -> dict:
+        """Store text and return the reference to keep on the document."""
+        raw = text.encode("utf-8")
+        sha256 = hashlib.sha256(raw).hexdigest()
+        stored = await asyncio.to_thread(compress, raw, self.encoding)
+        path = f"{CONTENT_PREFIX}/{sha256}.md.{ENCODING_EXTENSIONS[self.encoding]}"
+        # Identical content maps to the same object, so re-uploads are skipped
+        if await self.blob_store.upload_bytes(stored, path, if_absent=True):
+            self.writes += 1
+            self.bytes_written += len(stored)
+        self._remember(sha256, text)
+        return {
+            "path": path,
+            "sha256": sha256,
+            "encoding": self.encoding,
+            "size": len(raw),
+            "stored_size": len(stored),
+        }
+
+    async def get(self, ref: dict) -> str:
+        """The text a reference points to, from the LRU when possible."""
+        sha256 = ref["sha256"]
+        text = self._cache.get(sha256)
+        if text is not None:
+            self._cache.move_to_end(sha256)
+            self.hits += 1
+            return text
+
+        # Concurrent readers of the same content share one download
+        loading = self._loading.get(sha256)
+        if loading is None:
+            self.misses += 1
+            loading = self._loading[sha256] = asyncio.ensure_future(self._load(ref))
+            loading.add_done_callback(lambda _: self._loading.pop(sha256, None))
+        return await asyncio.shield(loading)
+
+    async def _load(self, ref: dict) -> str:
+        stored = await self.blob_store.download_bytes(ref["path"])
+        if stored is None:
+            raise LookupError(f"Extracted content {ref['path']} is missing from the blob store")
+        text = (await asyncio.to_thread(decompress, stored, ref.get("encoding", "gzip"))).decode("utf-8")
+        self._remember(ref["sha256"], text)
+        return text
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "encoding": self.encoding,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "cached_entries": len(self._cache),
+            "cached_bytes": self._cache_bytes,
+            "writes": self.writes,
+            "bytes_written": self.bytes_written,
+        }
+
+
+async def load_content(store: ContentStore, document: Optional[dict], field: str = "extracted_content") -> str:
+    """A document's extracted content: inline (not yet migrated) or through its reference."""
+    if not document:
+        return ""
+    if field in document:
+        return document[field] or ""
+    ref = document.get(f"{field}_ref")
+    return await store.get(ref) if ref else ""
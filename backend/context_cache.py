@@ -0,0 +1,154 @@
+"""Reusable Gemini cached contexts for evaluation prompts.
+
+Every evaluation of an assignment starts with the same large prefix: the
+instructions, the assignment content and the feedback categories. Instead of
+sending it with each submission, the prefix is stored once per assignment as
+a Gemini cached content and each evaluation only sends the submission.
+"""
+import time
+import asyncio
+import hashlib
+import weakref
+import datetime
+from typing import TYPE_CHECKING, Dict, Optional
+
+from metrics import log_event
+
+if TYPE_CHECKING:
+    import google.generativeai as genai
+
+
+class _CachedContext:
+    def __init__(self, cached_content, expires_at: float):
+        import google.generativeai as genai
+
+        self.cached_content = cached_content
+        self.expires_at = expires_at
+        self.model = genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+
+
+class EvaluationContextCache:
+    """Creates, refreshes and reuses one cached context per assignment prefix.
+
+    When caching is disabled, the prefix is too short for the model's cache
+    minimum, or the API rejects the request, get_model returns None and the
+    caller falls back to sending the full prompt.
+    """
+
+    def __init__(self, model_name: str, ttl_seconds: int = 3600, refresh_margin_seconds: int = 300,
+                 min_tokens: int = 4096, retry_after_failure_seconds: int = 600, enabled: bool = True):
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.min_tokens = min_tokens
+        self.retry_after_failure_seconds = retry_after_failure_seconds
+        self.enabled = enabled
+        self._contexts: Dict[str, _CachedContext] = {}
+        self._unavailable_until: Dict[str, float] = {}
+        # Held only while a request for the key runs, so finished keys drop out by themselves
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self.created = 0
+        self.reused = 0
+        self.refreshed = 0
+        self.fallbacks = 0
+        self.prompt_tokens_saved = 0
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        # Roughly four characters per token for English prose
+        return len(text) // 4
+
+    def _key(self, assignment_id: str, context_text: str) -> str:
+        # A changed assignment or prompt gets a new context
+        digest = hashlib.sha256(context_text.encode("utf-8")).hexdigest()[:16]
+        return f"{assignment_id}:{digest}"
+
+    async def get_model(self, assignment_id: str, context_text: str) -> Optional["genai.GenerativeModel"]:
+        """Return a model bound to the cached assignment context, or None to fall back."""
+        if not self.enabled or self.estimate_tokens(context_text) < self.min_tokens:
+            self.fallbacks += 1
+            return None
+
+        self._prune_expired()
+        key = self._key(assignment_id, context_text)
+        if self._unavailable_until.get(key, 0) > time.time():
+            self.fallbacks += 1
+            return None
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        async with lock:
+            context = self._contexts.get(key)
+            now = time.time()
+            if context is not None and context.expires_at - now > self.refresh_margin_seconds:
+                self.reused += 1
+                return context.model
+
+            try:
+                if context is not None and context.expires_at > now:
+                    # Still alive but close to expiry: extend instead of re-uploading
+                    await asyncio.to_thread(
+                        context.cached_content.update, ttl=datetime.timedelta(seconds=self.ttl_seconds)
+                    )
+                    context.expires_at = now + self.ttl_seconds
+                    self.refreshed += 1
+                    return context.model
+
+                # Imported here: only processes that evaluate load the Gemini client
+                from google.generativeai import caching
+
+                cached_content = await asyncio.to_thread(
+                    caching.CachedContent.create,
+                    model=self.model_name,
+                    display_name=f"assignment-{assignment_id}"[:128],
+                    system_instruction=context_text,
+                    ttl=datetime.timedelta(seconds=self.ttl_seconds),
+                )
+                context = _CachedContext(cached_content, now + self.ttl_seconds)
+                self._contexts[key] = context
+                self.created += 1
+                return context.model
+            except Exception as e:
+                log_event("context_cache_unavailable", level="warning", assignment_id=assignment_id, error=str(e))
+                self._contexts.pop(key, None)
+                self._unavailable_until[key] = now + self.retry_after_failure_seconds
+                self.fallbacks += 1
+                return None
+
+    def _prune_expired(self):
+        now = time.time()
+        for key in [key for key, context in self._contexts.items() if context.expires_at <= now]:
+            del self._contexts[key]
+        for key in [key for key, until in self._unavailable_until.items() if until <= now]:
+            del self._unavailable_until[key]
+
+    def record_usage(self, response):
+        """Count the prompt tokens served from a cached context."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self.prompt_tokens_saved += getattr(usage, "cached_content_token_count", 0) or 0
+
+    async def invalidate(self, assignment_id: str):
+        """Delete the cached contexts of an assignment, e.g. after it is re-processed."""
+        prefix = f"{assignment_id}:"
+        for key in [key for key in self._contexts if key.startswith(prefix)]:
+            context = self._contexts.pop(key)
+            try:
+                await asyncio.to_thread(context.cached_content.delete)
+            except Exception as e:
+                log_event("context_cache_delete_failed", level="warning", assignment_id=assignment_id, error=str(e))
+        for key in [key for key in self._unavailable_until if key.startswith(prefix)]:
+            del self._unavailable_until[key]
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "enabled": self.enabled,
+            "active_contexts": sum(1 for context in self._contexts.values() if context.expires_at > now),
+            "created": self.created,
+            "reused": self.reused,
+            "refreshed": self.refreshed,
+            "fallbacks": self.fallbacks,
+            "prompt_tokens_saved": self.prompt_tokens_saved,
+        }
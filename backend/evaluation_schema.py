@@ -0,0 +1,215 @@
+"""Evaluation response schema, validation and local JSON repair."""
+import re
+import json
+from typing import Dict, List, Optional, Tuple, Union
+
+from pydantic import BaseModel, Field, ValidationError
+
+from metrics import evaluation_parse_total
+
+Number = Union[int, float]
+
+
+class FeedbackItem(BaseModel):
+    category_id: int
+    text: str
+
+
+class QuestionEvaluation(BaseModel):
+    question_reference: str
+    marks_awarded: Number = Field(ge=0)
+    max_marks: Number = Field(ge=0)
+    feedback: List[FeedbackItem] = []
+
+
+class EvaluationResult(BaseModel):
+    question_evaluations: List[QuestionEvaluation]
+    overall_feedback: str
+    overall_marks: Number = Field(ge=0)
+    max_possible_marks: Number = Field(ge=0)
+
+
+# Gemini response schema (OpenAPI subset) mirroring the models above
+FEEDBACK_ITEM_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "category_id": {"type": "INTEGER"},
+        "text": {"type": "STRING"},
+    },
+    "required": ["category_id", "text"],
+}
+
+QUESTION_EVALUATION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "question_reference": {"type": "STRING"},
+        "marks_awarded": {"type": "NUMBER"},
+        "max_marks": {"type": "NUMBER"},
+        "feedback": {"type": "ARRAY", "items": FEEDBACK_ITEM_SCHEMA},
+    },
+    "required": ["question_reference", "marks_awarded", "max_marks", "feedback"],
+}
+
+EVALUATION_RESULT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "question_evaluations": {"type": "ARRAY", "items": QUESTION_EVALUATION_SCHEMA},
+        "overall_feedback": {"type": "STRING"},
+        "overall_marks": {"type": "NUMBER"},
+        "max_possible_marks": {"type": "NUMBER"},
+    },
+    "required": ["question_evaluations", "overall_feedback", "overall_marks", "max_possible_marks"],
+}
+
+QUESTION_EVALUATIONS_SCHEMA = {"type": "ARRAY", "items": QUESTION_EVALUATION_SCHEMA}
+
+OVERALL_FEEDBACK_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"overall_feedback": {"type": "STRING"}},
+    "required": ["overall_feedback"],
+}
+
+# Counters for what parsing and validation cost
+evaluation_parse_stats = {
+    "responses": 0,
+    "parse_failures": 0,
+    "repaired": 0,
+    "validation_failures": 0,
+    "totals_recomputed": 0,
+    "reasks_full": 0,
+    "reasks_questions": 0,
+    "reasks_overall_feedback": 0,
+    "unrecoverable": 0,
+}
+
+
+def count_parse_outcome(outcome: str):
+    """Count one outcome of evaluation_parse_stats, also exported as a Prometheus counter."""
+    evaluation_parse_stats[outcome] += 1
+    evaluation_parse_total.inc(outcome=outcome)
+
+
+def _strip_code_fence(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text[text.find("\n") + 1:] if "\n" in text else text[3:]
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+def _close_truncated_json(text: str) -> str:
+    """Close strings, arrays and objects left open by a truncated response."""
+    stack = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+
+    if in_string:
+        text += '"'
+    # Drop a dangling separator or key without a value before closing
+    text = re.sub(r'(,\s*|,?\s*"[^"]*"\s*:\s*)$', "", text.rstrip())
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> Optional[object]:
+    """Parse near-valid JSON: code fences, surrounding prose, trailing commas, truncation."""
+    candidate = _strip_code_fence(text)
+    try:
+        return json.loads(candidate)
+    except json.JSONDecodeError:
+        pass
+
+    # Keep only the outermost JSON value
+    starts = [index for index in (candidate.find("{"), candidate.find("[")) if index != -1]
+    if not starts:
+        return None
+    candidate = candidate[min(starts):]
+    end = max(candidate.rfind("}"), candidate.rfind("]"))
+
+    attempts = []
+    if end != -1:
+        attempts.append(candidate[:end + 1])
+    attempts.append(_close_truncated_json(candidate))
+    for attempt in attempts:
+        attempt = re.sub(r",\s*([}\]])", r"\1", attempt)
+        try:
+            return json.loads(attempt)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def parse_response(text: str) -> Tuple[Optional[object], bool]:
+    """Parse a model response; returns (data, repaired)."""
+    count_parse_outcome("responses")
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError:
+        pass
+    data = repair_json(text)
+    if data is None:
+        count_parse_outcome("parse_failures")
+        return None, False
+    count_parse_outcome("repaired")
+    return data, True
+
+
+def validate_questions(items) -> Tuple[List[Optional[QuestionEvaluation]], Dict[int, str]]:
+    """Validate question evaluations one by one; returns the parsed items and the errors per failing index."""
+    parsed = []
+    errors = {}
+    for index, item in enumerate(items if isinstance(items, list) else []):
+        try:
+            parsed.append(QuestionEvaluation.model_validate(item))
+        except ValidationError as e:
+            parsed.append(None)
+            errors[index] = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc']) or 'entry'}: {error['msg']}" for error in e.errors()
+            )
+    return parsed, errors
+
+
+def build_question_reask_prompt(items: list, errors: Dict[int, str]) -> str:
+    """Ask again only for the question evaluations that failed validation."""
+    entries = "\n".join(
+        f"- {json.dumps(items[index], default=str)[:1000]}\n  problems: {message}"
+        for index, message in errors.items()
+    )
+    return f"""
+    Your previous evaluation contained invalid entries for some questions:
+    {entries}
+    Re-evaluate ONLY these questions and return a JSON array with one corrected
+    question evaluation per entry above, in the same order.
+    """
+
+
+def build_overall_feedback_reask_prompt(questions: List[QuestionEvaluation]) -> str:
+    """Ask again only for the overall feedback of an otherwise valid evaluation."""
+    evaluations = json.dumps([question.model_dump() for question in questions])
+    return f"""
+    Your previous evaluation was missing the overall feedback. The question evaluations were:
+    {evaluations}
+    Return ONLY the comprehensive overall feedback on the entire submission as JSON.
+    """
+
+
+def recompute_totals(questions: List[QuestionEvaluation]) -> Tuple[Number, Number]:
+    """Total awarded and available marks, computed from the question evaluations."""
+    return (
+        sum(question.marks_awarded for question in questions),
+        sum(question.max_marks for question in questions),
+    )
@@ -0,0 +1,123 @@
+"""Push-based submission status updates for Server-Sent Events streams.
+
+Processing code publishes status changes to an in-process hub keyed by
+assignment, and SSE handlers subscribe to it instead of polling the database.
+When writes happen in other processes (separate workers, several API pods),
+the hub also runs one shared database listener per watched assignment, started
+with the first subscriber and stopped with the last, and that listener becomes
+the source of events for the assignment.
+"""
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+
+from cachetools import TTLCache
+
+from metrics import log_event, registry
+
+# Fields whose changes are pushed to subscribers
+STATUS_FIELDS = ("status", "ai_processing_status", "feedback_status", "error_message")
+
+status_event_subscribers = registry.gauge("eduassign_status_event_subscribers", "Open status event streams")
+status_events_published = registry.counter(
+    "eduassign_status_events_total", "Status events delivered to the hub by source", ["source"]
+)
+
+
+def status_of(document: dict) -> dict:
+    """The status fields present in a document or update."""
+    return {field: document[field] for field in STATUS_FIELDS if field in document}
+
+
+class StatusEventHub:
+    """
+    Fans submission status changes out to per-assignment subscriber queues.
+
+    Each submission's last known status is remembered, so repeated or no-op
+    updates are not pushed twice. watch(assignment_id, callback) starts a
+    shared listener and returns a function that stops it; without one only
+    in-process publishes are seen.
+    """
+
+    def __init__(self, watch: Optional[Callable] = None, queue_size: int = 100,
+                 state_cache_size: int = 10000, state_ttl_seconds: float = 3600):
+        self.watch = watch
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._stop_watch: Dict[str, Callable[[], None]] = {}
+        self._last: TTLCache = TTLCache(maxsize=state_cache_size, ttl=state_ttl_seconds)
+        self.dropped = 0
+
+    def publish(self, assignment_id: str, submission_id: str, update: dict):
+        """Record a status change written by this process."""
+        # An active listener reports the same write in commit order; publishing it
+        # here as well could deliver an older state after a newer one
+        if assignment_id in self._stop_watch:
+            return
+        self._deliver(assignment_id, submission_id, update, "local")
+
+    def _on_watch_change(self, assignment_id: str, document: dict):
+        self._deliver(assignment_id, document["id"], document, "listener")
+
+    def _deliver(self, assignment_id: str, submission_id: str, update: dict, source: str):
+        changes = status_of(update)
+        if not changes:
+            return
+        previous = self._last.get(submission_id, {})
+        state = {**previous, **changes}
+        if state == previous:
+            return
+        self._last[submission_id] = state
+        status_events_published.inc(source=source)
+
+        event = {"submission_id": submission_id, "assignment_id": assignment_id, **state}
+        for queue in self._subscribers.get(assignment_id, ()):
+            if queue.full():
+                # A slow client loses its oldest event rather than holding up the others
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+
+    @asynccontextmanager
+    async def subscribe(self, assignment_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Queue of status events for the submissions of one assignment."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        subscribers = self._subscribers.setdefault(assignment_id, set())
+        subscribers.add(queue)
+        status_event_subscribers.set(self.subscriber_count())
+        if self.watch is not None and assignment_id not in self._stop_watch:
+            try:
+                self._stop_watch[assignment_id] = self.watch(
+                    assignment_id, lambda document: self._on_watch_change(assignment_id, document)
+                )
+            except Exception as e:
+                log_event("status_listener_failed", level="error", assignment_id=assignment_id, error=str(e))
+        try:
+            yield queue
+        finally:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[assignment_id]
+                stop = self._stop_watch.pop(assignment_id, None)
+                if stop is not None:
+                    stop()
+            status_event_subscribers.set(self.subscriber_count())
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscriber_count(),
+            "assignments": len(self._subscribers),
+            "listeners": len(self._stop_watch),
+            "dropped": self.dropped,
+        }
+
+
+def sse_message(data, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Events message."""
+    lines = [f"event: {event}"] if event else []
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,264 @@
+"""Extraction strategy: use a PDF's own text layer where it is good enough.
+
+Digital PDFs (typed assignments and submissions) already carry a usable text
+layer. Those pages are taken directly with PyPDF2; only pages with a missing
+or poor text layer, or that are mostly images, are sent to vision OCR, which
+runs page by page through the LLM gateway with a per-page cache.
+"""
+import os
+import re
+import time
+import asyncio
+import hashlib
+import tempfile
+import warnings
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from extraction_cache import make_cache_key
+from metrics import extraction_documents_total, extraction_pages_total, log_event, ocr_pages_total, span
+
+# Rough token cost of one OCR page request (image input plus markdown output)
+OCR_PAGE_ESTIMATED_TOKENS = 1500
+
+# Glyphs PyPDF2 emits when a font has no usable unicode mapping
+GARBLED_PATTERN = re.compile(r"\(cid:\d+\)|\ufffd")
+WORD_PATTERN = re.compile(r"[^\W\d_]{2,}")
+
+# Counters for how pages were extracted
+extraction_stats = {
+    "native_pages": 0,
+    "ocr_pages": 0,
+    "native_documents": 0,
+    "ocr_documents": 0,
+    "mixed_documents": 0,
+    "ocr_page_calls": 0,
+    "ocr_page_cache_hits": 0,
+    "ocr_page_seconds_total": 0.0,
+    "ocr_page_seconds_max": 0.0,
+}
+
+
+@dataclass
+class NativePage:
+    """Text layer of one PDF page."""
+    number: int
+    text: str
+    has_images: bool
+
+
+def _page_has_images(page) -> bool:
+    try:
+        resources = page.get("/Resources") or {}
+        xobjects = resources.get("/XObject") or {}
+        for xobject in xobjects.values():
+            if xobject.get_object().get("/Subtype") == "/Image":
+                return True
+    except Exception:
+        # Unusual resource trees are treated as image pages, which routes them to OCR
+        return True
+    return False
+
+
+def extract_native_pages(file_path: str) -> Optional[List[NativePage]]:
+    """Extract the text layer of every page, or None if the PDF cannot be parsed."""
+    from PyPDF2 import PdfReader
+
+    try:
+        reader = PdfReader(file_path)
+        if reader.is_encrypted:
+            return None
+        pages = []
+        for index, page in enumerate(reader.pages):
+            try:
+                text = page.extract_text() or ""
+            except Exception:
+                text = ""
+            pages.append(NativePage(number=index + 1, text=text, has_images=_page_has_images(page)))
+        return pages or None
+    except Exception as e:
+        log_event("native_extraction_failed", level="warning", file=os.path.basename(file_path), error=str(e))
+        return None
+
+
+def score_text_quality(text: str) -> float:
+    """Score a page's text layer from 0 (unusable) to 1 (clean text)."""
+    stripped = text.strip()
+    if not stripped:
+        return 0.0
+
+    # Unmapped glyphs mean the text layer does not reflect what is printed
+    garbled_chars = sum(len(match) for match in GARBLED_PATTERN.findall(stripped))
+    visible = [c for c in stripped if not c.isspace()]
+    if not visible:
+        return 0.0
+    printable_ratio = sum(1 for c in visible if c.isprintable()) / len(visible)
+    clean_ratio = max(0.0, 1.0 - garbled_chars / len(visible))
+
+    # Real prose and questions are mostly made of words
+    tokens = stripped.split()
+    word_ratio = sum(1 for token in tokens if WORD_PATTERN.search(token)) / len(tokens)
+
+    return printable_ratio * clean_ratio * min(1.0, word_ratio / 0.6)
+
+
+def native_text_to_markdown(text: str) -> str:
+    """Tidy a page's text layer into plain markdown paragraphs."""
+    lines = [line.rstrip() for line in text.splitlines()]
+    markdown = "\n".join(lines).strip()
+    return re.sub(r"\n{3,}", "\n\n", markdown)
+
+
+def plan_extraction(native_pages: Optional[List[NativePage]], min_quality: float,
+                    min_chars: int, min_chars_with_images: int) -> Tuple[Dict[int, str], Optional[List[int]]]:
+    """
+    Decide which pages use native text and which go to OCR.
+
+    Returns the native markdown per page number and the page numbers that need
+    OCR (None means the whole document).
+    """
+    if native_pages is None:
+        extraction_stats["ocr_documents"] += 1
+        extraction_documents_total.inc(path="ocr")
+        return {}, None
+
+    native_content = {}
+    ocr_pages = []
+    for page in native_pages:
+        text_chars = len(page.text.strip())
+        good_text = text_chars >= min_chars and score_text_quality(page.text) >= min_quality
+        # A page that is mostly a scan or a diagram needs the vision model
+        image_heavy = page.has_images and text_chars < min_chars_with_images
+        if good_text and not image_heavy:
+            native_content[page.number] = native_text_to_markdown(page.text)
+        else:
+            ocr_pages.append(page.number)
+
+    extraction_stats["native_pages"] += len(native_content)
+    extraction_stats["ocr_pages"] += len(ocr_pages)
+    extraction_pages_total.inc(len(native_content), path="native")
+    extraction_pages_total.inc(len(ocr_pages), path="ocr")
+    path = "native" if not ocr_pages else "ocr" if not native_content else "mixed"
+    extraction_stats[f"{path}_documents"] += 1
+    extraction_documents_total.inc(path=path)
+
+    return native_content, ocr_pages
+
+
+def _page_runs(page_numbers: List[int]) -> List[Tuple[int, int]]:
+    """Group sorted page numbers into contiguous (first, last) runs."""
+    runs = []
+    for number in sorted(page_numbers):
+        if runs and number == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], number)
+        else:
+            runs.append((number, number))
+    return runs
+
+
+def render_pages(file_path: str, page_numbers: Optional[List[int]], output_dir: str) -> Dict[int, str]:
+    """Rasterize the requested pages (all when None) and return the image path per page number."""
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    from pyzerox.constants import PDFConversionDefaultOptions
+
+    if page_numbers is None:
+        page_numbers = list(range(1, pdfinfo_from_path(file_path)["Pages"] + 1))
+
+    images = {}
+    for first, last in _page_runs(page_numbers):
+        paths = convert_from_path(
+            file_path,
+            dpi=PDFConversionDefaultOptions.DPI,
+            fmt=PDFConversionDefaultOptions.FORMAT,
+            size=PDFConversionDefaultOptions.SIZE,
+            thread_count=PDFConversionDefaultOptions.THREAD_COUNT,
+            use_pdftocairo=PDFConversionDefaultOptions.USE_PDFTOCAIRO,
+            output_folder=output_dir,
+            output_file=f"page_{first}_",
+            first_page=first,
+            last_page=last,
+            paths_only=True,
+        )
+        for offset, path in enumerate(paths):
+            images[first + offset] = path
+    return images
+
+
+def sha256_image(image_path: str) -> str:
+    with open(image_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _create_vision_model(model: str, system_prompt: str):
+    from pyzerox.models import litellmmodel
+
+    # Creating the model validates the API key with a request
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        vision_model = litellmmodel(model=model)
+    vision_model.system_prompt = system_prompt
+    return vision_model
+
+
+async def ocr_pages(file_path: str, page_numbers: Optional[List[int]], system_prompt: str,
+                    model: str, cache, gateway) -> Dict[int, str]:
+    """
+    Run vision OCR page by page; the gateway bounds concurrency and quota use.
+
+    Each page is cached by the hash of its rendered image, so when some pages
+    fail the finished ones are kept and a retry only redoes the failed pages.
+    Rendered images live in a temp directory removed before returning.
+    """
+    from pyzerox.processor import format_markdown
+
+    with tempfile.TemporaryDirectory(prefix="extract_") as work_dir:
+        with span("extract.render", pages=len(page_numbers) if page_numbers is not None else "all"):
+            images = await asyncio.to_thread(render_pages, file_path, page_numbers, work_dir)
+        contents = {}
+
+        async def ocr_page(page_number: int, image_path: str):
+            image_sha256 = await asyncio.to_thread(sha256_image, image_path)
+            cache_key = make_cache_key(image_sha256, system_prompt, model, "page")
+            cached = await cache.get(cache_key)
+            if cached is not None:
+                extraction_stats["ocr_page_cache_hits"] += 1
+                ocr_pages_total.inc(source="cache")
+                contents[page_number] = cached
+                return
+
+            # One pooled model per prompt, created only when a page misses the cache
+            page_model = await gateway.client(
+                ("zerox", model, system_prompt), lambda: _create_vision_model(model, system_prompt)
+            )
+            started = time.perf_counter()
+            with span("extract.ocr_page", page=page_number):
+                completion = await gateway.call(
+                    lambda: page_model.completion(image_path=image_path, maintain_format=False, prior_page=""),
+                    estimated_tokens=OCR_PAGE_ESTIMATED_TOKENS,
+                    model=model
+                )
+            elapsed = time.perf_counter() - started
+
+            extraction_stats["ocr_page_seconds_total"] += elapsed
+            extraction_stats["ocr_page_seconds_max"] = max(extraction_stats["ocr_page_seconds_max"], elapsed)
+            extraction_stats["ocr_page_calls"] += 1
+            ocr_pages_total.inc(source="model")
+
+            content = format_markdown(completion.content)
+            await cache.set(cache_key, content, model)
+            contents[page_number] = content
+
+        results = await asyncio.gather(
+            *(ocr_page(page_number, image_path) for page_number, image_path in images.items()),
+            return_exceptions=True
+        )
+
+    failed_pages = [
+        page_number for page_number, result in zip(images.keys(), results) if isinstance(result, Exception)
+    ]
+    if failed_pages:
+        first_error = next(result for result in results if isinstance(result, Exception))
+        raise RuntimeError(
+            f"OCR failed for pages {failed_pages} ({len(contents)} of {len(images)} pages done): {first_error}"
+        )
+    return contents
@@ -0,0 +1,193 @@
+import os
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+from metrics import log_event
+
+
+def sha256_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return the hex SHA-256 digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(file_sha256: str, system_prompt: str, model: str, strategy: str = "") -> str:
+    """Build the cache key from the PDF digest, the extraction prompt, the model and the strategy settings."""
+    digest = hashlib.sha256()
+    for part in (file_sha256, system_prompt, model, strategy):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DiskCacheTier:
+    """Local on-disk cache tier with size-based LRU eviction.
+
+    Entries are plain markdown files named by key. Recency is tracked with the
+    file mtime so the LRU order survives a process restart.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, oldest first
+        self._total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.md")
+
+    def _load_index(self):
+        # Rebuild the LRU order from whatever is already on disk
+        found = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".md"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            found.append((stat.st_mtime, name[:-3], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    content = f.read()
+                os.utime(path)
+            except FileNotFoundError:
+                self._total_bytes -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return content
+
+    def set(self, key: str, content: str):
+        data = content.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            path = self._path(key)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class FirestoreCacheTier:
+    """Shared cache tier backed by a Firestore collection (async client)."""
+
+    # Stay well below the 1 MiB Firestore document limit
+    MAX_CONTENT_BYTES = 900 * 1024
+
+    def __init__(self, client: Callable[[], Any], collection: str = "extraction_cache"):
+        # Accessor for the async Firestore client, created on first use
+        self._client = client
+        self.collection = collection
+
+    @property
+    def db(self):
+        return self._client()
+
+    async def get(self, key: str) -> Optional[str]:
+        doc = await self.db.collection(self.collection).document(key).get()
+        if not doc.exists:
+            return None
+        return doc.to_dict().get("content")
+
+    async def set(self, key: str, content: str, model: str):
+        if len(content.encode("utf-8")) > self.MAX_CONTENT_BYTES:
+            return
+        await self.db.collection(self.collection).document(key).set({
+            "content": content,
+            "model": model,
+            "created_at": datetime.now(),
+        })
+
+
+class ExtractionCache:
+    """Two-tier (disk, then optional Firestore) cache of extracted markdown."""
+
+    def __init__(self, disk_tier: DiskCacheTier, remote_tier: Optional[FirestoreCacheTier] = None):
+        self.disk_tier = disk_tier
+        self.remote_tier = remote_tier
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.remote_hits = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        content = await asyncio.to_thread(self.disk_tier.get, key)
+        if content is not None:
+            self.hits += 1
+            self.disk_hits += 1
+            return content
+
+        if self.remote_tier is not None:
+            try:
+                content = await self.remote_tier.get(key)
+            except Exception as e:
+                log_event("extraction_cache_remote_get_failed", level="warning", error=str(e))
+                content = None
+            if content is not None:
+                # Backfill the local tier so the next lookup stays on this pod
+                await asyncio.to_thread(self.disk_tier.set, key, content)
+                self.hits += 1
+                self.remote_hits += 1
+                return content
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, content: str, model: str):
+        await asyncio.to_thread(self.disk_tier.set, key, content)
+        if self.remote_tier is not None:
+            try:
+                await self.remote_tier.set(key, content, model)
+            except Exception as e:
+                log_event("extraction_cache_remote_set_failed", level="warning", error=str(e))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "remote_hits": self.remote_hits,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            "disk": self.disk_tier.stats(),
+            "remote_enabled": self.remote_tier is not None,
+        }
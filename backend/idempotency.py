@@ -0,0 +1,128 @@
+"""Idempotency-Key support for the create endpoints.
+
+A client that retries a create request (a double click, a timeout, a flaky
+connection) with the same Idempotency-Key header gets the first request's
+response back instead of creating a second resource. Keys are claimed in a
+datastore transaction, so concurrent retries on several API processes run
+the request once; a retry that arrives while the first request is still
+running gets 409. Only successful responses are kept: a failed request
+releases its key so it can be retried. Keys expire after ttl_seconds (set a
+Firestore TTL policy on expires_at to have old ones deleted).
+"""
+import time
+import hashlib
+import functools
+from typing import Awaitable, Callable, Iterable, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+IDEMPOTENCY_KEYS = "idempotency_keys"
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyKeys:
+    """Claims, replays and releases idempotency keys, scoped per endpoint."""
+
+    def __init__(self, repository, ttl_seconds: float = 24 * 3600, lock_seconds: float = 300):
+        self.repository = repository
+        self.ttl_seconds = ttl_seconds
+        # An unfinished claim older than this (its process died) can be taken over
+        self.lock_seconds = lock_seconds
+        self.replayed = 0
+        self.conflicts = 0
+
+    @staticmethod
+    def _doc_id(scope: str, key: str) -> str:
+        # Client keys may contain characters Firestore does not allow in document ids
+        return hashlib.sha256(f"{scope}\0{key}".encode("utf-8")).hexdigest()
+
+    async def claim(self, scope: str, key: str, fingerprint: str) -> Optional[dict]:
+        """
+        Claim a key for a new request. Returns the stored response when the
+        request already completed, None when the caller should run it; raises
+        HTTPException when the key is in use or was used for another request.
+        """
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key is longer than {MAX_KEY_LENGTH} characters")
+        doc_id = self._doc_id(scope, key)
+        outcome = {}
+
+        def apply(documents):
+            outcome.clear()
+            record, now = documents[0], time.time()
+            if record is not None and record.get("expires_at", 0) > now:
+                if record.get("fingerprint") != fingerprint:
+                    outcome["error"] = HTTPException(
+                        status_code=422, detail="Idempotency-Key was already used for a different request"
+                    )
+                    return [], []
+                if record.get("status") == "completed":
+                    outcome["response"] = record.get("response")
+                    return [], []
+                if record.get("locked_until", 0) > now:
+                    outcome["error"] = HTTPException(
+                        status_code=409, detail="A request with this Idempotency-Key is still in progress"
+                    )
+                    return [], []
+            return [(IDEMPOTENCY_KEYS, doc_id, {
+                "scope": scope,
+                "fingerprint": fingerprint,
+                "status": "in_progress",
+                "locked_until": now + self.lock_seconds,
+                "expires_at": now + self.ttl_seconds,
+            })], []
+
+        await self.repository.transaction([(IDEMPOTENCY_KEYS, doc_id)], apply)
+        if "error" in outcome:
+            self.conflicts += 1
+            raise outcome["error"]
+        if "response" in outcome:
+            self.replayed += 1
+        return outcome.get("response")
+
+    async def complete(self, scope: str, key: str, response: dict):
+        await self.repository.update(IDEMPOTENCY_KEYS, self._doc_id(scope, key), {
+            "status": "completed",
+            "response": response,
+            "locked_until": 0,
+        })
+
+    async def release(self, scope: str, key: str):
+        await self.repository.update(IDEMPOTENCY_KEYS, self._doc_id(scope, key), {
+            "status": "failed",
+            "locked_until": 0,
+        })
+
+    def endpoint(self, scope: str, fields: Iterable[str]):
+        """
+        Decorator for a create endpoint taking an `idempotency_key` header
+        parameter. fields are the parameters that identify the request; reusing
+        a key with different values is rejected.
+        """
+        fields = tuple(fields)
+
+        def decorate(handler: Callable[..., Awaitable[dict]]):
+            @functools.wraps(handler)
+            async def wrapper(**kwargs):
+                key = kwargs.get("idempotency_key")
+                if not key:
+                    return await handler(**kwargs)
+                fingerprint = hashlib.sha256(
+                    "\0".join(str(kwargs.get(field)) for field in fields).encode("utf-8")
+                ).hexdigest()
+                stored = await self.claim(scope, key, fingerprint)
+                if stored is not None:
+                    return stored
+                try:
+                    response = jsonable_encoder(await handler(**kwargs))
+                except Exception:
+                    await self.release(scope, key)
+                    raise
+                await self.complete(scope, key, response)
+                return response
+            return wrapper
+        return decorate
+
+    def stats(self) -> dict:
+        return {"replayed": self.replayed, "conflicts": self.conflicts}
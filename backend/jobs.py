@@ -0,0 +1,481 @@
+"""Durable, bounded job queue for extraction and evaluation work.
+
+Jobs are persisted in a job table (SQLite locally, Firestore in production) so
+in-flight work survives a restart. A worker pool claims jobs per pool
+("extract", "evaluate") with its own concurrency limit, runs them by priority
+and retries failures with exponential backoff (except PermanentJobError).
+"""
+import os
+import json
+import uuid
+import time
+import random
+import asyncio
+import sqlite3
+import threading
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from metrics import bind_log_context, jobs_total, log_event, registry, span
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Id of the job being run by the current task, so handlers can report progress
+current_job_id = contextvars.ContextVar("current_job_id", default=None)
+
+# Payload fields copied onto every log line written while a job runs
+LOG_CONTEXT_FIELDS = ("assignment_id", "submission_id", "question_reference")
+
+# Error recorded on a job whose lease ran out during its last attempt
+LEASE_EXPIRED_ERROR = "Lease expired on the last attempt; the worker running the job stopped"
+
+class PermanentJobError(Exception):
+    """Raised by a handler for a failure retrying cannot fix; the job fails without further attempts."""
+
+
+job_queue_wait_seconds = registry.histogram(
+    "eduassign_job_queue_wait_seconds", "Time from enqueue (or retry) until a worker picks the job up", ["type"]
+)
+
+
+def _new_job(job_type: str, payload: dict, priority: int, max_attempts: int,
+             job_id: Optional[str] = None) -> dict:
+    now = time.time()
+    return {
+        "id": job_id or str(uuid.uuid4()),
+        "type": job_type,
+        "payload": payload,
+        "priority": priority,
+        "status": QUEUED,
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_after": now,
+        "lease_expires_at": None,
+        "worker_id": None,
+        "error": None,
+        "result": None,
+        "progress": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+class SQLiteJobStore:
+    """Job table stored in a local SQLite database."""
+
+    JSON_FIELDS = ("payload", "result", "progress")
+
+    def __init__(self, path: str = "jobs.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                max_attempts INTEGER NOT NULL,
+                run_after REAL NOT NULL,
+                lease_expires_at REAL,
+                worker_id TEXT,
+                error TEXT,
+                result TEXT,
+                progress TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, type, priority DESC, run_after)"
+        )
+
+    def _row_to_job(self, row) -> dict:
+        job = dict(row)
+        for field in self.JSON_FIELDS:
+            if job[field] is not None:
+                job[field] = json.loads(job[field])
+        return job
+
+    def _enqueue(self, job: dict):
+        row = dict(job)
+        for field in self.JSON_FIELDS:
+            if row[field] is not None:
+                row[field] = json.dumps(row[field])
+        columns = ", ".join(row.keys())
+        placeholders = ", ".join(f":{key}" for key in row.keys())
+        with self._lock:
+            self._conn.execute(f"INSERT INTO jobs ({columns}) VALUES ({placeholders})", row)
+
+    def _claim(self, job_types: List[str], worker_id: str, lease_seconds: float) -> Optional[dict]:
+        now = time.time()
+        type_placeholders = ", ".join("?" for _ in job_types)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"""SELECT id FROM jobs
+                        WHERE status = ? AND type IN ({type_placeholders}) AND run_after <= ?
+                        ORDER BY priority DESC, run_after ASC LIMIT 1""",
+                    [QUEUED, *job_types, now],
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    """UPDATE jobs SET status = ?, attempts = attempts + 1, worker_id = ?,
+                       lease_expires_at = ?, updated_at = ? WHERE id = ?""",
+                    [RUNNING, worker_id, now + lease_seconds, now, row["id"]],
+                )
+                job = self._conn.execute("SELECT * FROM jobs WHERE id = ?", [row["id"]]).fetchone()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._row_to_job(job)
+
+    def _update(self, job_id: str, fields: dict):
+        fields = dict(fields, updated_at=time.time())
+        for field in self.JSON_FIELDS:
+            if field in fields and fields[field] is not None:
+                fields[field] = json.dumps(fields[field])
+        assignments = ", ".join(f"{key} = :{key}" for key in fields.keys())
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = :id", dict(fields, id=job_id))
+
+    def _get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", [job_id]).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def _requeue_expired(self) -> Tuple[int, int]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                failed = self._conn.execute(
+                    """UPDATE jobs SET status = ?, error = ?, worker_id = NULL, lease_expires_at = NULL,
+                       updated_at = ?
+                       WHERE status = ? AND lease_expires_at < ? AND attempts >= max_attempts""",
+                    [FAILED, LEASE_EXPIRED_ERROR, now, RUNNING, now],
+                ).rowcount
+                requeued = self._conn.execute(
+                    """UPDATE jobs SET status = ?, worker_id = NULL, lease_expires_at = NULL, updated_at = ?
+                       WHERE status = ? AND lease_expires_at < ?""",
+                    [QUEUED, now, RUNNING, now],
+                ).rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return requeued, failed
+
+    def _count(self, status: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) AS n FROM jobs WHERE status = ?", [status]).fetchone()
+        return row["n"]
+
+    async def enqueue(self, job: dict):
+        await asyncio.to_thread(self._enqueue, job)
+
+    async def claim(self, job_types: List[str], worker_id: str, lease_seconds: float) -> Optional[dict]:
+        return await asyncio.to_thread(self._claim, job_types, worker_id, lease_seconds)
+
+    async def update(self, job_id: str, fields: dict):
+        await asyncio.to_thread(self._update, job_id, fields)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def requeue_expired(self) -> Tuple[int, int]:
+        return await asyncio.to_thread(self._requeue_expired)
+
+    async def count(self, status: str) -> int:
+        return await asyncio.to_thread(self._count, status)
+
+
+class FirestoreJobStore:
+    """Job table stored in a Firestore collection (async client).
+
+    Claiming requires a composite index on (status, type, priority desc, run_after),
+    and filters on run_after so jobs waiting out a retry delay never fill the scan.
+    """
+
+    CLAIM_SCAN_LIMIT = 20
+
+    def __init__(self, client: Callable[[], Any], collection: str = "jobs"):
+        # Accessor for the async Firestore client, created on first use
+        self._client = client
+        self.collection = collection
+
+    @property
+    def db(self):
+        return self._client()
+
+    async def enqueue(self, job: dict):
+        await self.db.collection(self.collection).document(job["id"]).set(job)
+
+    async def claim(self, job_types: List[str], worker_id: str, lease_seconds: float) -> Optional[dict]:
+        from google.cloud import firestore as gc_firestore
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        now = time.time()
+        candidates = (
+            self.db.collection(self.collection)
+            .where(filter=FieldFilter("status", "==", QUEUED))
+            .where(filter=FieldFilter("type", "in", job_types))
+            .where(filter=FieldFilter("run_after", "<=", now))
+            .order_by("priority", direction=gc_firestore.Query.DESCENDING)
+            .order_by("run_after")
+            .limit(self.CLAIM_SCAN_LIMIT)
+        )
+
+        @gc_firestore.async_transactional
+        async def claim_in_transaction(transaction, job_ref):
+            snapshot = await job_ref.get(transaction=transaction)
+            job = snapshot.to_dict()
+            if job is None or job["status"] != QUEUED:
+                return None
+            job.update({
+                "status": RUNNING,
+                "attempts": job["attempts"] + 1,
+                "worker_id": worker_id,
+                "lease_expires_at": now + lease_seconds,
+                "updated_at": now,
+            })
+            transaction.set(job_ref, job)
+            return job
+
+        async for candidate in candidates.stream():
+            job = await claim_in_transaction(self.db.transaction(), candidate.reference)
+            if job is not None:
+                return job
+        return None
+
+    async def update(self, job_id: str, fields: dict):
+        await self.db.collection(self.collection).document(job_id).update(dict(fields, updated_at=time.time()))
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        snapshot = await self.db.collection(self.collection).document(job_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    async def requeue_expired(self) -> Tuple[int, int]:
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        now = time.time()
+        requeued = failed = 0
+        query = (
+            self.db.collection(self.collection)
+            .where(filter=FieldFilter("status", "==", RUNNING))
+            .where(filter=FieldFilter("lease_expires_at", "<", now))
+        )
+        async for snapshot in query.stream():
+            job = snapshot.to_dict()
+            if job["attempts"] >= job["max_attempts"]:
+                await snapshot.reference.update({
+                    "status": FAILED,
+                    "error": LEASE_EXPIRED_ERROR,
+                    "worker_id": None,
+                    "lease_expires_at": None,
+                    "updated_at": now,
+                })
+                failed += 1
+                continue
+            await snapshot.reference.update({
+                "status": QUEUED,
+                "worker_id": None,
+                "lease_expires_at": None,
+                "updated_at": now,
+            })
+            requeued += 1
+        return requeued, failed
+
+    async def count(self, status: str) -> int:
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        query = self.db.collection(self.collection).where(filter=FieldFilter("status", "==", status))
+        result = await query.count().get()
+        return int(result[0][0].value)
+
+
+class JobQueue:
+    """Registers job handlers, enqueues jobs and runs the worker pools."""
+
+    def __init__(self, store, concurrency: Dict[str, int], max_attempts: int = 3,
+                 retry_base_seconds: float = 5.0, retry_max_seconds: float = 300.0,
+                 lease_seconds: float = 600.0, poll_interval: float = 1.0):
+        self.store = store
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = f"{os.uname().nodename}-{os.getpid()}"
+        self._handlers: Dict[str, Callable[..., Awaitable]] = {}
+        self._pools: Dict[str, List[str]] = {}
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.in_flight = 0
+
+    def register(self, job_type: str, pool: str, handler: Callable[..., Awaitable]):
+        """Register an async handler; it is called with the job payload as keyword arguments."""
+        self._handlers[job_type] = handler
+        self._pools.setdefault(pool, []).append(job_type)
+
+    def pool_for(self, job_type: str) -> str:
+        for pool, job_types in self._pools.items():
+            if job_type in job_types:
+                return pool
+        raise ValueError(f"No handler registered for job type {job_type}")
+
+    async def enqueue(self, job_type: str, payload: dict, priority: int = 0,
+                      max_attempts: Optional[int] = None, job_id: Optional[str] = None) -> dict:
+        """Queue a job; job_id lets callers record the id (e.g. in a claim) before the job exists."""
+        pool = self.pool_for(job_type)
+        job = _new_job(job_type, payload, priority, max_attempts or self.max_attempts, job_id)
+        await self.store.enqueue(job)
+        # Wake an idle in-process worker instead of waiting for the next poll
+        if pool in self._wakeups:
+            self._wakeups[pool].set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.store.get(job_id)
+
+    async def set_progress(self, job_id: str, progress: dict):
+        await self.store.update(job_id, {"progress": progress})
+
+    async def report_progress(self, progress: dict):
+        """Record progress on the job the calling handler is running, if any."""
+        job_id = current_job_id.get()
+        if job_id is not None:
+            await self.set_progress(job_id, progress)
+
+    def retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_base_seconds * (2 ** (attempts - 1)), self.retry_max_seconds)
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.store.update(job_id, {"lease_expires_at": time.time() + self.lease_seconds})
+            except Exception as e:
+                log_event("job_heartbeat_failed", level="warning", job_id=job_id, error=str(e))
+
+    async def _run_job(self, job: dict):
+        handler = self._handlers[job["type"]]
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+        token = current_job_id.set(job["id"])
+        self.in_flight += 1
+        job_queue_wait_seconds.observe(max(0.0, time.time() - job["run_after"]), type=job["type"])
+        log_fields = {field: job["payload"].get(field) for field in LOG_CONTEXT_FIELDS}
+        try:
+            try:
+                with bind_log_context(job_id=job["id"], job_type=job["type"], **log_fields), \
+                        span(f"job.{job['type']}", attempt=job["attempts"]):
+                    result = await handler(**job["payload"])
+            except Exception as e:
+                await self._job_failed(job, e)
+                return
+            jobs_total.inc(type=job["type"], outcome="succeeded")
+            await self.store.update(job["id"], {
+                "status": SUCCEEDED,
+                "result": result if isinstance(result, dict) else None,
+                "error": None,
+                "lease_expires_at": None,
+            })
+        finally:
+            self.in_flight -= 1
+            current_job_id.reset(token)
+            heartbeat.cancel()
+
+    async def _job_failed(self, job: dict, e: Exception):
+        """Queue a retry after the backoff delay, or mark the job failed after its last attempt."""
+        error = f"{type(e).__name__}: {str(e)}"
+        if job["attempts"] < job["max_attempts"] and not isinstance(e, PermanentJobError):
+            delay = self.retry_delay(job["attempts"])
+            jobs_total.inc(type=job["type"], outcome="retried")
+            log_event("job_retry", level="warning", job_id=job["id"], job_type=job["type"],
+                      attempt=job["attempts"], retry_in_seconds=round(delay, 1), error=error)
+            await self.store.update(job["id"], {
+                "status": QUEUED,
+                "error": error,
+                "run_after": time.time() + delay,
+                "lease_expires_at": None,
+            })
+        else:
+            jobs_total.inc(type=job["type"], outcome="failed")
+            log_event("job_failed", level="error", job_id=job["id"], job_type=job["type"],
+                      attempt=job["attempts"], error=error)
+            await self.store.update(job["id"], {
+                "status": FAILED,
+                "error": error,
+                "lease_expires_at": None,
+            })
+
+    async def _worker_loop(self, pool: str):
+        job_types = self._pools[pool]
+        wakeup = self._wakeups[pool]
+        while True:
+            try:
+                job = await self.store.claim(job_types, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                log_event("job_claim_failed", level="error", pool=pool, error=str(e))
+                job = None
+            if job is None:
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run_job(job)
+            except Exception as e:
+                # Recording the outcome failed; the job's lease runs out and the reaper requeues it
+                log_event("job_update_failed", level="error", pool=pool, job_id=job["id"], error=str(e))
+
+    async def _reaper_loop(self):
+        # Jobs whose worker died (lease expired) go back on the queue, or fail after their last attempt
+        while True:
+            try:
+                requeued, failed = await self.store.requeue_expired()
+                if requeued:
+                    log_event("jobs_requeued", level="warning", count=requeued)
+                if failed:
+                    log_event("jobs_lease_expired", level="error", count=failed)
+            except Exception as e:
+                log_event("job_requeue_failed", level="error", error=str(e))
+            await asyncio.sleep(self.lease_seconds / 3)
+
+    def start(self):
+        """Start the worker pools on the running event loop."""
+        for pool in self._pools:
+            self._wakeups[pool] = asyncio.Event()
+            for _ in range(self.concurrency.get(pool, 1)):
+                self._tasks.append(asyncio.create_task(self._worker_loop(pool)))
+        self._tasks.append(asyncio.create_task(self._reaper_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def stats(self) -> dict:
+        return {
+            "queued": await self.store.count(QUEUED),
+            "running": await self.store.count(RUNNING),
+            "failed": await self.store.count(FAILED),
+            "in_flight": self.in_flight,
+            "concurrency": self.concurrency,
+        }
@@ -0,0 +1,273 @@
+"""Shared gateway for LLM requests: pooled clients, quota limits and adaptive concurrency.
+
+Every call to a model goes through a gateway, which waits for request and
+token budget (token buckets sized to the per-minute quotas), limits how many
+requests are in flight with an AIMD window that halves on 429/503 responses
+and grows back on success, and retries throttled requests after the delay the
+API suggests.
+"""
+import re
+import time
+import random
+import asyncio
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from metrics import llm_requests_total, log_event, record_llm_usage
+
+if TYPE_CHECKING:
+    import google.generativeai as genai
+
+THROTTLE_STATUS_CODES = (429, 503)
+
+# Retry hints embedded in error messages, e.g. '"retryDelay": "13s"', 'retry_delay { seconds: 13 }',
+# 'Please retry in 12.5s'
+RETRY_DELAY_PATTERNS = (
+    re.compile(r'retryDelay"?\s*:\s*"?(\d+(?:\.\d+)?)s'),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)"),
+    re.compile(r"retry (?:in|after) (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+)
+
+
+def _error_chain(error: BaseException):
+    # Client wrappers (e.g. zerox) re-raise provider errors as a plain Exception
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    """True for rate-limit and overload errors (429/503) from any client in the chain."""
+    # Imported here: the Google client libraries are only loaded by processes that call models
+    from google.api_core import exceptions as google_exceptions
+
+    throttle_exceptions = (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+    )
+    for item in _error_chain(error):
+        if isinstance(item, throttle_exceptions):
+            return True
+        if getattr(item, "status_code", None) in THROTTLE_STATUS_CODES:
+            return True
+        if getattr(item, "code", None) in THROTTLE_STATUS_CODES:
+            return True
+    return False
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """The retry delay suggested by the API, if the error carries one."""
+    for item in _error_chain(error):
+        for detail in getattr(item, "details", None) or []:
+            delay = getattr(detail, "retry_delay", None)
+            if delay is not None and (delay.seconds or delay.nanos):
+                return delay.seconds + delay.nanos / 1e9
+
+        response = getattr(item, "response", None)
+        headers = getattr(response, "headers", None)
+        if headers is not None:
+            value = headers.get("retry-after")
+            try:
+                if value is not None:
+                    return float(value)
+            except ValueError:
+                pass
+
+        message = str(item)
+        for pattern in RETRY_DELAY_PATTERNS:
+            match = pattern.search(message)
+            if match:
+                return float(match.group(1))
+    return None
+
+
+def response_usage(response) -> Optional[Tuple[int, int]]:
+    """(input, output) tokens used by a Gemini or zerox response, when reported."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None and getattr(usage, "total_token_count", None):
+        input_tokens = getattr(usage, "prompt_token_count", None) or 0
+        output_tokens = getattr(usage, "candidates_token_count", None)
+        if output_tokens is None:
+            output_tokens = usage.total_token_count - input_tokens
+        return input_tokens, output_tokens
+    input_tokens = getattr(response, "input_tokens", None)
+    output_tokens = getattr(response, "output_tokens", None)
+    if input_tokens is not None or output_tokens is not None:
+        return input_tokens or 0, output_tokens or 0
+    return None
+
+
+def response_tokens(response) -> Optional[int]:
+    """Total tokens used by a Gemini or zerox response, when reported."""
+    usage = response_usage(response)
+    return sum(usage) if usage is not None else None
+
+
+class TokenBucket:
+    """Refills continuously at rate_per_minute up to one minute's worth of capacity."""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    async def acquire(self, amount: float) -> float:
+        """Wait until amount tokens are available and take them; returns the seconds waited."""
+        # A single request larger than the bucket only has to wait for a full bucket
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate_per_second
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def adjust(self, amount: float):
+        """Charge (or refund) the difference between the estimated and the actual usage."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency window: +1 per window of successes, halved when throttled."""
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 32):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, throttled: bool = False):
+        async with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class LLMGateway:
+    """
+    Routes calls to one model quota: pooled clients, RPM/TPM token buckets,
+    adaptive concurrency and retries of throttled requests.
+    """
+
+    def __init__(self, name: str, requests_per_minute: int, tokens_per_minute: int,
+                 initial_concurrency: int = 4, max_concurrency: int = 16, max_retries: int = 5,
+                 retry_base_seconds: float = 2.0, retry_max_seconds: float = 60.0):
+        self.name = name
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.limiter = AdaptiveConcurrencyLimiter(initial_concurrency, maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._clients: Dict[Any, Any] = {}
+        self._client_lock = asyncio.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.failures = 0
+        self.tokens_used = 0
+        self.quota_wait_seconds = 0.0
+
+    def model(self, model_name: str) -> "genai.GenerativeModel":
+        """A long-lived Gemini model client, created once per model name."""
+        import google.generativeai as genai
+
+        key = ("genai", model_name)
+        if key not in self._clients:
+            self._clients[key] = genai.GenerativeModel(model_name)
+        return self._clients[key]
+
+    async def client(self, key, factory: Callable[[], Any]):
+        """A long-lived client built by a (blocking) factory, created once per key."""
+        async with self._client_lock:
+            if key not in self._clients:
+                self._clients[key] = await asyncio.to_thread(factory)
+            return self._clients[key]
+
+    def _retry_delay(self, error: BaseException, attempt: int) -> float:
+        hint = retry_after_seconds(error)
+        if hint is not None:
+            # A little jitter so throttled callers do not all come back at once
+            return min(hint, self.retry_max_seconds) * random.uniform(1.0, 1.25)
+        delay = min(self.retry_base_seconds * (2 ** attempt), self.retry_max_seconds)
+        return random.uniform(delay / 2, delay)
+
+    async def call(self, request: Callable[[], Awaitable[Any]], estimated_tokens: int = 1000,
+                   model: str = "unknown"):
+        """
+        Run request() within the quotas. Throttled requests are retried up to
+        max_retries times; any other error is raised straight away. model only
+        labels the token and cost metrics.
+        """
+        attempt = 0
+        while True:
+            self.quota_wait_seconds += await self.request_bucket.acquire(1)
+            self.quota_wait_seconds += await self.token_bucket.acquire(estimated_tokens)
+            await self.limiter.acquire()
+            throttled = False
+            try:
+                self.requests += 1
+                response = await request()
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                if not throttled or attempt >= self.max_retries:
+                    self.failures += 1
+                    llm_requests_total.inc(gateway=self.name, outcome="throttled" if throttled else "error")
+                    raise
+                error = e
+            finally:
+                await self.limiter.release(throttled)
+
+            if not throttled:
+                llm_requests_total.inc(gateway=self.name, outcome="ok")
+                usage = response_usage(response)
+                if usage is not None:
+                    used = sum(usage)
+                    self.tokens_used += used
+                    self.token_bucket.adjust(used - estimated_tokens)
+                    record_llm_usage(self.name, model, *usage)
+                return response
+
+            self.throttled += 1
+            self.retries += 1
+            llm_requests_total.inc(gateway=self.name, outcome="retried")
+            delay = self._retry_delay(error, attempt)
+            log_event("llm_throttled", level="warning", gateway=self.name, attempt=attempt + 1,
+                      retry_in_seconds=round(delay, 1), error=str(error)[:200])
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "failures": self.failures,
+            "tokens_used": self.tokens_used,
+            "quota_wait_seconds": round(self.quota_wait_seconds, 3),
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+        }
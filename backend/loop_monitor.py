@@ -0,0 +1,54 @@
+import time
+import asyncio
+from typing import Optional
+
+
+class EventLoopLagMonitor:
+    """Measures event-loop lag: how late a periodic timer wakes up.
+
+    Blocking calls on the loop (synchronous I/O, heavy CPU work) show up as
+    lag because the timer callback cannot run until they return.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.samples = 0
+        # Samples above these thresholds (seconds), for a coarse distribution
+        self.buckets = {0.01: 0, 0.05: 0, 0.1: 0, 0.5: 0, 1.0: 0}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+            self.samples += 1
+            for threshold in self.buckets:
+                if lag > threshold:
+                    self.buckets[threshold] += 1
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "last_lag_seconds": self.last_lag,
+            "max_lag_seconds": self.max_lag,
+            "mean_lag_seconds": (self.total_lag / self.samples) if self.samples else 0.0,
+            "samples": self.samples,
+            "samples_over_seconds": {str(k): v for k, v in self.buckets.items()},
+        }
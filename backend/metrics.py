@@ -0,0 +1,266 @@
+"""Pipeline instrumentation: timing spans, Prometheus metrics and JSON logs.
+
+Stages are wrapped in span(), which records their duration in a histogram and
+writes a JSON log line. Log lines carry the ids bound with bind_log_context()
+(the job queue binds the job, assignment and submission ids), so one
+submission's trail can be followed across stages. registry.render() produces
+the Prometheus text format served at /metrics.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> str:
+        return f"# HELP {self.name} {self.help_text}\n# TYPE {self.name} {self.kind}\n"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted(self._children.items())
+        return "".join(
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}\n" for key, value in items
+        )
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._children[self._key(labels)] = value
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted(self._children.items())
+        return "".join(
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}\n" for key, value in items
+        )
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    child["counts"][index] += 1
+                    break
+            child["sum"] += value
+            child["count"] += 1
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """(count, sum) per label combination."""
+        with self._lock:
+            return {key: (child["count"], child["sum"]) for key, child in self._children.items()}
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted((key, dict(child, counts=list(child["counts"]))) for key, child in self._children.items())
+        lines = []
+        for key, child in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, child["counts"]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}\n")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child['sum'])}\n")
+            lines.append(f"{self.name}_count{labels} {child['count']}\n")
+        return "".join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                  buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        return "".join(metric.header() + metric.render() for metric in self._metrics.values())
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "eduassign_stage_duration_seconds", "Duration of pipeline stages", ["stage", "outcome"]
+)
+llm_requests_total = registry.counter(
+    "eduassign_llm_requests_total", "LLM requests by gateway and outcome", ["gateway", "outcome"]
+)
+llm_tokens_total = registry.counter(
+    "eduassign_llm_tokens_total", "LLM tokens used", ["gateway", "model", "kind"]
+)
+llm_cost_usd_total = registry.counter(
+    "eduassign_llm_cost_usd_total", "Estimated LLM spend in US dollars", ["gateway", "model"]
+)
+jobs_total = registry.counter(
+    "eduassign_jobs_total", "Finished job attempts by type and outcome", ["type", "outcome"]
+)
+extraction_pages_total = registry.counter(
+    "eduassign_extraction_pages_total", "Extracted pages by path (native text layer or OCR)", ["path"]
+)
+extraction_documents_total = registry.counter(
+    "eduassign_extraction_documents_total", "Extracted documents by path (native, ocr or mixed)", ["path"]
+)
+ocr_pages_total = registry.counter(
+    "eduassign_ocr_pages_total", "OCR pages by source (page cache or model call)", ["source"]
+)
+evaluation_parse_total = registry.counter(
+    "eduassign_evaluation_parse_total", "Evaluation response parse, repair, validation and re-ask outcomes",
+    ["outcome"]
+)
+
+# JSON logs
+
+log_context = contextvars.ContextVar("log_context", default={})
+
+logger = logging.getLogger("eduassign")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+
+
+@contextmanager
+def bind_log_context(**fields):
+    """Tag every log line written inside the block (and tasks started from it) with these fields."""
+    token = log_context.set({**log_context.get(), **{key: value for key, value in fields.items() if value}})
+    try:
+        yield
+    finally:
+        log_context.reset(token)
+
+
+def log_event(event: str, level: str = "info", **fields):
+    """Write one JSON log line with the bound context ids."""
+    level_number = logging.getLevelName(level.upper())
+    if not logger.isEnabledFor(level_number):
+        return
+    record = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "level": level,
+        "event": event,
+        **log_context.get(),
+        **{key: value for key, value in fields.items() if value is not None},
+    }
+    logger.log(level_number, json.dumps(record, default=str))
+
+
+@contextmanager
+def span(stage: str, **fields):
+    """Time a pipeline stage: records the duration histogram and logs the outcome."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException as e:
+        outcome = "error"
+        fields["error"] = f"{type(e).__name__}: {str(e)[:500]}"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=stage, outcome=outcome)
+        log_event("span", level="info" if outcome == "ok" else "error", stage=stage,
+                  duration_ms=round(elapsed * 1000, 2), outcome=outcome, **fields)
+
+
+# LLM cost
+
+# US dollars per million (input, output) tokens, matched by model name prefix.
+# Override with LLM_PRICES_JSON, e.g. '{"gemini-2.0-flash": [0.1, 0.4]}'.
+LLM_PRICES_PER_MILLION = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+LLM_PRICES_PER_MILLION.update({
+    name: tuple(prices) for name, prices in json.loads(os.getenv("LLM_PRICES_JSON", "{}")).items()
+})
+
+
+def llm_price(model: str) -> Optional[Tuple[float, float]]:
+    name = model.split("/")[-1]
+    for prefix in sorted(LLM_PRICES_PER_MILLION, key=len, reverse=True):
+        if name.startswith(prefix):
+            return LLM_PRICES_PER_MILLION[prefix]
+    return None
+
+
+def record_llm_usage(gateway: str, model: str, input_tokens: int, output_tokens: int):
+    """Count tokens and estimated cost of one LLM response."""
+    llm_tokens_total.inc(input_tokens, gateway=gateway, model=model, kind="input")
+    llm_tokens_total.inc(output_tokens, gateway=gateway, model=model, kind="output")
+    price = llm_price(model)
+    if price is not None:
+        cost = (input_tokens * price[0] + output_tokens * price[1]) / 1_000_000
+        llm_cost_usd_total.inc(cost, gateway=gateway, model=model)
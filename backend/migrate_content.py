@@ -0,0 +1,82 @@
+"""Move extracted_content stored inline on documents into the content store.
+
+Run with `python migrate_content.py` (add --dry-run to only count). Each
+assignment and submission that still has extracted_content inline gets the
+markdown written to the blob store and the field replaced by
+extracted_content_ref. The app reads both forms, so the migration can run
+while it is serving, and can be interrupted and re-run.
+"""
+import argparse
+import asyncio
+
+from backend import repository, content_store, blob_store
+from repository import DELETE_FIELD
+from metrics import log_event
+
+# Pages are walked in the listing order, so each collection needs its sort field
+ORDER_FIELDS = {"assignments": "created_at", "submissions": "submitted_at"}
+
+
+async def migrate_collection(collection: str, batch_size: int, concurrency: int, dry_run: bool) -> dict:
+    counts = {"scanned": 0, "migrated": 0, "bytes": 0, "stored_bytes": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def migrate(doc_id: str):
+        async with semaphore:
+            try:
+                # The listing page only carries the reference; fetch the heavy field per document
+                document = await repository.get(collection, doc_id, fields=["extracted_content"])
+                content = (document or {}).get("extracted_content")
+                if content is None:
+                    return
+                counts["bytes"] += len(content.encode("utf-8"))
+                if not dry_run:
+                    ref = await content_store.put(content)
+                    await repository.update(collection, doc_id, {
+                        "extracted_content_ref": ref,
+                        "extracted_content": DELETE_FIELD
+                    })
+                    counts["stored_bytes"] += ref["stored_size"]
+                counts["migrated"] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                log_event("content_migration_failed", level="error", collection=collection, id=doc_id, error=str(e))
+
+    cursor = None
+    while True:
+        page = [
+            document async for document in await repository.query(
+                collection, order_by=ORDER_FIELDS[collection], limit=batch_size, start_after=cursor,
+                fields=["extracted_content_ref", ORDER_FIELDS[collection]]
+            )
+        ]
+        if not page:
+            break
+        counts["scanned"] += len(page)
+        await asyncio.gather(*(
+            migrate(document["id"]) for document in page if "extracted_content_ref" not in document
+        ))
+        cursor = page[-1]["id"]
+        log_event("content_migration_progress", collection=collection, **counts)
+    return counts
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--collection", choices=sorted(ORDER_FIELDS), action="append",
+                        help="collection to migrate (default: all)")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--dry-run", action="store_true", help="count documents without changing them")
+    args = parser.parse_args()
+
+    try:
+        for collection in args.collection or sorted(ORDER_FIELDS):
+            counts = await migrate_collection(collection, args.batch_size, args.concurrency, args.dry_run)
+            log_event("content_migration_done", collection=collection, dry_run=args.dry_run, **counts)
+    finally:
+        blob_store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+"""Split assignment and submission markdown into per-question segments."""
+import re
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# "Q1", "Q.1", "Question 1:", "## Question 1", "**Q1.**" at the start of a line
+EXPLICIT_QUESTION_PATTERN = re.compile(
+    r"^[ \t]{0,3}(?:#{1,6}[ \t]*)?(?:\*\*|__)?[ \t]*Q(?:uestion)?[ \t]*\.?[ \t]*(\d+)\b",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# "1.", "1)", "## 1." at the start of a line; only used when there are no explicit markers
+NUMBERED_QUESTION_PATTERN = re.compile(
+    r"^[ \t]{0,3}(?:#{1,6}[ \t]*)?(?:\*\*|__)?[ \t]*(\d+)[ \t]*[.)]",
+    re.MULTILINE
+)
+
+REFERENCE_PATTERN = re.compile(r"(?:q(?:uestion)?)?[ \t]*\.?[ \t]*(\d+)", re.IGNORECASE)
+
+
+def normalize_reference(reference: str) -> Optional[str]:
+    """Map "Question 1", "q.1" or "1" to the canonical "Q1"."""
+    match = REFERENCE_PATTERN.match(reference.strip())
+    return f"Q{int(match.group(1))}" if match else None
+
+
+def _numbered_starts(markdown: str):
+    # Bare numbers are common inside answers, so only accept the running sequence 1, 2, 3...
+    starts = []
+    expected = 1
+    for match in NUMBERED_QUESTION_PATTERN.finditer(markdown):
+        if int(match.group(1)) == expected:
+            starts.append((match.start(), f"Q{expected}"))
+            expected += 1
+    return starts
+
+
+def split_questions(markdown: str) -> Tuple[str, "OrderedDict[str, str]"]:
+    """
+    Return the text before the first question and the segment of each question,
+    keyed by canonical reference in document order. A reference that appears
+    again continues its existing segment.
+    """
+    starts = [(match.start(), f"Q{int(match.group(1))}") for match in EXPLICIT_QUESTION_PATTERN.finditer(markdown)]
+    if len(starts) < 2:
+        starts = _numbered_starts(markdown)
+    if not starts:
+        return markdown.strip(), OrderedDict()
+
+    preamble = markdown[:starts[0][0]].strip()
+    segments = OrderedDict()
+    bounds = starts + [(len(markdown), None)]
+    for (start, reference), (end, _) in zip(bounds, bounds[1:]):
+        text = markdown[start:end].strip()
+        segments[reference] = f"{segments[reference]}\n\n{text}" if reference in segments else text
+    return preamble, segments
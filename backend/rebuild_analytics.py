@@ -0,0 +1,78 @@
+"""Rebuild the class analytics aggregates from the stored evaluations.
+
+Run with `python rebuild_analytics.py` (add --dry-run to only count) to
+backfill submissions evaluated before the aggregates existed, or to repair
+them. Every evaluated submission gets its analytics_contribution recomputed
+and the assignment and student aggregates are rewritten from scratch, so run
+it while no evaluations are being written.
+"""
+import argparse
+import asyncio
+
+from backend import repository
+from analytics import ASSIGNMENT_ANALYTICS, STUDENT_ANALYTICS, apply_contribution, contribution
+from metrics import log_event
+from repository import DELETE_FIELD
+
+# Firestore allows at most 500 writes per batch
+BATCH_SIZE = 500
+
+
+async def rebuild(page_size: int, dry_run: bool) -> dict:
+    counts = {"scanned": 0, "evaluated": 0, "assignments": 0, "students": 0}
+    assignments, students = {}, {}
+    contributions = []
+
+    cursor = None
+    while True:
+        page = [
+            document async for document in await repository.query(
+                'submissions', order_by="submitted_at", limit=page_size, start_after=cursor,
+                fields=["assignment_id", "student_id", "evaluation_result", "submitted_at"]
+            )
+        ]
+        if not page:
+            break
+        counts["scanned"] += len(page)
+        for submission in page:
+            if not submission.get("evaluation_result") or not submission.get("assignment_id"):
+                continue
+            item = contribution(submission["evaluation_result"])
+            assignment_id, student_id = submission["assignment_id"], submission.get("student_id")
+            assignments[assignment_id] = apply_contribution(assignments.get(assignment_id), None, item)
+            if student_id:
+                students[student_id] = apply_contribution(students.get(student_id), None, item, with_questions=False)
+            contributions.append((submission["id"], {"analytics_contribution": item, "analytics_pending": DELETE_FIELD}))
+            counts["evaluated"] += 1
+        cursor = page[-1]["id"]
+        log_event("analytics_rebuild_progress", **counts)
+
+    counts["assignments"], counts["students"] = len(assignments), len(students)
+    if dry_run:
+        return counts
+
+    for start in range(0, len(contributions), BATCH_SIZE):
+        await repository.update_many('submissions', contributions[start:start + BATCH_SIZE])
+    await asyncio.gather(*(
+        repository.set(ASSIGNMENT_ANALYTICS, assignment_id, {**aggregate, "assignment_id": assignment_id})
+        for assignment_id, aggregate in assignments.items()
+    ))
+    await asyncio.gather(*(
+        repository.set(STUDENT_ANALYTICS, student_id, {**aggregate, "student_id": student_id})
+        for student_id, aggregate in students.items()
+    ))
+    return counts
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="count submissions without writing")
+    args = parser.parse_args()
+
+    counts = await rebuild(args.page_size, args.dry_run)
+    log_event("analytics_rebuild_done", dry_run=args.dry_run, **counts)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
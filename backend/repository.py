@@ -0,0 +1,645 @@
+"""Persistence for assignments, submissions and uploaded PDFs.
+
+The app talks to a document repository and a blob store instead of Firestore
+and Cloud Storage directly. Production uses FirestoreRepository and
+GCSBlobStore; SQLiteRepository and LocalBlobStore keep everything in a local
+database file and directory, so the app can run offline for development,
+load tests and benchmarks.
+"""
+import os
+import re
+import hmac
+import json
+import time
+import asyncio
+import hashlib
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from metrics import log_event
+
+
+class DocumentNotFound(LookupError):
+    """Raised when updating a document that does not exist."""
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor does not name an existing document."""
+
+
+# (collection, doc_id, data) written by a transaction
+Write = Tuple[str, str, dict]
+
+
+class _DeleteField:
+    def __repr__(self):
+        return "DELETE_FIELD"
+
+
+# Update value that removes the field from the document
+DELETE_FIELD = _DeleteField()
+
+
+def _stamped(data: dict) -> dict:
+    """Every write records when the document last changed (used for Last-Modified)."""
+    return {**data, "updated_at": datetime.now(timezone.utc)}
+
+
+def _firestore_update(data: dict) -> dict:
+    from firebase_admin import firestore
+
+    return {key: firestore.DELETE_FIELD if value is DELETE_FIELD else value for key, value in data.items()}
+
+
+class FirestoreRepository:
+    """Documents stored in Firestore collections (async client).
+
+    The clients are passed as accessor functions and only created on first
+    use, so importing the app neither loads nor connects to Firestore.
+    """
+
+    def __init__(self, client: Callable[[], Any], listener_client: Callable[[], Any]):
+        self._client = client
+        self._listener_client = listener_client
+
+    @property
+    def db(self):
+        return self._client()
+
+    async def get(self, collection: str, doc_id: str, fields: Optional[List[str]] = None) -> Optional[dict]:
+        doc = await self.db.collection(collection).document(doc_id).get(field_paths=fields)
+        return doc.to_dict() if doc.exists else None
+
+    async def get_many(self, collection: str, doc_ids: Iterable[str],
+                       fields: Optional[List[str]] = None) -> Dict[str, dict]:
+        refs = [self.db.collection(collection).document(doc_id) for doc_id in doc_ids]
+        if not refs:
+            return {}
+        return {doc.id: doc.to_dict() async for doc in self.db.get_all(refs, field_paths=fields) if doc.exists}
+
+    async def set(self, collection: str, doc_id: str, data: dict, merge: bool = False):
+        await self.db.collection(collection).document(doc_id).set(_stamped(data), merge=merge)
+
+    async def update(self, collection: str, doc_id: str, data: dict):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            await self.db.collection(collection).document(doc_id).update(_firestore_update(_stamped(data)))
+        except NotFound:
+            raise DocumentNotFound(f"{collection}/{doc_id}")
+
+    async def update_many(self, collection: str, updates: List[Tuple[str, dict]]):
+        """Apply several updates as one batched write (at most 500 per call)."""
+        batch = self.db.batch()
+        for doc_id, data in updates:
+            batch.update(self.db.collection(collection).document(doc_id), _firestore_update(_stamped(data)))
+        await batch.commit()
+
+    async def transaction(self, reads: List[Tuple[str, str]],
+                          apply: Callable[[List[Optional[dict]]], Tuple[List[Write], List[Write]]]):
+        """
+        Read documents and write the result of apply(documents) atomically.
+
+        apply gets the documents named by reads (None where missing) and returns
+        (sets, updates): documents to replace and documents to update. It is
+        called again if another write touched the documents in the meantime.
+        """
+        from google.cloud import firestore as cloud_firestore
+
+        refs = [self.db.collection(collection).document(doc_id) for collection, doc_id in reads]
+
+        @cloud_firestore.async_transactional
+        async def run(transaction):
+            snapshots = {doc.reference.path: doc async for doc in self.db.get_all(refs, transaction=transaction)}
+            documents = [
+                snapshots[ref.path].to_dict() if ref.path in snapshots and snapshots[ref.path].exists else None
+                for ref in refs
+            ]
+            sets, updates = apply(documents)
+            for collection, doc_id, data in sets:
+                transaction.set(self.db.collection(collection).document(doc_id), _stamped(data))
+            for collection, doc_id, data in updates:
+                transaction.update(self.db.collection(collection).document(doc_id), _firestore_update(_stamped(data)))
+
+        await run(self.db.transaction())
+
+    async def query(self, collection: str, filters: Optional[dict] = None, order_by: Optional[str] = None,
+                    limit: Optional[int] = None, start_after: Optional[str] = None,
+                    fields: Optional[List[str]] = None) -> AsyncIterator[dict]:
+        """
+        Query documents matching equality filters (a list value means "in"),
+        newest first by order_by, continuing after the document id start_after.
+        """
+        from google.cloud.firestore import Query as FirestoreQuery
+        from google.cloud.firestore_v1.field_path import FieldPath
+
+        query = self.db.collection(collection)
+        for field, value in (filters or {}).items():
+            query = query.where(field, "in" if isinstance(value, list) else "==", value)
+        if fields is not None:
+            query = query.select(fields)
+        if order_by:
+            query = (
+                query.order_by(order_by, direction=FirestoreQuery.DESCENDING)
+                .order_by(FieldPath.document_id(), direction=FirestoreQuery.DESCENDING)
+            )
+        if limit:
+            query = query.limit(limit)
+        if start_after:
+            # Only the ordering field is needed to position the cursor
+            cursor = await self.db.collection(collection).document(start_after).get(
+                field_paths=[order_by] if order_by else None
+            )
+            if not cursor.exists:
+                raise InvalidCursor(start_after)
+            query = query.start_after(cursor)
+
+        async def documents():
+            async for doc in query.stream():
+                data = doc.to_dict()
+                data.setdefault("id", doc.id)
+                yield data
+        return documents()
+
+    def watch(self, collection: str, filters: dict, callback: Callable[[dict], None],
+              fields: Optional[List[str]] = None) -> Callable[[], None]:
+        """
+        Call callback(document) on the running event loop for every document
+        matching the equality filters that is added or changed after the watch
+        starts. Returns a function that stops the listener. Listeners always
+        receive whole documents, so fields is ignored.
+        """
+        loop = asyncio.get_running_loop()
+        # Listeners are only available on the synchronous client; callbacks arrive on its thread
+        query = self._listener_client().collection(collection)
+        for field, value in filters.items():
+            query = query.where(field, "==", value)
+        initial = threading.Event()
+
+        def on_snapshot(snapshots, changes, read_time):
+            # The first snapshot lists every existing document, not changes
+            if not initial.is_set():
+                initial.set()
+                return
+            for change in changes:
+                if change.type.name in ("ADDED", "MODIFIED"):
+                    data = change.document.to_dict()
+                    data.setdefault("id", change.document.id)
+                    loop.call_soon_threadsafe(callback, data)
+
+        return query.on_snapshot(on_snapshot).unsubscribe
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_object(obj: dict):
+    if len(obj) == 1 and "$datetime" in obj:
+        return datetime.fromisoformat(obj["$datetime"])
+    return obj
+
+
+def _timestamp(value) -> Optional[float]:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+
+class SQLiteRepository:
+    """Documents stored as JSON in a local SQLite database, one table per collection.
+
+    Fields that listings filter and sort on are copied into indexed columns;
+    filters on any other field fall back to json_extract.
+    """
+
+    INDEXED_FIELDS = ("assignment_id", "student_id", "creator_id", "status", "ai_processing_status")
+    # Ordering fields are stored in a single sort_at column (a collection uses one of them)
+    ORDER_FIELDS = ("created_at", "submitted_at")
+    COLLECTION_PATTERN = re.compile(r"^[a-z_]+$")
+
+    def __init__(self, path: str = "local.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._tables = set()
+
+    def _table(self, collection: str) -> str:
+        if collection in self._tables:
+            return collection
+        if not self.COLLECTION_PATTERN.match(collection):
+            raise ValueError(f"Invalid collection name: {collection}")
+        columns = ", ".join(f"{field} TEXT" for field in self.INDEXED_FIELDS)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {collection} (id TEXT PRIMARY KEY, data TEXT NOT NULL, "
+            f"{columns}, sort_at REAL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{collection}_sort ON {collection} (sort_at DESC, id DESC)")
+        for field in ("assignment_id", "student_id", "creator_id"):
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{collection}_{field} "
+                f"ON {collection} ({field}, sort_at DESC, id DESC)"
+            )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{collection}_status ON {collection} (status)")
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{collection}_ai_status "
+            f"ON {collection} (assignment_id, ai_processing_status)"
+        )
+        self._tables.add(collection)
+        return collection
+
+    def _row_values(self, doc_id: str, data: dict) -> dict:
+        values = {field: data.get(field) for field in self.INDEXED_FIELDS}
+        values["sort_at"] = next(
+            (_timestamp(data[field]) for field in self.ORDER_FIELDS if field in data), None
+        )
+        values["id"] = doc_id
+        values["data"] = json.dumps(data, default=_encode_value)
+        return values
+
+    def _load(self, data: str, fields: Optional[List[str]]) -> dict:
+        document = json.loads(data, object_hook=_decode_object)
+        if fields is not None:
+            document = {field: document[field] for field in fields if field in document}
+        return document
+
+    def _read(self, table: str, doc_id: str) -> Optional[dict]:
+        row = self._conn.execute(f"SELECT data FROM {table} WHERE id = ?", [doc_id]).fetchone()
+        return self._load(row["data"], None) if row else None
+
+    def _write(self, table: str, doc_id: str, data: dict):
+        values = self._row_values(doc_id, data)
+        columns = ", ".join(values.keys())
+        placeholders = ", ".join(f":{key}" for key in values.keys())
+        self._conn.execute(f"INSERT OR REPLACE INTO {table} ({columns}) VALUES ({placeholders})", values)
+
+    def _get(self, collection: str, doc_id: str, fields: Optional[List[str]]) -> Optional[dict]:
+        with self._lock:
+            table = self._table(collection)
+            row = self._conn.execute(f"SELECT data FROM {table} WHERE id = ?", [doc_id]).fetchone()
+        return self._load(row["data"], fields) if row else None
+
+    def _get_many(self, collection: str, doc_ids: List[str], fields: Optional[List[str]]) -> Dict[str, dict]:
+        if not doc_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in doc_ids)
+        with self._lock:
+            table = self._table(collection)
+            rows = self._conn.execute(
+                f"SELECT id, data FROM {table} WHERE id IN ({placeholders})", doc_ids
+            ).fetchall()
+        return {row["id"]: self._load(row["data"], fields) for row in rows}
+
+    def _set(self, collection: str, doc_id: str, data: dict, merge: bool):
+        with self._lock:
+            table = self._table(collection)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._read(table, doc_id) if merge else None
+                self._write(table, doc_id, dict(existing or {}, **_stamped(data)))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _apply_update(self, table: str, collection: str, doc_id: str, data: dict):
+        existing = self._read(table, doc_id)
+        if existing is None:
+            raise DocumentNotFound(f"{collection}/{doc_id}")
+        merged = dict(existing, **_stamped(data))
+        self._write(table, doc_id, {
+            key: value for key, value in merged.items() if value is not DELETE_FIELD
+        })
+
+    def _update_many(self, collection: str, updates: List[Tuple[str, dict]]):
+        with self._lock:
+            table = self._table(collection)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # All or nothing, like a Firestore batch
+                for doc_id, data in updates:
+                    self._apply_update(table, collection, doc_id, data)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _transaction(self, reads: List[Tuple[str, str]], apply: Callable):
+        with self._lock:
+            tables = {collection: self._table(collection) for collection, _ in reads}
+            # The write lock is taken up front, so apply never has to be retried
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                sets, updates = apply([self._read(tables[collection], doc_id) for collection, doc_id in reads])
+                for collection, doc_id, data in sets:
+                    self._write(self._table(collection), doc_id, _stamped(data))
+                for collection, doc_id, data in updates:
+                    self._apply_update(self._table(collection), collection, doc_id, data)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _column(self, field: str) -> str:
+        if field in self.INDEXED_FIELDS:
+            return field
+        if not re.match(r"^[A-Za-z_][A-Za-z0-9_.]*$", field):
+            raise ValueError(f"Invalid field name: {field}")
+        return f"json_extract(data, '$.{field}')"
+
+    def _query(self, collection: str, filters: Optional[dict], order_by: Optional[str], limit: Optional[int],
+               start_after: Optional[str], fields: Optional[List[str]]) -> List[dict]:
+        conditions = []
+        params = []
+        for field, value in (filters or {}).items():
+            if isinstance(value, list):
+                conditions.append(f"{self._column(field)} IN ({', '.join('?' for _ in value)})")
+                params.extend(value)
+            else:
+                conditions.append(f"{self._column(field)} = ?")
+                params.append(value)
+
+        with self._lock:
+            table = self._table(collection)
+            if order_by:
+                # Like Firestore, ordering skips documents without the field
+                conditions.append("sort_at IS NOT NULL")
+            if start_after:
+                cursor = self._conn.execute(f"SELECT sort_at FROM {table} WHERE id = ?", [start_after]).fetchone()
+                if cursor is None:
+                    raise InvalidCursor(start_after)
+                conditions.append("(sort_at < ? OR (sort_at = ? AND id < ?))")
+                params.extend([cursor["sort_at"], cursor["sort_at"], start_after])
+
+            sql = f"SELECT id, data FROM {table}"
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            if order_by:
+                sql += " ORDER BY sort_at DESC, id DESC"
+            if limit:
+                sql += f" LIMIT {int(limit)}"
+            rows = self._conn.execute(sql, params).fetchall()
+
+        documents = []
+        for row in rows:
+            data = self._load(row["data"], fields)
+            data.setdefault("id", row["id"])
+            documents.append(data)
+        return documents
+
+    async def get(self, collection: str, doc_id: str, fields: Optional[List[str]] = None) -> Optional[dict]:
+        return await asyncio.to_thread(self._get, collection, doc_id, fields)
+
+    async def get_many(self, collection: str, doc_ids: Iterable[str],
+                       fields: Optional[List[str]] = None) -> Dict[str, dict]:
+        return await asyncio.to_thread(self._get_many, collection, list(doc_ids), fields)
+
+    async def set(self, collection: str, doc_id: str, data: dict, merge: bool = False):
+        await asyncio.to_thread(self._set, collection, doc_id, data, merge)
+
+    async def update(self, collection: str, doc_id: str, data: dict):
+        await asyncio.to_thread(self._update_many, collection, [(doc_id, data)])
+
+    async def update_many(self, collection: str, updates: List[Tuple[str, dict]]):
+        await asyncio.to_thread(self._update_many, collection, updates)
+
+    async def transaction(self, reads: List[Tuple[str, str]],
+                          apply: Callable[[List[Optional[dict]]], Tuple[List[Write], List[Write]]]):
+        await asyncio.to_thread(self._transaction, reads, apply)
+
+    async def query(self, collection: str, filters: Optional[dict] = None, order_by: Optional[str] = None,
+                    limit: Optional[int] = None, start_after: Optional[str] = None,
+                    fields: Optional[List[str]] = None) -> AsyncIterator[dict]:
+        documents = await asyncio.to_thread(self._query, collection, filters, order_by, limit, start_after, fields)
+
+        async def iterate():
+            for document in documents:
+                yield document
+        return iterate()
+
+    def watch(self, collection: str, filters: dict, callback: Callable[[dict], None],
+              fields: Optional[List[str]] = None, poll_seconds: float = 2.0) -> Callable[[], None]:
+        """
+        Poll the documents matching filters and call callback(document) for
+        every one whose fields changed since the previous poll. Returns a
+        function that stops polling.
+        """
+        async def poll():
+            seen = None
+            while True:
+                try:
+                    documents = await asyncio.to_thread(self._query, collection, filters, None, None, None, fields)
+                    current = {document["id"]: document for document in documents}
+                    if seen is not None:
+                        for doc_id, document in current.items():
+                            if seen.get(doc_id) != document:
+                                callback(document)
+                    seen = current
+                except Exception as e:
+                    log_event("watch_poll_failed", level="error", collection=collection, error=str(e))
+                await asyncio.sleep(poll_seconds)
+
+        task = asyncio.create_task(poll())
+        return task.cancel
+
+
+class GCSBlobStore:
+    """Uploaded PDFs and stored content in a Cloud Storage bucket.
+
+    The Storage client is synchronous, so transfers run in a bounded thread pool.
+    """
+
+    def __init__(self, bucket: Callable[[], Any], max_workers: int = 4):
+        # Accessor for the bucket, created on first use
+        self._bucket = bucket
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage-upload")
+
+    async def upload(self, file_path: str, destination: str):
+        blob = self.bucket.blob(destination)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, blob.upload_from_filename, file_path)
+
+    def _upload_bytes(self, data: bytes, destination: str, if_absent: bool) -> bool:
+        from google.api_core.exceptions import PreconditionFailed
+
+        blob = self.bucket.blob(destination)
+        try:
+            # Generation 0 only matches a missing object, so existing content is not rewritten
+            blob.upload_from_string(data, if_generation_match=0 if if_absent else None)
+        except PreconditionFailed:
+            return False
+        return True
+
+    async def upload_bytes(self, data: bytes, destination: str, if_absent: bool = False) -> bool:
+        """Write bytes to destination; returns False when if_absent and the object already exists."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._upload_bytes, data, destination, if_absent)
+
+    def _download_bytes(self, destination: str) -> Optional[bytes]:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            return self.bucket.blob(destination).download_as_bytes()
+        except NotFound:
+            return None
+
+    async def download_bytes(self, destination: str) -> Optional[bytes]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._download_bytes, destination)
+
+    def _download(self, destination: str, file_path: str) -> bool:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.bucket.blob(destination).download_to_filename(file_path)
+        except NotFound:
+            if os.path.exists(file_path):
+                os.unlink(file_path)
+            return False
+        return True
+
+    async def download(self, destination: str, file_path: str) -> bool:
+        """Stream an object to a local file; returns False when it does not exist."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._download, destination, file_path)
+
+    async def size(self, destination: str) -> Optional[int]:
+        """Size of an object in bytes, or None when it does not exist."""
+        loop = asyncio.get_running_loop()
+        blob = await loop.run_in_executor(self.executor, self.bucket.get_blob, destination)
+        return blob.size if blob is not None else None
+
+    def _delete(self, destination: str):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.bucket.blob(destination).delete()
+        except NotFound:
+            pass
+
+    async def delete(self, destination: str):
+        """Remove an object; a missing object is not an error."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self._delete, destination)
+
+    def signed_upload_url(self, destination: str, content_type: str, max_bytes: int,
+                          expires_seconds: int) -> Tuple[str, dict]:
+        """
+        V4 signed URL for a client to PUT an object directly into the bucket,
+        and the headers the request must carry. Storage rejects bodies larger
+        than max_bytes through the signed content-length-range header.
+        """
+        headers = {"Content-Type": content_type, "x-goog-content-length-range": f"0,{max_bytes}"}
+        url = self.bucket.blob(destination).generate_signed_url(
+            version="v4", expiration=timedelta(seconds=expires_seconds), method="PUT",
+            content_type=content_type, headers={"x-goog-content-length-range": headers["x-goog-content-length-range"]}
+        )
+        return url, headers
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    @property
+    def bucket(self):
+        return self._bucket()
+
+
+class LocalBlobStore:
+    """Uploaded PDFs and stored content in a local directory, keyed by their storage path.
+
+    Direct uploads get HMAC-signed URLs for the app's own /local-uploads route,
+    standing in for Cloud Storage signed URLs.
+    """
+
+    def __init__(self, directory: str, upload_secret: Optional[str] = None):
+        self.directory = directory
+        self.upload_secret = (upload_secret or os.urandom(32).hex()).encode("utf-8")
+        os.makedirs(directory, exist_ok=True)
+
+    def _copy(self, file_path: str, destination: str):
+        target = os.path.join(self.directory, destination)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(file_path, target)
+
+    async def upload(self, file_path: str, destination: str):
+        await asyncio.to_thread(self._copy, file_path, destination)
+
+    def _write_bytes(self, data: bytes, destination: str, if_absent: bool) -> bool:
+        target = os.path.join(self.directory, destination)
+        if if_absent and os.path.exists(target):
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Write then rename so readers never see a partial file
+        partial = f"{target}.{threading.get_ident()}.tmp"
+        with open(partial, "wb") as f:
+            f.write(data)
+        os.replace(partial, target)
+        return True
+
+    async def upload_bytes(self, data: bytes, destination: str, if_absent: bool = False) -> bool:
+        return await asyncio.to_thread(self._write_bytes, data, destination, if_absent)
+
+    def _read_bytes(self, destination: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.directory, destination), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    async def download_bytes(self, destination: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read_bytes, destination)
+
+    def _download(self, destination: str, file_path: str) -> bool:
+        try:
+            shutil.copyfile(os.path.join(self.directory, destination), file_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    async def download(self, destination: str, file_path: str) -> bool:
+        return await asyncio.to_thread(self._download, destination, file_path)
+
+    async def size(self, destination: str) -> Optional[int]:
+        try:
+            return (await asyncio.to_thread(os.stat, os.path.join(self.directory, destination))).st_size
+        except FileNotFoundError:
+            return None
+
+    def _delete(self, destination: str):
+        try:
+            os.unlink(os.path.join(self.directory, destination))
+        except FileNotFoundError:
+            pass
+
+    async def delete(self, destination: str):
+        await asyncio.to_thread(self._delete, destination)
+
+    def _upload_signature(self, destination: str, expires: int, max_bytes: int) -> str:
+        message = f"{destination}:{expires}:{max_bytes}".encode("utf-8")
+        return hmac.new(self.upload_secret, message, hashlib.sha256).hexdigest()
+
+    def signed_upload_url(self, destination: str, content_type: str, max_bytes: int,
+                          expires_seconds: int) -> Tuple[str, dict]:
+        expires = int(time.time()) + expires_seconds
+        signature = self._upload_signature(destination, expires, max_bytes)
+        url = f"/local-uploads/{destination}?expires={expires}&max_bytes={max_bytes}&signature={signature}"
+        return url, {"Content-Type": content_type}
+
+    def verify_upload(self, destination: str, expires: int, max_bytes: int, signature: str) -> bool:
+        """Whether a /local-uploads request carries a valid, unexpired signature."""
+        expected = self._upload_signature(destination, expires, max_bytes)
+        return expires >= time.time() and hmac.compare_digest(expected, signature)
+
+    def close(self):
+        pass
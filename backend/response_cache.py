@@ -0,0 +1,125 @@
+"""Short-lived cache of rendered JSON responses, with conditional GET support.
+
+Read-heavy endpoints render their JSON once and keep it, together with its
+entity tag and last modification time, for a few seconds. Entries carry tags
+(e.g. "submission:<id>") so writes can drop exactly the responses they make
+stale. Clients that send If-None-Match or If-Modified-Since get a 304
+without the body.
+"""
+import json
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from cachetools import TTLCache
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    last_modified: Optional[datetime]
+
+    @classmethod
+    def render(cls, content: Any, last_modified: Optional[datetime] = None) -> "CachedResponse":
+        body = json.dumps(jsonable_encoder(content), separators=(",", ":")).encode("utf-8")
+        # The tag is a digest of the representation, so it also changes with joined data
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        if last_modified is not None and last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return cls(body, etag, last_modified)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    candidates = {candidate.strip().removeprefix("W/") for candidate in header.split(",")}
+    return etag in candidates
+
+
+def is_not_modified(request: Request, cached: CachedResponse) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, cached.etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and cached.last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have whole seconds
+        return cached.last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def conditional_response(request: Request, cached: CachedResponse) -> Response:
+    """200 with the cached body, or 304 when the client's copy is current."""
+    headers = {"ETag": cached.etag, "Cache-Control": "private, no-cache"}
+    if cached.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(cached.last_modified.astimezone(timezone.utc), usegmt=True)
+    if is_not_modified(request, cached):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    """TTL cache of rendered responses, invalidated by tag."""
+
+    def __init__(self, maxsize: int = 2048, ttl_seconds: float = 10):
+        self.enabled = ttl_seconds > 0 and maxsize > 0
+        self._entries: TTLCache = TTLCache(maxsize=max(maxsize, 1), ttl=max(ttl_seconds, 0.001))
+        self._keys_by_tag: Dict[str, Set[str]] = {}
+        # Bumped by every invalidation; a response built while its tags changed is not stored
+        self._versions: TTLCache = TTLCache(maxsize=max(maxsize, 1) * 16, ttl=max(ttl_seconds * 4, 60))
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key) if self.enabled else None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def versions(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def set(self, key: str, response: CachedResponse, tags: Tuple[str, ...], versions: Tuple[int, ...]):
+        if not self.enabled or self.versions(tags) != versions:
+            return
+        self._entries[key] = (response, tags)
+        for tag in tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+        if len(self._keys_by_tag) > self._entries.maxsize * 4:
+            self._prune_tags()
+
+    def invalidate(self, *tags: str):
+        for tag in tags:
+            self._versions[tag] = self._versions.get(tag, 0) + 1
+            for key in self._keys_by_tag.pop(tag, ()):
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def _prune_tags(self):
+        # Expired and evicted entries leave their keys behind in the tag index
+        live = set(self._entries.keys())
+        self._keys_by_tag = {
+            tag: keys & live for tag, keys in self._keys_by_tag.items() if keys & live
+        }
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
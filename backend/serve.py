@@ -0,0 +1,40 @@
+"""Production entry point for the API.
+
+Run with `python serve.py`: uvicorn with WEB_CONCURRENCY worker processes and
+no auto-reload (use `uvicorn backend:app --reload` while developing). For the
+smallest API processes, set RUN_EMBEDDED_WORKER=false and run the jobs in
+`python worker.py`; the API then never loads the OCR and Gemini libraries.
+
+WEB_CONCURRENCY defaults to 1 while the job workers are embedded. With more
+processes, each one only sees its own in-process events, so the shared status
+listener is turned on and STORAGE_BACKEND=local needs a LOCAL_UPLOAD_SECRET
+every process signs direct upload URLs with.
+"""
+import os
+import sys
+
+import uvicorn
+
+
+def main():
+    embedded_worker = os.getenv("RUN_EMBEDDED_WORKER", "true").lower() == "true"
+    workers = int(os.getenv("WEB_CONCURRENCY", "1" if embedded_worker else "2"))
+    if workers > 1:
+        # Read by every worker process when it imports the app
+        os.environ.setdefault("STATUS_EVENTS_LISTENER", "true")
+        if os.getenv("STORAGE_BACKEND", "firestore") == "local" and not os.getenv("LOCAL_UPLOAD_SECRET"):
+            sys.exit("LOCAL_UPLOAD_SECRET must be set when WEB_CONCURRENCY is more than 1")
+
+    uvicorn.run(
+        "backend:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        reload=False,
+        # Lets running requests (and the embedded job workers) finish on redeploys
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "30"))
+    )
+
+
+if __name__ == "__main__":
+    main()
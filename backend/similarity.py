@@ -0,0 +1,188 @@
+"""Near-duplicate detection between the submissions of an assignment.
+
+Each submission's extracted markdown is cut into overlapping word shingles
+(minus those that also occur in the assignment text, which every answer may
+quote) and summarised as a MinHash signature, stored on the submission
+document. Signatures are grouped into LSH bands, so inserting a submission
+only compares it with the few submissions sharing a band bucket instead of
+all of them. The per-assignment index lives in memory and is rebuilt from the
+stored signatures when a process first needs it.
+"""
+import re
+import time
+import random
+import hashlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 128
+# 32 bands of 4 rows: pairs with a Jaccard similarity around 0.42 and above
+# share a bucket with probability > 0.5, and pairs above 0.6 almost always do
+BANDS = 32
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+
+# Each "permutation" XORs the 63-bit shingle hashes with a random mask, which
+# keeps the minimum in C (map) and estimates Jaccard as well as (a*x+b) mod p
+# permutations on well-mixed hashes at a fraction of the cost. The seed is
+# fixed: stored signatures must stay comparable across processes and restarts.
+# 63 bits, because Firestore integers are signed 64-bit.
+_rng = random.Random(1)
+_MASKS = [_rng.getrandbits(63) for _ in range(NUM_PERMUTATIONS)]
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> Set[int]:
+    """63-bit hashes of the overlapping word n-grams of a text (markdown syntax and case ignored)."""
+    words = _WORD_PATTERN.findall(text.lower())
+    if not words:
+        return set()
+    if len(words) < size:
+        grams = [" ".join(words)]
+    else:
+        grams = (" ".join(words[index:index + size]) for index in range(len(words) - size + 1))
+    return {
+        int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "big") >> 1 for gram in grams
+    }
+
+
+def minhash(hashes: Iterable[int]) -> Optional[List[int]]:
+    """MinHash signature of a set of shingle hashes (None for an empty set)."""
+    values = list(hashes)
+    if not values:
+        return None
+    return [min(map(mask.__xor__, values)) for mask in _MASKS]
+
+
+def signature_for(submission_text: str, assignment_text: str = "") -> Optional[List[int]]:
+    """Signature of a submission, ignoring text copied from the assignment itself."""
+    return minhash(shingles(submission_text) - shingles(assignment_text))
+
+
+def estimated_similarity(first: List[int], second: List[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+def _band_keys(signature: List[int]) -> List[Tuple[int, int]]:
+    return [
+        (band, hash(tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])))
+        for band in range(BANDS)
+    ]
+
+
+class SimilarityIndex:
+    """LSH index of one assignment's signatures, keeping the similar pairs found so far."""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.signatures: Dict[str, List[int]] = {}
+        self.students: Dict[str, Optional[str]] = {}
+        self.buckets: Dict[Tuple[int, int], Set[str]] = {}
+        self.pairs: Dict[Tuple[str, str], float] = {}
+        self.loaded_at = time.monotonic()
+        self.comparisons = 0
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def add(self, submission_id: str, signature: List[int], student_id: Optional[str] = None):
+        """Insert (or replace) a submission; compares it only with its bucket neighbours."""
+        if submission_id in self.signatures:
+            self.remove(submission_id)
+        candidates = set()
+        for key in _band_keys(signature):
+            bucket = self.buckets.setdefault(key, set())
+            candidates.update(bucket)
+            bucket.add(submission_id)
+        self.signatures[submission_id] = signature
+        self.students[submission_id] = student_id
+
+        for other_id in candidates:
+            # Resubmissions by the same student are not plagiarism
+            if student_id is not None and self.students.get(other_id) == student_id:
+                continue
+            self.comparisons += 1
+            score = estimated_similarity(signature, self.signatures[other_id])
+            if score >= self.threshold:
+                self.pairs[tuple(sorted((submission_id, other_id)))] = score
+
+    def remove(self, submission_id: str):
+        signature = self.signatures.pop(submission_id, None)
+        self.students.pop(submission_id, None)
+        if signature is None:
+            return
+        for key in _band_keys(signature):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.discard(submission_id)
+                if not bucket:
+                    del self.buckets[key]
+        self.pairs = {pair: score for pair, score in self.pairs.items() if submission_id not in pair}
+
+    def similar_pairs(self, min_score: Optional[float] = None, limit: Optional[int] = None) -> List[dict]:
+        """Candidate pairs, most similar first."""
+        min_score = self.threshold if min_score is None else min_score
+        pairs = sorted(
+            ((score, pair) for pair, score in self.pairs.items() if score >= min_score),
+            key=lambda item: (-item[0], item[1])
+        )
+        return [
+            {
+                "submission_ids": list(pair),
+                "student_ids": [self.students.get(pair[0]), self.students.get(pair[1])],
+                "similarity": round(score, 3),
+            }
+            for score, pair in pairs[:limit]
+        ]
+
+
+class SimilarityIndexes:
+    """
+    Per-assignment indexes, loaded from the signatures stored on submissions.
+
+    Submissions written by other processes are picked up when an index older
+    than ttl_seconds is next read.
+    """
+
+    def __init__(self, repository, threshold: float = 0.5, ttl_seconds: float = 300, max_assignments: int = 64):
+        self.repository = repository
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_assignments = max_assignments
+        self._indexes: Dict[str, SimilarityIndex] = {}
+
+    async def load(self, assignment_id: str) -> SimilarityIndex:
+        index = SimilarityIndex(self.threshold)
+        async for submission in await self.repository.query(
+            'submissions', filters={'assignment_id': assignment_id}, fields=["minhash_signature", "student_id"]
+        ):
+            if submission.get("minhash_signature"):
+                index.add(submission["id"], submission["minhash_signature"], submission.get("student_id"))
+        return index
+
+    async def get(self, assignment_id: str) -> SimilarityIndex:
+        index = self._indexes.get(assignment_id)
+        if index is None or time.monotonic() - index.loaded_at > self.ttl_seconds:
+            index = await self.load(assignment_id)
+            self._indexes.pop(assignment_id, None)
+            while len(self._indexes) >= self.max_assignments:
+                # Drop the least recently loaded assignment
+                self._indexes.pop(next(iter(self._indexes)))
+            self._indexes[assignment_id] = index
+        return index
+
+    def add(self, assignment_id: str, submission_id: str, signature: Optional[List[int]],
+            student_id: Optional[str] = None):
+        """Insert a new submission into the assignment's index if this process has it loaded."""
+        index = self._indexes.get(assignment_id)
+        if index is not None and signature:
+            index.add(submission_id, signature, student_id)
+
+    def stats(self) -> dict:
+        return {
+            "assignments": len(self._indexes),
+            "submissions": sum(len(index) for index in self._indexes.values()),
+            "pairs": sum(len(index.pairs) for index in self._indexes.values()),
+            "comparisons": sum(index.comparisons for index in self._indexes.values()),
+        }
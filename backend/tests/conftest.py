@@ -0,0 +1,65 @@
+"""
+Test setup: the app runs on the local storage backend (SQLite and files in a
+temporary directory) with the job workers embedded, and never calls OCR or
+Gemini; tests that need them patch the functions on the backend module.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+WORK_DIR = tempfile.mkdtemp(prefix="eduassign-tests-")
+os.environ.update(
+    GEMINI_API_KEY="test",
+    STORAGE_BACKEND="local",
+    JOB_STORE="sqlite",
+    RUN_EMBEDDED_WORKER="true",
+    LOG_LEVEL="WARNING",
+    LOCAL_UPLOAD_SECRET="test",
+    LOCAL_DB_PATH=os.path.join(WORK_DIR, "local.db"),
+    LOCAL_BLOB_DIR=os.path.join(WORK_DIR, "blobs"),
+    JOB_DB_PATH=os.path.join(WORK_DIR, "jobs.db"),
+    UPLOAD_TEMP_DIR=os.path.join(WORK_DIR, "temp"),
+    EXTRACTION_CACHE_DIR=os.path.join(WORK_DIR, "cache", "extractions"),
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import make_pdf  # noqa: E402
+
+PDF = make_pdf(["Question 1", "Answer"])
+
+
+@pytest.fixture(scope="session")
+def backend():
+    import backend
+    return backend
+
+
+@pytest.fixture(autouse=True)
+def no_ocr(backend, monkeypatch):
+    """Extraction returns the file name as markdown instead of running OCR."""
+    async def extract_markdown_from_file(file_path, system_prompt, file_sha256=None):
+        return f"## Question 1\n{os.path.basename(file_path)}"
+
+    monkeypatch.setattr(backend, "extract_markdown_from_file", extract_markdown_from_file)
+
+
+@pytest.fixture
+def client(backend):
+    from fastapi.testclient import TestClient
+    with TestClient(backend.app) as client:
+        yield client
+
+
+@pytest.fixture
+def assignment(backend, client):
+    """An assignment document to submit against."""
+    assignment_id = f"assignment-{os.urandom(4).hex()}"
+    client.portal.call(backend.repository.set, "assignments", assignment_id, {
+        "id": assignment_id,
+        "title": "Test assignment",
+        "description": "",
+        "creator_id": "teacher",
+    })
+    return assignment_id
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+import analytics
+from analytics import ASSIGNMENT_ANALYTICS, STUDENT_ANALYTICS, record_evaluations
+from repository import SQLiteRepository
+
+
+def evaluation(marks: float, max_marks: float = 10) -> dict:
+    result = {
+        "overall_marks": marks,
+        "max_possible_marks": max_marks,
+        "question_evaluations": [{"question_reference": "Q1", "marks_awarded": marks, "max_marks": max_marks}],
+    }
+    return {"ai_processing_status": "completed", "evaluation_result": result}
+
+
+class FailingTransactions:
+    """A repository whose transactions fail, as under heavy contention."""
+
+    def __init__(self, repository):
+        self.repository = repository
+        self.transactions = 0
+
+    async def update_many(self, collection, updates):
+        await self.repository.update_many(collection, updates)
+
+    async def transaction(self, reads, apply):
+        self.transactions += 1
+        raise RuntimeError("too much contention")
+
+
+@pytest.fixture
+def repository(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "local.db"))
+    for submission_id in ("s1", "s2"):
+        asyncio.run(repository.set("submissions", submission_id, {"id": submission_id, "assignment_id": "a1"}))
+    return repository
+
+
+def test_evaluations_update_the_aggregates(repository):
+    asyncio.run(record_evaluations(repository, "a1", [("s1", "st1", evaluation(8)), ("s2", "st2", evaluation(4))]))
+
+    aggregate = asyncio.run(repository.get(ASSIGNMENT_ANALYTICS, "a1"))
+    assert aggregate["count"] == 2
+    assert aggregate["marks_sum"] == 12
+    assert asyncio.run(repository.get(STUDENT_ANALYTICS, "st1"))["marks_sum"] == 8
+    submission = asyncio.run(repository.get("submissions", "s1"))
+    assert submission["analytics_contribution"]["marks"] == 8
+    assert "analytics_pending" not in submission
+
+
+def test_reevaluation_replaces_the_contribution(repository):
+    asyncio.run(record_evaluations(repository, "a1", [("s1", "st1", evaluation(8))]))
+    asyncio.run(record_evaluations(repository, "a1", [("s1", "st1", evaluation(3))]))
+
+    aggregate = asyncio.run(repository.get(ASSIGNMENT_ANALYTICS, "a1"))
+    assert aggregate["count"] == 1
+    assert aggregate["marks_sum"] == 3
+
+
+def test_failed_aggregate_update_keeps_the_evaluation(repository, monkeypatch):
+    monkeypatch.setattr(analytics, "AGGREGATE_RETRY_BASE_SECONDS", 0)
+    failing = FailingTransactions(repository)
+
+    asyncio.run(record_evaluations(failing, "a1", [("s1", "st1", evaluation(8))]))
+
+    assert failing.transactions == analytics.AGGREGATE_UPDATE_ATTEMPTS
+    submission = asyncio.run(repository.get("submissions", "s1"))
+    assert submission["evaluation_result"]["overall_marks"] == 8
+    assert submission["analytics_pending"]["marks"] == 8
+    assert asyncio.run(repository.get(ASSIGNMENT_ANALYTICS, "a1")) is None
+
+    # The next evaluation of the submission brings the aggregate up to date
+    asyncio.run(record_evaluations(repository, "a1", [("s1", "st1", evaluation(6))]))
+    aggregate = asyncio.run(repository.get(ASSIGNMENT_ANALYTICS, "a1"))
+    assert aggregate["count"] == 1
+    assert aggregate["marks_sum"] == 6
+
+
+def test_pending_contribution_is_applied_once(repository):
+    asyncio.run(repository.update("submissions", "s1", {
+        "evaluation_result": evaluation(5)["evaluation_result"],
+        "analytics_pending": analytics.contribution(evaluation(5)["evaluation_result"]),
+    }))
+    evaluations = [("s1", "st1", evaluation(5))]
+
+    assert asyncio.run(analytics.update_aggregates(repository, "a1", evaluations))
+    assert asyncio.run(analytics.update_aggregates(repository, "a1", evaluations))
+
+    assert asyncio.run(repository.get(ASSIGNMENT_ANALYTICS, "a1"))["count"] == 1
+
+
+def test_missing_submission_fails_the_write(repository):
+    from repository import DocumentNotFound
+
+    with pytest.raises(DocumentNotFound):
+        asyncio.run(record_evaluations(repository, "a1", [("missing", "st1", evaluation(5))]))
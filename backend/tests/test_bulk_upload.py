@@ -0,0 +1,145 @@
+import io
+import os
+import json
+import time
+import zipfile
+
+import pytest
+
+from bulk_upload import ManifestEntry, match_entries, parse_manifest
+from conftest import PDF
+from jobs import _new_job
+
+
+def entries(*files):
+    return [ManifestEntry(file, f"student-{index}") for index, file in enumerate(files)]
+
+
+def matched_files(matched):
+    return {entry.file: member for entry, member in matched}
+
+
+def test_entries_match_by_path_and_by_unique_file_name():
+    matched, report = match_entries(["class/a.pdf", "b.pdf"], entries("class/a.pdf", "scans/b.pdf"))
+    assert matched_files(matched) == {"class/a.pdf": "class/a.pdf", "scans/b.pdf": "b.pdf"}
+    assert report == []
+
+
+def test_file_name_shared_by_several_members_is_missing():
+    matched, report = match_entries(["one/a.pdf", "two/a.pdf"], entries("a.pdf"))
+    assert matched == []
+    assert [row["status"] for row in report] == ["missing", "unlisted", "unlisted"]
+
+
+def test_two_entries_never_share_a_member():
+    matched, report = match_entries(["class/a.pdf"], entries("x/a.pdf", "y/a.pdf"))
+    assert matched == []
+    assert [(row["file"], row["status"]) for row in report] == [
+        ("x/a.pdf", "ambiguous"), ("y/a.pdf", "ambiguous"), ("class/a.pdf", "unlisted")
+    ]
+
+
+def test_path_match_wins_over_a_file_name_match():
+    matched, report = match_entries(["class/a.pdf"], entries("other/a.pdf", "class/a.pdf"))
+    assert matched_files(matched) == {"class/a.pdf": "class/a.pdf"}
+    assert [(row["file"], row["status"]) for row in report] == [("other/a.pdf", "ambiguous")]
+
+
+def test_unlisted_pdfs_are_reported():
+    matched, report = match_entries(["a.pdf", "notes.txt", "extra.pdf"], entries("a.pdf"))
+    assert matched_files(matched) == {"a.pdf": "a.pdf"}
+    assert report == [{"file": "extra.pdf", "status": "unlisted", "error": "File is not listed in the manifest"}]
+
+
+def test_manifest_rejects_files_listed_twice():
+    with pytest.raises(ValueError):
+        parse_manifest('[{"file": "a.pdf", "student_id": "1"}, {"file": "a.pdf", "student_id": "2"}]')
+
+
+def upload_batch(client, assignment_id, members: dict, manifest: list, auto_evaluate=False) -> dict:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    response = client.post(f"/assignments/{assignment_id}/submissions/bulk", data={
+        "manifest": json.dumps(manifest), "auto_evaluate": str(auto_evaluate).lower()
+    }, files={"file": ("class.zip", buffer.getvalue(), "application/zip")})
+    assert response.status_code == 200
+    return response.json()
+
+
+def wait_for_job(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_batch_reports_a_duplicate_pdf(client, assignment):
+    batch = upload_batch(client, assignment, {"a.pdf": PDF, "copy.pdf": PDF}, [
+        {"file": "a.pdf", "student_id": "student-1"}, {"file": "copy.pdf", "student_id": "student-1"}
+    ])
+    job = wait_for_job(client, batch["job_id"])
+
+    submissions = job["result"]["submissions"]
+    assert sorted(item["status"] for item in submissions) == ["duplicate", "processed"]
+    processed = next(item for item in submissions if item["status"] == "processed")
+    duplicate = next(item for item in submissions if item["status"] == "duplicate")
+    assert duplicate["duplicate_of"] == processed["submission_id"]
+    assert client.get(f"/submissions/{duplicate['submission_id']}").status_code == 404
+
+
+def test_failed_auto_evaluate_keeps_the_batch_going(backend, client, assignment, monkeypatch):
+    enqueue = backend.job_queue.enqueue
+
+    async def enqueue_without_evaluations(job_type, *args, **kwargs):
+        if job_type == "evaluate_submission":
+            raise RuntimeError("queue unavailable")
+        return await enqueue(job_type, *args, **kwargs)
+
+    monkeypatch.setattr(backend.job_queue, "enqueue", enqueue_without_evaluations)
+    batch = upload_batch(client, assignment, {"a.pdf": PDF + b"%a", "b.pdf": PDF + b"%b"}, [
+        {"file": "a.pdf", "student_id": "student-1"}, {"file": "b.pdf", "student_id": "student-2"}
+    ], auto_evaluate=True)
+    job = wait_for_job(client, batch["job_id"])
+
+    assert job["status"] == "succeeded"
+    assert job["result"]["done"] == 2
+    submissions = job["result"]["submissions"]
+    assert [item["status"] for item in submissions] == ["processed", "processed"]
+    assert all(item["evaluation_error"] == "queue unavailable" for item in submissions)
+    assert not [name for name in os.listdir(backend.UPLOAD_TEMP_DIR) if name.startswith("bulk_")]
+    # The archive staged for the job is gone from the blob store too
+    staged = os.path.join(backend.blob_store.directory, "bulk-uploads")
+    assert not os.path.exists(staged) or os.listdir(staged) == []
+
+
+def test_auto_evaluate_claims_each_submission_once(backend, client, assignment, monkeypatch):
+    enqueue = backend.job_queue.enqueue
+    evaluations = []
+
+    async def enqueue_held_evaluations(job_type, payload, priority=0, max_attempts=3, job_id=None):
+        if job_type != "evaluate_submission":
+            return await enqueue(job_type, payload, priority, max_attempts, job_id)
+        # Queued under a type no worker here picks up, so it stays in flight
+        evaluations.append(payload["submission_id"])
+        job = _new_job("evaluation_elsewhere", payload, priority, max_attempts, job_id)
+        await backend.job_queue.store.enqueue(job)
+        return job
+
+    monkeypatch.setattr(backend.job_queue, "enqueue", enqueue_held_evaluations)
+    batch = upload_batch(client, assignment, {"a.pdf": PDF + b"%claim"}, [
+        {"file": "a.pdf", "student_id": "student-1"}
+    ], auto_evaluate=True)
+    [item] = wait_for_job(client, batch["job_id"])["result"]["submissions"]
+
+    submission = client.portal.call(backend.repository.get, "submissions", item["submission_id"])
+    assert submission["ai_processing_status"] == "processing"
+    assert submission["evaluation_job_id"] == item["evaluation_job_id"]
+    # A retried batch reaching the submission again joins the queued evaluation
+    again = client.portal.call(backend.start_evaluation, assignment, item["submission_id"])
+    assert again == item["evaluation_job_id"]
+    assert evaluations == [item["submission_id"]]
@@ -0,0 +1,68 @@
+import gc
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from google.generativeai import caching
+import google.generativeai as genai
+
+from context_cache import EvaluationContextCache
+
+
+@pytest.fixture
+def created(monkeypatch):
+    """Cached contexts are created locally instead of through the Gemini API."""
+    contexts = []
+
+    def create(**options):
+        contexts.append(options)
+        return SimpleNamespace(**options)
+
+    monkeypatch.setattr(caching.CachedContent, "create", create)
+    monkeypatch.setattr(genai.GenerativeModel, "from_cached_content",
+                        classmethod(lambda cls, cached_content: ("model", cached_content.display_name)))
+    return contexts
+
+
+def make_cache(**options) -> EvaluationContextCache:
+    return EvaluationContextCache("gemini-1.5-flash-002", min_tokens=0, **options)
+
+
+def test_concurrent_requests_share_one_context(created):
+    cache = make_cache()
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_model("assignment-1", "context") for _ in range(5)))
+
+    models = asyncio.run(scenario())
+    assert models == [("model", "assignment-assignment-1")] * 5
+    assert (len(created), cache.created, cache.reused) == (1, 1, 4)
+
+
+def test_locks_do_not_outlive_their_requests(created):
+    cache = make_cache()
+
+    async def scenario():
+        for index in range(50):
+            await cache.get_model(f"assignment-{index}", "context")
+
+    asyncio.run(scenario())
+    gc.collect()
+    assert len(cache._locks) == 0
+
+
+def test_expired_contexts_and_failures_are_pruned(created, monkeypatch):
+    cache = make_cache(ttl_seconds=0, retry_after_failure_seconds=0)
+    create = caching.CachedContent.create
+
+    async def scenario():
+        await cache.get_model("assignment-1", "context")
+        monkeypatch.setattr(caching.CachedContent, "create", lambda **options: 1 / 0)
+        assert await cache.get_model("assignment-2", "context") is None
+        monkeypatch.setattr(caching.CachedContent, "create", create)
+        # The next request prunes the expired context and the lapsed failure
+        await cache.get_model("assignment-3", "context")
+
+    asyncio.run(scenario())
+    assert list(cache._contexts) == [cache._key("assignment-3", "context")]
+    assert cache._unavailable_until == {}
@@ -0,0 +1,115 @@
+import time
+from urllib.parse import urlsplit
+
+from conftest import PDF
+
+
+def upload_url(client, assignment_id, student_id="student-1"):
+    response = client.post("/submissions/upload-url", data={
+        "assignment_id": assignment_id, "student_id": student_id, "student_name": "Student"
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+def put(client, session, content):
+    url = urlsplit(session["upload_url"])
+    return client.put(f"{url.path}?{url.query}", content=content, headers=session["headers"])
+
+
+def wait_for_status(client, submission_id, statuses, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get(f"/submissions/{submission_id}")
+        if response.status_code == 200 and response.json()["status"] in statuses:
+            return response.json()
+        time.sleep(0.05)
+    raise AssertionError(f"submission {submission_id} never reached {statuses}")
+
+
+def test_upload_complete_before_put_is_rejected(client, assignment):
+    session = upload_url(client, assignment)
+    assert client.post(f"/submissions/{session['submission_id']}/upload-complete").status_code == 409
+
+
+def test_bad_signature_is_rejected(client, assignment):
+    session = upload_url(client, assignment)
+    session["upload_url"] = session["upload_url"].replace("signature=", "signature=0")
+    assert put(client, session, PDF).status_code == 403
+
+
+def test_failed_direct_upload_keeps_submission_fields(client, assignment):
+    session = upload_url(client, assignment, student_id="student-2")
+    assert put(client, session, b"not a pdf").status_code == 200
+    assert client.post(f"/submissions/{session['submission_id']}/upload-complete").status_code == 200
+
+    submission = wait_for_status(client, session["submission_id"], {"error"})
+    assert submission["assignment_id"] == assignment
+    assert submission["student_id"] == "student-2"
+    assert submission["student_name"] == "Student"
+    assert submission["submitted_at"]
+    assert submission["error_message"]
+    listed = client.get(f"/assignments/{assignment}/submissions").json()
+    assert session["submission_id"] in [item["id"] for item in listed]
+
+
+def test_repeated_notifications_return_the_queued_job(client, assignment):
+    session = upload_url(client, assignment, student_id="student-3")
+    put(client, session, PDF)
+    first = client.post(f"/submissions/{session['submission_id']}/upload-complete").json()
+    second = client.post(f"/submissions/{session['submission_id']}/upload-complete").json()
+    assert first["job_id"] is not None
+    assert second["job_id"] == first["job_id"]
+
+
+def test_failed_enqueue_hands_the_session_back(backend, client, assignment, monkeypatch):
+    session = upload_url(client, assignment, student_id="student-4")
+    put(client, session, PDF)
+    enqueue = backend.job_queue.enqueue
+
+    async def failing_enqueue(*args, **kwargs):
+        raise RuntimeError("queue unavailable")
+
+    monkeypatch.setattr(backend.job_queue, "enqueue", failing_enqueue)
+    assert client.post(f"/submissions/{session['submission_id']}/upload-complete").status_code == 500
+
+    monkeypatch.setattr(backend.job_queue, "enqueue", enqueue)
+    retried = client.post(f"/submissions/{session['submission_id']}/upload-complete").json()
+    assert retried["job_id"] is not None
+    assert client.get(f"/jobs/{retried['job_id']}").status_code == 200
+
+
+def wait_for_job(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_invalid_pdf_is_not_retried(client, assignment):
+    session = upload_url(client, assignment, student_id="student-5")
+    put(client, session, b"not a pdf")
+    job_id = client.post(f"/submissions/{session['submission_id']}/upload-complete").json()["job_id"]
+
+    job = wait_for_job(client, job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 1
+
+
+def test_direct_upload_of_the_same_pdf_is_a_duplicate(client, assignment):
+    first = upload_url(client, assignment, student_id="student-6")
+    put(client, first, PDF + b"%direct")
+    first_job = client.post(f"/submissions/{first['submission_id']}/upload-complete").json()["job_id"]
+    wait_for_status(client, first["submission_id"], {"processed"})
+
+    second = upload_url(client, assignment, student_id="student-6")
+    put(client, second, PDF + b"%direct")
+    job_id = client.post(f"/submissions/{second['submission_id']}/upload-complete").json()["job_id"]
+
+    assert wait_for_job(client, job_id)["result"] == {"status": "duplicate", "submission_id": first["submission_id"]}
+    assert client.get(f"/submissions/{second['submission_id']}").status_code == 404
+    again = client.post(f"/submissions/{second['submission_id']}/upload-complete").json()
+    assert again == {"submission_id": first["submission_id"], "status": "duplicate", "job_id": first_job}
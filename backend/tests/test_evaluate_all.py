@@ -0,0 +1,89 @@
+import time
+from datetime import datetime
+
+import pytest
+
+RESULT = {
+    "question_evaluations": [{"question_reference": "Q1", "marks_awarded": 3, "max_marks": 5, "feedback": []}],
+    "overall_feedback": "Fine", "overall_marks": 3, "max_possible_marks": 5,
+}
+
+
+@pytest.fixture
+def submissions(backend, client, assignment):
+    ids = [f"{assignment}-{index}" for index in range(5)]
+    for submission_id in ids:
+        client.portal.call(backend.repository.set, "submissions", submission_id, {
+            "id": submission_id, "assignment_id": assignment, "student_id": submission_id,
+            "submitted_at": datetime.now(), "status": "processed", "ai_processing_status": "pending",
+            "extracted_content": "## Question 1\nAnswer",
+        })
+    return ids
+
+
+@pytest.fixture(autouse=True)
+def small_batches(backend, monkeypatch):
+    async def generate_evaluation(assignment_id, assignment_content, submission_content):
+        return RESULT
+
+    monkeypatch.setattr(backend, "generate_evaluation", generate_evaluation)
+    monkeypatch.setattr(backend, "EVALUATE_ALL_BATCH_SIZE", 2)
+
+
+def evaluate_all(client, assignment_id, timeout=10):
+    job_id = client.post(f"/assignments/{assignment_id}/evaluate-all").json()["job_id"]
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def statuses(backend, client, ids):
+    return [client.portal.call(backend.repository.get, "submissions", submission_id)["ai_processing_status"]
+            for submission_id in ids]
+
+
+def test_failed_batch_write_is_retried(backend, client, assignment, submissions, monkeypatch):
+    record_evaluations = backend.record_evaluations
+    failures = []
+
+    async def failing_once(*args):
+        if not failures:
+            failures.append(1)
+            raise ConnectionError("datastore unavailable")
+        await record_evaluations(*args)
+
+    monkeypatch.setattr(backend, "record_evaluations", failing_once)
+    job = evaluate_all(client, assignment)
+
+    assert job["status"] == "succeeded"
+    assert (job["result"]["done"], job["result"]["failed"]) == (5, 0)
+    assert statuses(backend, client, submissions) == ["completed"] * 5
+
+
+def test_unwritable_batch_is_written_per_submission(backend, client, assignment, submissions, monkeypatch):
+    record_evaluations = backend.record_evaluations
+
+    async def single_writes_only(repository, assignment_id, evaluations):
+        if len(evaluations) > 1:
+            raise ValueError("batch too large")
+        await record_evaluations(repository, assignment_id, evaluations)
+
+    monkeypatch.setattr(backend, "record_evaluations", single_writes_only)
+    evaluate_all(client, assignment)
+
+    assert statuses(backend, client, submissions) == ["completed"] * 5
+
+
+def test_submissions_are_released_when_results_cannot_be_written(backend, client, assignment, submissions,
+                                                                 monkeypatch):
+    async def never(*args):
+        raise ConnectionError("datastore unavailable")
+
+    monkeypatch.setattr(backend, "record_evaluations", never)
+    evaluate_all(client, assignment)
+
+    assert statuses(backend, client, submissions) == ["failed"] * 5
@@ -0,0 +1,98 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from evaluation_schema import (
+    OVERALL_FEEDBACK_SCHEMA, QUESTION_EVALUATIONS_SCHEMA, evaluation_parse_stats, parse_response, repair_json
+)
+
+
+def question(reference, marks_awarded, max_marks=5):
+    return {"question_reference": reference, "marks_awarded": marks_awarded, "max_marks": max_marks,
+            "feedback": [{"category_id": 1, "text": "ok"}]}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"overall_marks": 3, "question_evaluations": [{"question_reference": "Q1"',
+     {"overall_marks": 3, "question_evaluations": [{"question_reference": "Q1"}]}),
+    ('{"overall_feedback": "Good wo', {"overall_feedback": "Good wo"}),
+    ('{"overall_marks": 3, "overall_feedback":', {"overall_marks": 3}),
+    ('[1, 2, ', [1, 2]),
+])
+def test_truncated_json_is_closed(text, expected):
+    assert repair_json(text) == expected
+
+
+def test_trailing_commas_are_dropped():
+    assert repair_json('{"marks": [1, 2,], "total": 3,}') == {"marks": [1, 2], "total": 3}
+
+
+@pytest.mark.parametrize("text", [
+    '```json\n{"overall_marks": 3}\n```',
+    '```\n{"overall_marks": 3}\n```',
+    'Here is the evaluation:\n{"overall_marks": 3}\nLet me know if you need more.',
+])
+def test_fences_and_prose_are_removed(text):
+    assert repair_json(text) == {"overall_marks": 3}
+
+
+def test_text_without_json_is_not_repaired():
+    assert repair_json("I cannot evaluate this submission.") is None
+
+
+def test_parse_response_reports_repairs():
+    before = dict(evaluation_parse_stats)
+    assert parse_response('{"overall_marks": 3}') == ({"overall_marks": 3}, False)
+    assert parse_response('```json\n{"overall_marks": 3,}\n```') == ({"overall_marks": 3}, True)
+    assert parse_response("no json") == (None, False)
+    counted = {key: evaluation_parse_stats[key] - before[key] for key in ("responses", "repaired", "parse_failures")}
+    assert counted == {"responses": 3, "repaired": 1, "parse_failures": 1}
+
+
+def scripted_llm(backend, monkeypatch, *responses):
+    """Answer the evaluation requests in order, recording each (contents, schema)."""
+    requests = []
+    replies = iter(responses)
+
+    async def ask_json(model, contents, schema):
+        requests.append((contents, schema))
+        return SimpleNamespace(text=next(replies))
+
+    monkeypatch.setattr(backend, "ask_json", ask_json)
+    monkeypatch.setattr(backend.evaluation_llm, "model", lambda model_name: None)
+    return requests
+
+
+def evaluate(backend):
+    return asyncio.run(backend.generate_full_evaluation("assignment-1", "## Question 1\nQ", "## Question 1\nA"))
+
+
+def test_invalid_question_is_asked_for_again(backend, monkeypatch):
+    requests = scripted_llm(backend, monkeypatch, json.dumps({
+        "question_evaluations": [question("Q1", 4), question("Q2", -1)],
+        "overall_feedback": "Solid work", "overall_marks": 3, "max_possible_marks": 10,
+    }), json.dumps([question("Q2", 2)]))
+
+    result = evaluate(backend)
+
+    assert [item["marks_awarded"] for item in result["question_evaluations"]] == [4, 2]
+    assert result["overall_feedback"] == "Solid work"
+    # Only the failing question is asked for again, with its validation problem
+    contents, schema = requests[1]
+    reask = contents[len(requests[0][0]):]
+    assert schema == QUESTION_EVALUATIONS_SCHEMA
+    assert '"Q2"' in reask and '"Q1"' not in reask
+    assert "marks_awarded" in reask
+
+
+def test_missing_overall_feedback_is_asked_for_again(backend, monkeypatch):
+    requests = scripted_llm(backend, monkeypatch, json.dumps({
+        "question_evaluations": [question("Q1", 4)], "overall_marks": 4, "max_possible_marks": 5,
+    }), '{"overall_feedback": "Well argued"}')
+
+    result = evaluate(backend)
+
+    assert result["overall_feedback"] == "Well argued"
+    assert requests[1][1] == OVERALL_FEEDBACK_SCHEMA
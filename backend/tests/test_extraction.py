@@ -0,0 +1,88 @@
+import pytest
+
+from benchmarks.fakes import make_pdf
+from extraction import NativePage, extract_native_pages, extraction_stats, plan_extraction, score_text_quality
+
+PROSE = (
+    "Question 1. Explain how photosynthesis converts light energy into chemical energy.\n"
+    "The light reactions split water and produce ATP and NADPH, which the Calvin cycle uses to fix carbon."
+)
+THRESHOLDS = {"min_quality": 0.6, "min_chars": 40, "min_chars_with_images": 500}
+
+
+def plan(pages):
+    return plan_extraction(pages, **THRESHOLDS)
+
+
+def counted(keys, action):
+    before = {key: extraction_stats[key] for key in keys}
+    result = action()
+    return result, {key: extraction_stats[key] - before[key] for key in keys}
+
+
+def test_clean_prose_scores_high():
+    assert score_text_quality(PROSE) > 0.9
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "   \n\t ",
+    "(cid:12)(cid:7)(cid:44) (cid:3)(cid:19) (cid:88)(cid:5)",
+    "��� �� ����",
+    "1 2 3 4 5 6 7 8 9 10 11 12 13 14 15 16 17 18 19 20",
+])
+def test_unusable_text_layers_score_low(text):
+    assert score_text_quality(text) < 0.6
+
+
+def test_text_layer_document_skips_ocr():
+    pages = [NativePage(1, PROSE, False), NativePage(2, PROSE + "\n\n\n\nSee above.", False)]
+    (native, ocr), stats = counted(["native_documents", "native_pages"], lambda: plan(pages))
+    assert ocr == []
+    assert native[2] == PROSE + "\n\nSee above."
+    assert stats == {"native_documents": 1, "native_pages": 2}
+
+
+def test_scanned_document_goes_to_ocr():
+    pages = [NativePage(1, "", True), NativePage(2, "Page 2", True)]
+    (native, ocr), stats = counted(["ocr_documents", "ocr_pages"], lambda: plan(pages))
+    assert (native, ocr) == ({}, [1, 2])
+    assert stats == {"ocr_documents": 1, "ocr_pages": 2}
+
+
+def test_unparseable_pdf_is_ocred_whole():
+    (native, ocr), stats = counted(["ocr_documents"], lambda: plan(None))
+    assert (native, ocr) == ({}, None)
+    assert stats == {"ocr_documents": 1}
+
+
+def test_mixed_document_ocrs_only_the_weak_pages():
+    pages = [
+        NativePage(1, PROSE, False),
+        NativePage(2, "(cid:12)(cid:7) (cid:44)(cid:3) (cid:19)(cid:88) (cid:5)(cid:9) (cid:1)", False),
+        NativePage(3, PROSE, True),  # short caption over a scanned image
+        NativePage(4, PROSE * 4, True),  # typed page with a figure
+    ]
+    (native, ocr), stats = counted(["mixed_documents"], lambda: plan(pages))
+    assert sorted(native) == [1, 4]
+    assert ocr == [2, 3]
+    assert stats == {"mixed_documents": 1}
+
+
+def test_native_pages_come_from_the_pdf_text_layer(tmp_path):
+    path = tmp_path / "answers.pdf"
+    path.write_bytes(make_pdf([PROSE, None]))
+
+    pages = extract_native_pages(str(path))
+
+    assert [page.number for page in pages] == [1, 2]
+    assert "photosynthesis" in pages[0].text
+    assert pages[1].text.strip() == ""
+    native, ocr = plan(pages)
+    assert (sorted(native), ocr) == ([1], [2])
+
+
+def test_unreadable_file_has_no_native_pages(tmp_path):
+    path = tmp_path / "broken.pdf"
+    path.write_bytes(b"%PDF-1.4\nnot really a pdf")
+    assert extract_native_pages(str(path)) is None
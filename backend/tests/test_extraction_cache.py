@@ -0,0 +1,95 @@
+import os
+import asyncio
+
+from extraction_cache import DiskCacheTier, ExtractionCache, make_cache_key
+
+
+def test_least_recently_used_entries_are_evicted_by_size(tmp_path):
+    tier = DiskCacheTier(str(tmp_path), max_bytes=30)
+    tier.set("a", "a" * 10)
+    tier.set("b", "b" * 10)
+    tier.set("c", "c" * 10)
+    # Reading "a" makes "b" the least recently used
+    assert tier.get("a") == "a" * 10
+    tier.set("d", "d" * 10)
+
+    assert tier.get("b") is None
+    assert not (tmp_path / "b.md").exists()
+    assert [tier.get(key) for key in "acd"] == ["a" * 10, "c" * 10, "d" * 10]
+    assert tier.stats() == {"entries": 3, "bytes": 30, "max_bytes": 30}
+
+
+def test_large_entry_evicts_as_many_as_needed(tmp_path):
+    tier = DiskCacheTier(str(tmp_path), max_bytes=30)
+    for key in "abc":
+        tier.set(key, key * 10)
+    tier.set("big", "x" * 25)
+    assert [tier.get(key) for key in "abc"] == [None, None, None]
+    assert tier.stats()["bytes"] == 25
+
+
+def test_rewriting_an_entry_replaces_its_size(tmp_path):
+    tier = DiskCacheTier(str(tmp_path), max_bytes=30)
+    tier.set("a", "a" * 10)
+    tier.set("a", "a" * 20)
+    assert tier.stats() == {"entries": 1, "bytes": 20, "max_bytes": 30}
+
+
+def test_oversize_entry_is_not_stored(tmp_path):
+    tier = DiskCacheTier(str(tmp_path), max_bytes=30)
+    tier.set("a", "a" * 10)
+    tier.set("huge", "x" * 31)
+    assert tier.get("huge") is None
+    assert not (tmp_path / "huge.md").exists()
+    # Nothing was evicted to make room for it
+    assert tier.get("a") == "a" * 10
+    # The limit counts bytes, not characters
+    tier.set("wide", "é" * 16)
+    assert tier.get("wide") is None
+
+
+def test_index_is_rebuilt_from_mtimes_on_restart(tmp_path):
+    tier = DiskCacheTier(str(tmp_path), max_bytes=30)
+    for key in "abc":
+        tier.set(key, key * 10)
+    # Last used order on disk: b, then c, then a
+    for age, key in ((300, "b"), (200, "c"), (100, "a")):
+        mtime = os.stat(tmp_path / f"{key}.md").st_mtime - age
+        os.utime(tmp_path / f"{key}.md", (mtime, mtime))
+    (tmp_path / "notes.txt").write_text("not a cache entry")
+
+    restarted = DiskCacheTier(str(tmp_path), max_bytes=30)
+    assert restarted.stats() == {"entries": 3, "bytes": 30, "max_bytes": 30}
+    restarted.set("d", "d" * 10)
+    assert restarted.get("b") is None
+    assert [restarted.get(key) for key in "cad"] == ["c" * 10, "a" * 10, "d" * 10]
+
+
+def test_entry_deleted_behind_the_cache_is_a_miss(tmp_path):
+    tier = DiskCacheTier(str(tmp_path), max_bytes=30)
+    tier.set("a", "a" * 10)
+    os.unlink(tmp_path / "a.md")
+    assert tier.get("a") is None
+    assert tier.stats()["bytes"] == 0
+
+
+class MemoryTier:
+    def __init__(self, entries=None):
+        self.entries = dict(entries or {})
+
+    async def get(self, key):
+        return self.entries.get(key)
+
+    async def set(self, key, content, model):
+        self.entries[key] = content
+
+
+def test_remote_hit_is_backfilled_to_disk(tmp_path):
+    key = make_cache_key("0" * 64, "prompt", "model")
+    remote = MemoryTier({key: "# Extracted"})
+    cache = ExtractionCache(DiskCacheTier(str(tmp_path), max_bytes=1024), remote)
+
+    assert asyncio.run(cache.get(key)) == "# Extracted"
+    remote.entries.clear()
+    assert asyncio.run(cache.get(key)) == "# Extracted"
+    assert (cache.remote_hits, cache.disk_hits, cache.misses) == (1, 1, 0)
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from conftest import PDF
+from idempotency import MAX_KEY_LENGTH, IdempotencyKeys
+from repository import SQLiteRepository
+
+
+@pytest.fixture
+def keys(tmp_path):
+    return IdempotencyKeys(SQLiteRepository(str(tmp_path / "local.db")), ttl_seconds=60, lock_seconds=60)
+
+
+def claim_error(keys, *args) -> int:
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(keys.claim(*args))
+    return error.value.status_code
+
+
+def test_completed_request_is_replayed(keys):
+    assert asyncio.run(keys.claim("create", "key-1", "request")) is None
+    asyncio.run(keys.complete("create", "key-1", {"id": "created"}))
+
+    assert asyncio.run(keys.claim("create", "key-1", "request")) == {"id": "created"}
+    assert keys.stats() == {"replayed": 1, "conflicts": 0}
+
+
+def test_key_reused_for_another_request_is_rejected(keys):
+    asyncio.run(keys.claim("create", "key-1", "request"))
+    asyncio.run(keys.complete("create", "key-1", {"id": "created"}))
+    assert claim_error(keys, "create", "key-1", "other request") == 422
+
+
+def test_request_in_progress_conflicts(keys):
+    asyncio.run(keys.claim("create", "key-1", "request"))
+    assert claim_error(keys, "create", "key-1", "request") == 409
+    assert keys.stats()["conflicts"] == 1
+
+
+def test_released_key_can_be_retried(keys):
+    asyncio.run(keys.claim("create", "key-1", "request"))
+    asyncio.run(keys.release("create", "key-1"))
+    assert asyncio.run(keys.claim("create", "key-1", "request")) is None
+
+
+def test_abandoned_claim_is_taken_over(keys):
+    keys.lock_seconds = 0
+    asyncio.run(keys.claim("create", "key-1", "request"))
+    assert asyncio.run(keys.claim("create", "key-1", "request")) is None
+
+
+def test_keys_are_scoped_per_endpoint(keys):
+    asyncio.run(keys.claim("create", "key-1", "request"))
+    asyncio.run(keys.complete("create", "key-1", {"id": "created"}))
+    assert asyncio.run(keys.claim("upload", "key-1", "request")) is None
+
+
+def test_expired_key_is_claimed_again(keys):
+    keys.ttl_seconds = 0
+    asyncio.run(keys.claim("create", "key-1", "request"))
+    asyncio.run(keys.complete("create", "key-1", {"id": "created"}))
+    assert asyncio.run(keys.claim("create", "key-1", "other request")) is None
+
+
+def test_overlong_key_is_rejected(keys):
+    assert claim_error(keys, "create", "k" * (MAX_KEY_LENGTH + 1), "request") == 400
+
+
+def test_endpoint_runs_the_handler_once_per_key(keys):
+    calls = []
+
+    @keys.endpoint("create", ["name"])
+    async def create(name: str, idempotency_key=None):
+        calls.append(name)
+        return {"id": len(calls), "name": name}
+
+    first = asyncio.run(create(name="a", idempotency_key="key-1"))
+    assert asyncio.run(create(name="a", idempotency_key="key-1")) == first
+    assert asyncio.run(create(name="a", idempotency_key=None)) == {"id": 2, "name": "a"}
+    assert calls == ["a", "a"]
+
+
+def test_failed_handler_releases_the_key(keys):
+    calls = []
+
+    @keys.endpoint("create", ["name"])
+    async def create(name: str, idempotency_key=None):
+        calls.append(name)
+        if len(calls) == 1:
+            raise HTTPException(status_code=503, detail="try again")
+        return {"name": name}
+
+    with pytest.raises(HTTPException):
+        asyncio.run(create(name="a", idempotency_key="key-1"))
+    assert asyncio.run(create(name="a", idempotency_key="key-1")) == {"name": "a"}
+
+
+def test_submission_retry_returns_the_first_response(client, assignment):
+    def submit(student_id, key):
+        return client.post("/submissions/", headers={"Idempotency-Key": key}, data={
+            "assignment_id": assignment, "student_id": student_id, "student_name": "Student"
+        }, files={"file": ("a.pdf", PDF + key.encode(), "application/pdf")})
+
+    first = submit("student-1", f"{assignment}-key")
+    assert first.status_code == 200
+    retry = submit("student-1", f"{assignment}-key")
+    assert retry.json() == first.json()
+    assert submit("student-2", f"{assignment}-key").status_code == 422
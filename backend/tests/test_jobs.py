@@ -0,0 +1,178 @@
+import time
+import asyncio
+
+from jobs import JobQueue, PermanentJobError, SQLiteJobStore, LEASE_EXPIRED_ERROR, QUEUED, RUNNING, SUCCEEDED, FAILED
+
+
+def make_queue(tmp_path, **options) -> JobQueue:
+    options = {"retry_base_seconds": 0.01, "retry_max_seconds": 0.05, "poll_interval": 0.01, **options}
+    return JobQueue(SQLiteJobStore(str(tmp_path / "jobs.db")), {"work": 1}, **options)
+
+
+async def wait_for(queue: JobQueue, job_id: str, statuses=(SUCCEEDED, FAILED), timeout: float = 5.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = await queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} never reached {statuses}")
+
+
+def test_failed_job_is_retried_until_it_succeeds(tmp_path):
+    calls = []
+
+    async def flaky(value):
+        calls.append(value)
+        if len(calls) < 3:
+            raise RuntimeError("temporary")
+        return {"value": value}
+
+    async def scenario():
+        queue = make_queue(tmp_path, max_attempts=3)
+        queue.register("flaky", "work", flaky)
+        queue.start()
+        try:
+            job = await queue.enqueue("flaky", {"value": 7})
+            return await wait_for(queue, job["id"])
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(scenario())
+    assert job["status"] == SUCCEEDED
+    assert job["attempts"] == 3
+    assert job["result"] == {"value": 7}
+    assert job["error"] is None
+
+
+def test_job_fails_after_max_attempts(tmp_path):
+    async def broken():
+        raise ValueError("bad input")
+
+    async def scenario():
+        queue = make_queue(tmp_path, max_attempts=2)
+        queue.register("broken", "work", broken)
+        queue.start()
+        try:
+            job = await queue.enqueue("broken", {})
+            return await wait_for(queue, job["id"])
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(scenario())
+    assert job["status"] == FAILED
+    assert job["attempts"] == 2
+    assert job["error"] == "ValueError: bad input"
+
+
+def test_permanent_error_is_not_retried(tmp_path):
+    async def missing():
+        raise PermanentJobError("Submission s1 not found")
+
+    async def scenario():
+        queue = make_queue(tmp_path, max_attempts=3)
+        queue.register("missing", "work", missing)
+        queue.start()
+        try:
+            job = await queue.enqueue("missing", {})
+            return await wait_for(queue, job["id"])
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(scenario())
+    assert job["status"] == FAILED
+    assert job["attempts"] == 1
+    assert job["error"] == "PermanentJobError: Submission s1 not found"
+
+
+def test_expired_lease_is_requeued(tmp_path):
+    async def scenario():
+        queue = make_queue(tmp_path)
+        queue.register("work", "work", lambda: None)
+        job = await queue.enqueue("work", {})
+        # A worker claims the job and dies without renewing its lease
+        claimed = await queue.store.claim(["work"], "dead-worker", lease_seconds=0.01)
+        assert claimed["status"] == RUNNING
+        await asyncio.sleep(0.02)
+        requeued = await queue.store.requeue_expired()
+        reclaimed = await queue.store.claim(["work"], "live-worker", lease_seconds=60)
+        return job, requeued, reclaimed
+
+    job, requeued, reclaimed = asyncio.run(scenario())
+    assert requeued == (1, 0)
+    assert reclaimed["id"] == job["id"]
+    assert reclaimed["attempts"] == 2
+    assert reclaimed["worker_id"] == "live-worker"
+
+
+def test_running_job_with_live_lease_is_not_requeued(tmp_path):
+    async def scenario():
+        queue = make_queue(tmp_path)
+        queue.register("work", "work", lambda: None)
+        await queue.enqueue("work", {})
+        await queue.store.claim(["work"], "worker", lease_seconds=60)
+        return await queue.store.requeue_expired()
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+def test_expired_lease_on_the_last_attempt_fails_the_job(tmp_path):
+    async def scenario():
+        queue = make_queue(tmp_path)
+        queue.register("work", "work", lambda: None)
+        job = await queue.enqueue("work", {}, max_attempts=1)
+        await queue.store.claim(["work"], "dead-worker", lease_seconds=0.01)
+        await asyncio.sleep(0.02)
+        reaped = await queue.store.requeue_expired()
+        return reaped, await queue.get(job["id"]), await queue.store.claim(["work"], "live-worker", lease_seconds=60)
+
+    reaped, job, reclaimed = asyncio.run(scenario())
+    assert reaped == (0, 1)
+    assert job["status"] == FAILED
+    assert job["error"] == LEASE_EXPIRED_ERROR
+    assert reclaimed is None
+
+
+def test_job_waiting_out_a_retry_does_not_block_ready_jobs(tmp_path):
+    async def scenario():
+        queue = make_queue(tmp_path)
+        queue.register("work", "work", lambda: None)
+        waiting = await queue.enqueue("work", {}, priority=10)
+        await queue.store.update(waiting["id"], {"status": QUEUED, "run_after": time.time() + 60})
+        ready = await queue.enqueue("work", {}, priority=0)
+        claimed = await queue.store.claim(["work"], "worker", lease_seconds=60)
+        return ready, claimed
+
+    ready, claimed = asyncio.run(scenario())
+    assert claimed["id"] == ready["id"]
+
+
+def test_worker_survives_a_failed_status_update(tmp_path):
+    async def broken():
+        raise ValueError("bad input")
+
+    async def succeed(n):
+        return {"n": n}
+
+    async def scenario():
+        queue = make_queue(tmp_path, max_attempts=1)
+        queue.register("broken", "work", broken)
+        queue.register("succeed", "work", succeed)
+        update = queue.store.update
+
+        async def update_failing_on_error(job_id, fields):
+            if fields.get("status") == FAILED:
+                raise ConnectionError("datastore unavailable")
+            await update(job_id, fields)
+
+        queue.store.update = update_failing_on_error
+        queue.start()
+        try:
+            await queue.enqueue("broken", {}, priority=1)
+            later = await queue.enqueue("succeed", {"n": 2})
+            return await wait_for(queue, later["id"])
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(scenario())
+    assert job["status"] == SUCCEEDED
@@ -0,0 +1,147 @@
+import time
+import asyncio
+
+import pytest
+
+from llm_gateway import AdaptiveConcurrencyLimiter, LLMGateway, TokenBucket, retry_after_seconds
+
+
+class Throttled(Exception):
+    status_code = 429
+
+
+def test_bucket_starts_full():
+    bucket = TokenBucket(600)
+    assert asyncio.run(bucket.acquire(600)) == 0
+
+
+def test_empty_bucket_waits_for_the_refill():
+    async def scenario():
+        bucket = TokenBucket(600)  # 10 tokens a second
+        await bucket.acquire(600)
+        started = time.monotonic()
+        waited = await bucket.acquire(2)
+        return waited, time.monotonic() - started
+
+    waited, elapsed = asyncio.run(scenario())
+    assert 0.15 <= waited <= 0.3
+    assert elapsed >= 0.15
+
+
+def test_request_larger_than_the_bucket_waits_for_a_full_bucket():
+    assert asyncio.run(TokenBucket(60).acquire(10_000)) == 0
+
+
+def test_adjust_refunds_an_overestimate():
+    async def scenario():
+        bucket = TokenBucket(600)
+        await bucket.acquire(600)
+        bucket.adjust(-300)
+        return await bucket.acquire(250)
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_limiter_halves_when_throttled_and_grows_back():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter(8, minimum=1, maximum=8)
+        await limiter.acquire()
+        await limiter.release(throttled=True)
+        halved = limiter.limit
+        for _ in range(4):
+            await limiter.acquire()
+            await limiter.release()
+        return halved, limiter.limit
+
+    halved, grown = asyncio.run(scenario())
+    assert halved == 4
+    # +1 per window of successes: four successes at a limit of 4 add one
+    assert 4.9 < grown < 5.1
+
+
+def test_limiter_stays_within_bounds():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter(2, minimum=1, maximum=3)
+        for _ in range(5):
+            await limiter.acquire()
+            await limiter.release(throttled=True)
+        lowest = limiter.limit
+        for _ in range(50):
+            await limiter.acquire()
+            await limiter.release()
+        return lowest, limiter.limit
+
+    assert asyncio.run(scenario()) == (1, 3)
+
+
+def test_limiter_blocks_at_the_limit():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter(1)
+        await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.02)
+        blocked = not waiting.done()
+        await limiter.release()
+        await asyncio.wait_for(waiting, 1)
+        return blocked, limiter.in_flight
+
+    assert asyncio.run(scenario()) == (True, 1)
+
+
+def make_gateway(**options) -> LLMGateway:
+    options = {"retry_base_seconds": 0.001, "retry_max_seconds": 0.01, **options}
+    return LLMGateway("test", requests_per_minute=6000, tokens_per_minute=1_000_000, **options)
+
+
+def test_gateway_retries_throttled_requests():
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise Throttled("rate limited")
+        return "ok"
+
+    gateway = make_gateway(initial_concurrency=8)
+    assert asyncio.run(gateway.call(request)) == "ok"
+    assert len(attempts) == 3
+    assert gateway.stats()["retries"] == 2
+    assert gateway.limiter.limit < 8
+
+
+def test_gateway_raises_other_errors_straight_away():
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    gateway = make_gateway()
+    with pytest.raises(ValueError):
+        asyncio.run(gateway.call(request))
+    assert len(attempts) == 1
+    assert gateway.stats()["failures"] == 1
+
+
+def test_gateway_gives_up_after_max_retries():
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        raise Throttled("rate limited")
+
+    gateway = make_gateway(max_retries=2)
+    with pytest.raises(Throttled):
+        asyncio.run(gateway.call(request))
+    assert len(attempts) == 3
+
+
+def test_retry_hint_in_the_error_message():
+    assert retry_after_seconds(Exception('quota exceeded "retryDelay": "13s"')) == 13
+    assert retry_after_seconds(Exception("Please retry in 12.5s")) == 12.5
+    assert retry_after_seconds(Exception("no hint")) is None
+
+
+def test_extraction_window_never_exceeds_the_page_concurrency(backend):
+    limiter = backend.extraction_llm.limiter
+    assert limiter.limit == limiter.maximum == backend.EXTRACTION_PAGE_CONCURRENCY
@@ -0,0 +1,28 @@
+import re
+
+from evaluation_schema import parse_response
+from extraction import NativePage, plan_extraction
+
+
+def sample(client, name, **labels) -> float:
+    """Value of one series in the /metrics exposition (0 when absent)."""
+    selector = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{name}\{{{re.escape(selector)}\}} (\S+)$", client.get("/metrics").text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_extraction_and_parse_outcomes_are_prometheus_counters(client):
+    before = {
+        "pages": sample(client, "eduassign_extraction_pages_total", path="native"),
+        "mixed": sample(client, "eduassign_extraction_documents_total", path="mixed"),
+        "repaired": sample(client, "eduassign_evaluation_parse_total", outcome="repaired"),
+    }
+
+    text = "Question 1. Explain how photosynthesis converts light energy into chemical energy."
+    plan_extraction([NativePage(1, text, False), NativePage(2, "", True)], 0.6, 40, 500)
+    parse_response('```json\n{"overall_marks": 3,}\n```')
+
+    assert sample(client, "eduassign_extraction_pages_total", path="native") == before["pages"] + 1
+    assert sample(client, "eduassign_extraction_documents_total", path="mixed") == before["mixed"] + 1
+    assert sample(client, "eduassign_evaluation_parse_total", outcome="repaired") == before["repaired"] + 1
+    assert "# TYPE eduassign_evaluation_parse_total counter" in client.get("/metrics").text
@@ -0,0 +1,139 @@
+import time
+from datetime import datetime
+
+import pytest
+
+QUESTIONS = "## Question 1\nWhat is 2+2?\n## Question 2\nName a colour."
+
+
+def wait_for_job(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def run_job(backend, client, job_type, payload):
+    return wait_for_job(client, client.portal.call(backend.job_queue.enqueue, job_type, payload)["id"])
+
+
+@pytest.fixture
+def no_llm(backend, monkeypatch):
+    calls = []
+
+    async def evaluate_question(*args, **kwargs):
+        calls.append(args)
+        raise AssertionError("the LLM must not be called")
+
+    monkeypatch.setattr(backend, "evaluate_question", evaluate_question)
+    return calls
+
+
+def test_regrade_of_a_missing_submission_fails_without_retries(backend, client, assignment, no_llm):
+    job = run_job(backend, client, "evaluate_question", {
+        "assignment_id": assignment, "submission_id": "missing", "question_reference": "1"
+    })
+    assert job["status"] == "failed"
+    assert job["attempts"] == 1
+    assert job["error"] == "PermanentJobError: Submission missing not found"
+    assert no_llm == []
+
+
+def test_regrade_for_a_missing_assignment_fails_without_retries(backend, client, no_llm):
+    job = run_job(backend, client, "evaluate_question", {
+        "assignment_id": "missing", "submission_id": "missing", "question_reference": "1"
+    })
+    assert job["status"] == "failed"
+    assert job["attempts"] == 1
+    assert job["error"] == "PermanentJobError: Assignment missing not found"
+
+
+def question(reference, marks):
+    return {"question_reference": reference, "marks_awarded": marks, "max_marks": 5, "feedback": []}
+
+
+@pytest.fixture
+def evaluated(backend, client):
+    """An assignment with two questions and a submission whose evaluation completed."""
+    assignment_id, submission_id = f"regrade-{time.monotonic_ns()}", f"regrade-sub-{time.monotonic_ns()}"
+    client.portal.call(backend.repository.set, "assignments", assignment_id, {
+        "id": assignment_id, "title": "Regrade", "extracted_content": QUESTIONS
+    })
+    client.portal.call(backend.repository.set, "submissions", submission_id, {
+        "id": submission_id, "assignment_id": assignment_id, "student_id": "student-1",
+        "submitted_at": datetime.now(), "status": "processed", "ai_processing_status": "completed",
+        "extracted_content": "## Question 1\n4\n## Question 2\nBlue",
+        "evaluation_result": {
+            "question_evaluations": [question("Q1", 1), question("Q2", 5)],
+            "overall_feedback": "Good", "overall_marks": 6, "max_possible_marks": 10
+        },
+    })
+    return assignment_id, submission_id
+
+
+@pytest.fixture
+def regraded_question(backend, monkeypatch):
+    async def evaluate_question(preamble, reference, question_text, answer_text, use_cache=True):
+        return question(reference, 5)
+
+    monkeypatch.setattr(backend, "evaluate_question", evaluate_question)
+
+
+def regrade_url(assignment_id, submission_id, reference="1"):
+    return f"/evaluate/{assignment_id}/{submission_id}/questions/{reference}"
+
+
+def test_regrade_merges_into_the_completed_evaluation(backend, client, evaluated, regraded_question):
+    assignment_id, submission_id = evaluated
+    response = client.post(regrade_url(assignment_id, submission_id))
+    assert response.status_code == 200
+    job = wait_for_job(client, response.json()["job_id"])
+    assert job["status"] == "succeeded"
+
+    result = client.get(f"/submissions/{submission_id}").json()["evaluation_result"]
+    assert [item["marks_awarded"] for item in result["question_evaluations"]] == [5, 5]
+    assert (result["overall_marks"], result["overall_feedback"]) == (10, "Good")
+
+
+def test_regrade_of_an_unevaluated_submission_is_rejected(backend, client, evaluated):
+    assignment_id, submission_id = evaluated
+    client.portal.call(backend.repository.update, "submissions", submission_id, {
+        "ai_processing_status": "pending", "evaluation_result": None
+    })
+    assert client.post(regrade_url(assignment_id, submission_id)).status_code == 409
+
+
+def test_regrade_during_an_evaluation_is_rejected(backend, client, evaluated):
+    from jobs import _new_job
+
+    assignment_id, submission_id = evaluated
+    # A queued evaluation job (of a type no worker here picks up)
+    running = _new_job("evaluation_elsewhere", {}, 0, 1)
+    client.portal.call(backend.job_queue.store.enqueue, running)
+    client.portal.call(backend.repository.update, "submissions", submission_id, {
+        "ai_processing_status": "processing", "evaluation_job_id": running["id"]
+    })
+    response = client.post(regrade_url(assignment_id, submission_id))
+    assert response.status_code == 409
+    assert running["id"] in response.json()["detail"]
+
+
+def test_regrade_job_does_not_merge_into_a_running_evaluation(backend, client, evaluated, monkeypatch):
+    assignment_id, submission_id = evaluated
+
+    async def evaluate_question(preamble, reference, question_text, answer_text, use_cache=True):
+        # A full evaluation is claimed while the question is being evaluated
+        await backend.repository.update("submissions", submission_id, {"ai_processing_status": "processing"})
+        return question(reference, 5)
+
+    monkeypatch.setattr(backend, "evaluate_question", evaluate_question)
+    job = run_job(backend, client, "evaluate_question", {
+        "assignment_id": assignment_id, "submission_id": submission_id, "question_reference": "Q1"
+    })
+    assert job["status"] == "failed"
+    assert job["attempts"] == 1
+    stored = client.get(f"/submissions/{submission_id}").json()
+    assert stored["evaluation_result"]["overall_marks"] == 6
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from starlette.requests import Request
+
+from response_cache import CachedResponse, ResponseCache, conditional_response
+
+
+def request_with(**headers) -> Request:
+    return Request({
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def test_etag_follows_the_content():
+    first = CachedResponse.render([{"id": "a", "updated_at": "1"}])
+    assert CachedResponse.render([{"id": "a", "updated_at": "1"}]).etag == first.etag
+    assert CachedResponse.render([{"id": "a", "updated_at": "2"}]).etag != first.etag
+    assert CachedResponse.render([]).etag != first.etag
+
+
+def test_if_none_match():
+    cached = CachedResponse.render({"id": "a"})
+    assert conditional_response(request_with(if_none_match=cached.etag), cached).status_code == 304
+    assert conditional_response(request_with(if_none_match=f"W/{cached.etag}"), cached).status_code == 304
+    assert conditional_response(request_with(if_none_match=f'"other", {cached.etag}'), cached).status_code == 304
+    assert conditional_response(request_with(if_none_match="*"), cached).status_code == 304
+    assert conditional_response(request_with(if_none_match='"other"'), cached).status_code == 200
+
+
+def test_if_modified_since():
+    modified = datetime(2026, 1, 1, 12, 0, 0, 500000, tzinfo=timezone.utc)
+    cached = CachedResponse.render({"id": "a"}, modified)
+    response = conditional_response(request_with(if_modified_since=format_datetime(modified, usegmt=True)), cached)
+    assert response.status_code == 304
+    assert response.headers["last-modified"] == format_datetime(modified.replace(microsecond=0), usegmt=True)
+    earlier = format_datetime(modified - timedelta(seconds=1), usegmt=True)
+    assert conditional_response(request_with(if_modified_since=earlier), cached).status_code == 200
+
+
+def test_if_none_match_takes_precedence():
+    modified = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    cached = CachedResponse.render({"id": "a"}, modified)
+    request = request_with(if_none_match='"other"', if_modified_since=format_datetime(modified, usegmt=True))
+    assert conditional_response(request, cached).status_code == 200
+
+
+def test_invalidation_drops_tagged_entries_and_stale_builds():
+    cache = ResponseCache(ttl_seconds=60)
+    versions = cache.versions(("submission:1",))
+    cache.set("/submissions/1", CachedResponse.render({}), ("submission:1",), versions)
+    assert cache.get("/submissions/1") is not None
+
+    cache.invalidate("submission:1")
+    assert cache.get("/submissions/1") is None
+    # A response built before the invalidation is not stored
+    cache.set("/submissions/1", CachedResponse.render({}), ("submission:1",), versions)
+    assert cache.get("/submissions/1") is None
+
+
+def add_submission(backend, client, assignment_id, submission_id, status):
+    client.portal.call(backend.repository.set, "submissions", submission_id, {
+        "id": submission_id, "assignment_id": assignment_id, "student_id": "student-1",
+        "submitted_at": datetime.now(), "status": status,
+    })
+
+
+def test_listing_changes_when_an_item_leaves_the_filter(backend, client, assignment):
+    add_submission(backend, client, assignment, f"{assignment}-old", "processed")
+    add_submission(backend, client, assignment, f"{assignment}-new", "processed")
+    url = f"/assignments/{assignment}/submissions?status=processed"
+    first = client.get(url)
+    assert "last-modified" not in first.headers
+    assert client.get(url, headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+
+    # The older submission leaves the filtered list; the newest updated_at of the rest is unchanged
+    update = {"status": "error"}
+    client.portal.call(backend.repository.update, "submissions", f"{assignment}-old", update)
+    backend.submission_updated(assignment, f"{assignment}-old", update)
+
+    second = client.get(url, headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert [item["id"] for item in second.json()] == [f"{assignment}-new"]
+
+
+def test_submission_details_answer_conditional_requests(backend, client, assignment):
+    add_submission(backend, client, assignment, f"{assignment}-detail", "processed")
+    url = f"/submissions/{assignment}-detail"
+    first = client.get(url)
+    assert client.get(url, headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+    assert client.get(url, headers={"If-Modified-Since": first.headers["last-modified"]}).status_code == 304
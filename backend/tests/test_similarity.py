@@ -0,0 +1,92 @@
+import random
+
+from similarity import (
+    SimilarityIndex, estimated_similarity, minhash, shingles, signature_for
+)
+
+VOCABULARY = [f"word{index}" for index in range(2000)]
+
+
+def essay(seed: int, words: int = 300) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def edited(text: str, changes: int, seed: int = 0) -> str:
+    """The text with `changes` words replaced, spread evenly through it."""
+    rng = random.Random(seed)
+    words = text.split()
+    for position in range(0, len(words), len(words) // changes)[:changes]:
+        words[position] = rng.choice(VOCABULARY)
+    return " ".join(words)
+
+
+def jaccard(first: str, second: str) -> float:
+    a, b = shingles(first), shingles(second)
+    return len(a & b) / len(a | b)
+
+
+def test_minhash_estimates_jaccard_similarity():
+    original = essay(1)
+    for changes in (2, 10, 30):
+        copy = edited(original, changes)
+        estimate = estimated_similarity(signature_for(original), signature_for(copy))
+        assert abs(estimate - jaccard(original, copy)) < 0.12
+
+
+def test_signatures_are_stable_and_empty_text_has_none():
+    assert signature_for(essay(1)) == signature_for(essay(1))
+    assert minhash([]) is None
+    assert signature_for("") is None
+
+
+def test_near_duplicates_collide_and_unrelated_texts_do_not():
+    index = SimilarityIndex(threshold=0.5)
+    original = essay(1)
+    index.add("original", signature_for(original), "student-1")
+    index.add("copy", signature_for(edited(original, 3)), "student-2")
+    for seed in range(2, 40):
+        index.add(f"unrelated-{seed}", signature_for(essay(seed)), f"student-{seed + 1}")
+
+    assert [pair["submission_ids"] for pair in index.similar_pairs()] == [["copy", "original"]]
+    # Banding keeps unrelated submissions apart: far fewer comparisons than all pairs
+    assert index.comparisons < 40 * 39 / 2 / 10
+
+
+def test_threshold_decides_which_candidates_are_pairs():
+    original = essay(1)
+    copy = edited(original, 12)
+    score = estimated_similarity(signature_for(original), signature_for(copy))
+    assert 0.5 < score < 0.9
+
+    for threshold, expected in ((0.9, []), (0.5, [["copy", "original"]])):
+        index = SimilarityIndex(threshold)
+        index.add("original", signature_for(original), "student-1")
+        index.add("copy", signature_for(copy), "student-2")
+        assert [pair["submission_ids"] for pair in index.similar_pairs()] == expected
+
+
+def test_quoted_assignment_text_is_not_similarity():
+    assignment = essay(100, words=200)
+    first = f"{assignment} {essay(1, words=100)}"
+    second = f"{assignment} {essay(2, words=100)}"
+    assert estimated_similarity(signature_for(first), signature_for(second)) > 0.4
+
+    index = SimilarityIndex(threshold=0.5)
+    index.add("first", signature_for(first, assignment), "student-1")
+    index.add("second", signature_for(second, assignment), "student-2")
+    assert index.similar_pairs() == []
+
+
+def test_resubmissions_and_removed_submissions_are_not_pairs():
+    index = SimilarityIndex(threshold=0.5)
+    original = essay(1)
+    index.add("first", signature_for(original), "student-1")
+    index.add("resubmitted", signature_for(edited(original, 3)), "student-1")
+    assert index.similar_pairs() == []
+
+    index.add("copy", signature_for(edited(original, 4)), "student-2")
+    assert len(index.similar_pairs()) == 2
+    index.remove("copy")
+    assert index.similar_pairs() == []
+    assert len(index) == 2
@@ -0,0 +1,59 @@
+import os
+import time
+
+from conftest import PDF
+from jobs import PermanentJobError
+
+
+def wait_for_job(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def temp_files(backend):
+    return [name for name in os.listdir(backend.UPLOAD_TEMP_DIR) if not name.startswith(".")]
+
+
+def submit(client, assignment_id, content):
+    response = client.post("/submissions/", data={
+        "assignment_id": assignment_id, "student_id": "student-1", "student_name": "Student"
+    }, files={"file": ("answers.pdf", content, "application/pdf")})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_api_upload_is_staged_in_the_blob_store(backend, client, assignment, monkeypatch):
+    queued = []
+    enqueue = backend.job_queue.enqueue
+
+    async def recording_enqueue(job_type, payload, *args, **kwargs):
+        queued.append(payload)
+        return await enqueue(job_type, payload, *args, **kwargs)
+
+    monkeypatch.setattr(backend.job_queue, "enqueue", recording_enqueue)
+    submission = submit(client, assignment, PDF + b"%staged")
+
+    # Any worker can run the job: the payload names the blob, not a file on the API's disk
+    [payload] = queued
+    assert payload["file_path"] is None
+    assert payload["blob_path"] == f"submissions/{submission['submission_id']}.pdf"
+    assert wait_for_job(client, submission["job_id"])["status"] == "succeeded"
+    stored = client.get(f"/submissions/{submission['submission_id']}").json()
+    assert stored["document_url"] == payload["blob_path"]
+    assert temp_files(backend) == []
+
+
+def test_failed_job_leaves_no_temp_file(backend, client, assignment, monkeypatch):
+    async def extract_markdown_from_file(file_path, system_prompt, file_sha256=None):
+        raise PermanentJobError("unreadable scan")
+
+    monkeypatch.setattr(backend, "extract_markdown_from_file", extract_markdown_from_file)
+    submission = submit(client, assignment, PDF + b"%unreadable")
+
+    assert wait_for_job(client, submission["job_id"])["status"] == "failed"
+    assert temp_files(backend) == []
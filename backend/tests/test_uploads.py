@@ -0,0 +1,117 @@
+import io
+import re
+import asyncio
+import hashlib
+import zipfile
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from benchmarks.fakes import make_pdf
+from uploads import UploadChecker, extract_pdf_entry, inspect_pdf_file, save_pdf_upload, save_zip_upload
+
+PDF = make_pdf(["Question 1", "Question 2", "Question 3"])
+
+
+def upload(data: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename="upload")
+
+
+def without_last_page(pdf: bytes) -> bytes:
+    """An incremental update appended to pdf that drops its last page from the page tree."""
+    kids = re.search(rb"/Kids \[([^\]]*)\]", pdf).group(1).split(b" R")
+    kept = b" R".join(kids[:-2]) + b" R"
+    previous_xref = int(re.search(rb"startxref\n(\d+)", pdf).group(1))
+    size = int(re.search(rb"/Size (\d+)", pdf).group(1))
+    offset = len(pdf)
+    update = b"2 0 obj\n<< /Type /Pages /Kids [%s] /Count %d >>\nendobj\n" % (kept.strip(), len(kids) - 2)
+    xref = offset + len(update)
+    update += b"xref\n0 1\n0000000000 65535 f \n2 1\n%010d 00000 n \n" % offset
+    update += b"trailer\n<< /Size %d /Root 1 0 R /Prev %d >>\nstartxref\n%d\n%%%%EOF\n" % (size, previous_xref, xref)
+    return pdf + update
+
+
+def test_checker_hashes_across_chunks():
+    checker = UploadChecker(max_bytes=len(PDF))
+    for start in range(0, len(PDF), 7):
+        checker.feed(PDF[start:start + 7])
+    assert checker.size == len(PDF)
+    assert checker.digest.hexdigest() == hashlib.sha256(PDF).hexdigest()
+
+
+def test_checker_rejects_a_wrong_signature():
+    with pytest.raises(HTTPException) as error:
+        UploadChecker(max_bytes=100).feed(b"GIF89a")
+    assert error.value.status_code == 415
+
+
+def test_checker_enforces_the_size_limit():
+    checker = UploadChecker(max_bytes=10)
+    checker.feed(b"%PDF-1.4\n")
+    with pytest.raises(HTTPException) as error:
+        checker.feed(b"more bytes")
+    assert error.value.status_code == 413
+
+
+def test_page_count_follows_the_latest_revision(tmp_path):
+    path = tmp_path / "updated.pdf"
+    path.write_bytes(without_last_page(PDF))
+    # The dropped page object is still in the file body
+    assert len(re.findall(rb"/Type /Page\b", path.read_bytes())) == 3
+    assert inspect_pdf_file(str(path), max_bytes=10_000).page_count == 2
+
+
+def test_page_count_ignores_page_markers_in_content(tmp_path):
+    path = tmp_path / "quoted.pdf"
+    path.write_bytes(make_pdf(["Objects look like << /Type /Page >> and << /Type /Page >>"]))
+    assert inspect_pdf_file(str(path), max_bytes=10_000).page_count == 1
+
+
+def test_save_pdf_upload(tmp_path):
+    destination = str(tmp_path / "upload.pdf")
+    stored = asyncio.run(save_pdf_upload(upload(PDF), destination, max_bytes=10_000, chunk_size=16))
+    assert (stored.size, stored.page_count) == (len(PDF), 3)
+    assert stored.sha256 == hashlib.sha256(PDF).hexdigest()
+    assert open(destination, "rb").read() == PDF
+
+
+@pytest.mark.parametrize("data, status", [
+    (b"not a pdf", 415), (PDF, 413), (b"", 400), (b"%PDF-1.4\nno page tree", 415)
+])
+def test_rejected_upload_leaves_no_file(tmp_path, data, status):
+    destination = tmp_path / "upload.pdf"
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(save_pdf_upload(upload(data), str(destination), max_bytes=len(PDF) - 1, chunk_size=16))
+    assert error.value.status_code == status
+    assert not destination.exists()
+
+
+def test_save_zip_upload_checks_the_signature(tmp_path):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("a.pdf", PDF)
+    assert asyncio.run(save_zip_upload(upload(buffer.getvalue()), str(tmp_path / "a.zip"), 10_000)) > 0
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(save_zip_upload(upload(PDF), str(tmp_path / "b.zip"), 10_000))
+    assert error.value.status_code == 415
+
+
+def test_inspect_pdf_file(tmp_path):
+    path = tmp_path / "direct.pdf"
+    path.write_bytes(PDF)
+    assert inspect_pdf_file(str(path), max_bytes=10_000).page_count == 3
+    path.write_bytes(b"<html>")
+    with pytest.raises(HTTPException):
+        inspect_pdf_file(str(path), max_bytes=10_000)
+    assert not path.exists()
+
+
+def test_archive_member_limit_applies_to_decompressed_bytes(tmp_path):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("big.pdf", PDF + b"0" * 100_000)
+    destination = tmp_path / "big.pdf"
+    with zipfile.ZipFile(buffer) as archive, pytest.raises(HTTPException) as error:
+        extract_pdf_entry(archive, "big.pdf", str(destination), max_bytes=10_000, chunk_size=4096)
+    assert error.value.status_code == 413
+    assert not destination.exists()
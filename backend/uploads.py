@@ -0,0 +1,168 @@
+"""Checks on uploaded files, applied while they are streamed to local disk.
+
+PDFs and ZIP archives are written in fixed-size chunks; each chunk is checked
+against the size limit and the first one against the file signature, and the
+SHA-256 is computed in the same pass. A PDF's page count is read afterwards
+from its page tree, which also rejects files PyPDF2 cannot parse.
+"""
+import os
+import asyncio
+import hashlib
+from dataclasses import dataclass
+
+import aiofiles
+from fastapi import HTTPException, UploadFile
+
+PDF_MAGIC = b"%PDF-"
+# Local file header, or the end-of-central-directory record of an empty archive
+ZIP_MAGICS = (b"PK\x03\x04", b"PK\x05\x06")
+
+
+@dataclass
+class StoredUpload:
+    """A PDF upload written to local disk, with the facts checked on the way."""
+    path: str
+    size: int
+    sha256: str
+    page_count: int
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """
+    Page count from the PDF's page tree, as of its latest revision. Scanning the
+    bytes for page objects would count pages replaced by incremental updates
+    and miss those inside compressed object streams.
+    """
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(file_path)
+    pages = reader.trailer["/Root"]["/Pages"]
+    count = pages["/Count"] if "/Count" in pages else None
+    # /Count of the root Pages node is the number of leaf pages; walk the tree when it is missing
+    return int(count) if isinstance(count, int) and count >= 0 else len(reader.pages)
+
+
+class UploadChecker:
+    """Enforces the size limit and file signature on chunks as they are written, hashing them on the way."""
+
+    def __init__(self, max_bytes: int, magics=(PDF_MAGIC,), kind: str = "PDF"):
+        self.max_bytes = max_bytes
+        self.magics = magics
+        self.kind = kind
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def feed(self, chunk: bytes):
+        if self.size == 0 and not chunk.startswith(self.magics):
+            raise HTTPException(status_code=415, detail=f"Uploaded file is not a {self.kind}")
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Uploaded file exceeds the {self.max_bytes} byte limit"
+            )
+        self.digest.update(chunk)
+
+
+def _discard(destination: str):
+    # Never leave a partial upload behind
+    if os.path.exists(destination):
+        os.unlink(destination)
+
+
+def _finish_pdf(checker: UploadChecker, destination: str) -> StoredUpload:
+    """Page count and the StoredUpload; blocking, so run off the event loop."""
+    if checker.size == 0:
+        _discard(destination)
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
+
+    try:
+        page_count = count_pdf_pages(destination)
+    except Exception:
+        _discard(destination)
+        raise HTTPException(status_code=415, detail="Uploaded PDF could not be read")
+
+    return StoredUpload(path=destination, size=checker.size, sha256=checker.digest.hexdigest(),
+                        page_count=page_count)
+
+
+async def _stream_upload(file: UploadFile, destination: str, checker: UploadChecker, chunk_size: int):
+    os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+    try:
+        async with aiofiles.open(destination, "wb") as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                checker.feed(chunk)
+                await out.write(chunk)
+    except Exception:
+        _discard(destination)
+        raise
+
+
+async def save_pdf_upload(file: UploadFile, destination: str, max_bytes: int,
+                          chunk_size: int = 1024 * 1024) -> StoredUpload:
+    """
+    Stream an uploaded PDF to disk in fixed-size chunks, enforcing the size limit
+    and the PDF signature and computing the SHA-256 in the same pass, then read
+    its page count.
+    """
+    checker = UploadChecker(max_bytes)
+    await _stream_upload(file, destination, checker, chunk_size)
+    return await asyncio.to_thread(_finish_pdf, checker, destination)
+
+
+async def save_zip_upload(file: UploadFile, destination: str, max_bytes: int,
+                          chunk_size: int = 1024 * 1024) -> int:
+    """Stream an uploaded ZIP archive to disk with the same checks; returns its size."""
+    checker = UploadChecker(max_bytes, ZIP_MAGICS, "ZIP archive")
+    await _stream_upload(file, destination, checker, chunk_size)
+    if checker.size == 0:
+        _discard(destination)
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
+    return checker.size
+
+
+def inspect_pdf_file(path: str, max_bytes: int, chunk_size: int = 1024 * 1024) -> StoredUpload:
+    """
+    Run the upload checks over a PDF that reached local disk some other way
+    (e.g. downloaded after a direct upload to the bucket). Blocking; run it in
+    a thread.
+    """
+    checker = UploadChecker(max_bytes)
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                checker.feed(chunk)
+    except Exception:
+        _discard(path)
+        raise
+    return _finish_pdf(checker, path)
+
+
+def extract_pdf_entry(archive, name: str, destination: str, max_bytes: int,
+                      chunk_size: int = 1024 * 1024) -> StoredUpload:
+    """
+    Decompress one archive member to disk chunk by chunk, with the same checks
+    as a direct PDF upload. The limit applies to the decompressed bytes, so a
+    member that claims a small size cannot inflate past it. Blocking; run it
+    in a thread.
+    """
+    checker = UploadChecker(max_bytes)
+    os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+    try:
+        with archive.open(name) as member, open(destination, "wb") as out:
+            while True:
+                chunk = member.read(chunk_size)
+                if not chunk:
+                    break
+                checker.feed(chunk)
+                out.write(chunk)
+    except Exception:
+        _discard(destination)
+        raise
+    return _finish_pdf(checker, destination)
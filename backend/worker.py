@@ -0,0 +1,71 @@
+"""Standalone worker process for extraction and evaluation jobs.
+
+Run with `python worker.py` and set RUN_EMBEDDED_WORKER=false on the API pods so
+they only enqueue work. Workers and API pods must share the job store
+(JOB_STORE=firestore) and the blob store: the API stages uploads there and
+jobs fetch them, so nothing is passed through a local disk. Set
+WORKER_METRICS_PORT to serve the worker's Prometheus metrics at /metrics.
+
+The worker owns the extraction and evaluation stack: the API imports the OCR
+and Gemini libraries lazily, so API-only processes never load them, while the
+worker loads them before taking its first job.
+"""
+import os
+import time
+import asyncio
+import signal
+
+from backend import job_queue, get_metrics
+from metrics import log_event
+
+
+async def serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    # Minimal HTTP responder for Prometheus scrapes; every path returns the metrics
+    try:
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        response = await get_metrics()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: " + response.media_type.encode() +
+            b"\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % len(response.body) + response.body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+def load_job_libraries():
+    """Import the OCR and Gemini client libraries the jobs use (blocking, a few seconds)."""
+    import google.generativeai  # noqa: F401
+    from google.generativeai import caching  # noqa: F401
+    from pdf2image import convert_from_path  # noqa: F401
+    from pyzerox.models import litellmmodel  # noqa: F401
+    from pyzerox.processor import format_markdown  # noqa: F401
+
+
+async def main():
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    metrics_server = None
+    metrics_port = os.getenv("WORKER_METRICS_PORT")
+    if metrics_port:
+        metrics_server = await asyncio.start_server(serve_metrics, "0.0.0.0", int(metrics_port))
+
+    started = time.perf_counter()
+    await asyncio.to_thread(load_job_libraries)
+    log_event("worker_libraries_loaded", seconds=round(time.perf_counter() - started, 3))
+
+    job_queue.start()
+    log_event("worker_started", worker_id=job_queue.worker_id, concurrency=job_queue.concurrency,
+              metrics_port=metrics_port)
+    await stop_event.wait()
+    await job_queue.stop()
+    if metrics_server is not None:
+        metrics_server.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())